@@ -1,18 +1,67 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import FileResponse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import List, Optional
 
-app = FastAPI()
+import numpy as np
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
-BASE_DIR = Path(__file__).resolve().parent
-GRAPHS_DIR = BASE_DIR / "Graphs"
-DATA_DIR = BASE_DIR / "Data"
+import constants
+from utils.data_cache import TIME_COLUMNS, DataCache, query_frame
+from utils.event_stream import EVENT_TYPES, EventBroker
+from utils.generate_file_name import (
+    get_event_log_file,
+    get_history_store_dir,
+    get_metrics_dir,
+    get_publication_dir,
+    get_sqlite_database_file,
+)
+from utils.history_store import METRICS, HistoryStore
+from utils.http_cache import (
+    get_file_validators,
+    is_not_modified,
+    select_precompressed_variant,
+)
+from utils.metrics import (
+    HTTP_REQUEST_SECONDS,
+    REGISTRY,
+    load_snapshots,
+    render_prometheus,
+)
+from utils.publication import CURRENT_LINK, current_generation, publish_outputs
+from utils.render_cache import RenderCache, render_in_worker
+from utils.sqlite_store import PROCESSED_TABLES, SQLiteStore, query_processed
+
+# Folder holding the pipeline outputs, WEATHER_APP_DIR serves another working folder
+BASE_DIR = Path(os.environ.get("WEATHER_APP_DIR") or Path(__file__).resolve().parent)
+PUBLICATION_DIR = BASE_DIR / get_publication_dir()
+# Outputs are served from the current published generation, or straight from the
+# folders the pipeline writes to when versioned outputs are disabled
+OUTPUT_DIR = PUBLICATION_DIR / CURRENT_LINK if constants.VERSIONED_OUTPUTS else BASE_DIR
+GRAPHS_DIR = OUTPUT_DIR / "Graphs"
+DATA_DIR = OUTPUT_DIR / "Data"
 
 # Data CSV Files
 CSV_FILES = {
     "weather": DATA_DIR / "weather_data.csv",
     "highest_temp": DATA_DIR / "highest_temp_cities.csv",
     "lowest_humidity": DATA_DIR / "lowest_humidity_cities.csv",
+    "daily_rollup": DATA_DIR / "daily_rollups.csv",
+    "weekly_rollup": DATA_DIR / "weekly_rollups.csv",
 }
 
 # Mapping of graph types to their respective file paths
@@ -25,6 +74,162 @@ GRAPH_FILES = {
     "wind_speed_city": GRAPHS_DIR / "wind_speed_by_city.png",
 }
 
+# Graphs rendered on demand as (data type, plot function in utils.data_plotter)
+RENDERABLE_GRAPHS = {
+    "city_temperature_time": ("weather", "plot_city_temperature_vs_time"),
+    "highest_temperature_time": ("highest_temp", "plot_highest_temperature_over_time"),
+    "lowest_humidity_time": ("lowest_humidity", "plot_lowest_humidity_over_time"),
+    "temperature_city": ("weather", "plot_temperature_vs_city"),
+    "temperature_wind_speed": ("weather", "plot_temperature_vs_wind_speed"),
+    "wind_speed_city": ("weather", "plot_wind_speed_vs_city"),
+}
+
+IMAGE_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Parsed CSV files, loaded at start up and reloaded when a file changes
+data_cache = DataCache(CSV_FILES)
+
+# Images rendered on demand, keyed by request parameters and data version
+render_cache = RenderCache()
+history_store = HistoryStore(BASE_DIR / get_history_store_dir())
+RENDER_WORKERS = 2
+RENDER_DPI = 100
+
+# Rows streamed per chunk in NDJSON responses
+NDJSON_CHUNK_ROWS = 1000
+
+# Events appended to cache/events.jsonl by the pipeline, pushed to subscribers
+event_broker = EventBroker(BASE_DIR / get_event_log_file())
+
+# Copy of the processed outputs queried with the sqlite storage format
+sqlite_store = SQLiteStore(BASE_DIR / get_sqlite_database_file())
+
+# Idle event streams get a comment line this often, so proxies keep them open
+SSE_KEEPALIVE_SECONDS = 15
+
+# Clients may reuse a file for a few minutes, then revalidate it with its ETag
+GRAPH_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+DATA_CACHE_CONTROL = "public, max-age=60, must-revalidate"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if constants.VERSIONED_OUTPUTS and current_generation(PUBLICATION_DIR) is None:
+        # Outputs written before versioning was enabled become the first generation
+        publish_outputs(BASE_DIR, PUBLICATION_DIR)
+    data_cache.load_all()
+    # spawn keeps the worker processes free of the server's threads and event loop
+    app.state.render_pool = ProcessPoolExecutor(
+        max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+    event_broker.start()
+    yield
+    await event_broker.stop()
+    app.state.render_pool.shutdown(cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request_time(request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, so query strings and unknown paths stay out of the labels
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        route=route,
+        method=request.method,
+        status=str(response.status_code),
+    )
+    return response
+
+
+def resolve_output_file(path):
+    """
+    Find an output file in the current generation, which stays the file served
+    for the whole request even if a newer generation is published meanwhile.
+
+    Args:
+        path (Path): One of the CSV_FILES or GRAPH_FILES.
+
+    Returns:
+        tuple: (file to serve, FileValidators), or (None, None) if it does not exist.
+    """
+    if not constants.VERSIONED_OUTPUTS:
+        if not path.is_file():
+            return None, None
+        return path, get_file_validators(path)
+
+    generation = current_generation(PUBLICATION_DIR)
+    if generation is None:
+        return None, None
+    relative_path = path.relative_to(OUTPUT_DIR)
+    # Validators come from the generation manifest, nothing is hashed
+    validators = generation.validators(relative_path)
+    if validators is None:
+        return None, None
+    return generation.file(relative_path), validators
+
+
+def cached_file_response(
+    request,
+    path,
+    validators,
+    media_type,
+    cache_control,
+    headers=None,
+    compress=False,
+    **kwargs,
+):
+    """
+    Serve a file with ETag, Last-Modified and Cache-Control headers, answering
+    conditional requests for an unchanged file with 304 Not Modified.
+
+    Args:
+        request (Request): The incoming request.
+        path (Path): File to serve.
+        validators (FileValidators): Validators of the file, see resolve_output_file.
+        media_type (str): Content type of the file.
+        cache_control (str): Cache-Control header value.
+        headers (dict, optional): Extra response headers.
+        compress (bool): Serve a precompressed variant if the client accepts one.
+        **kwargs: Passed on to FileResponse.
+
+    Returns:
+        Response: The file, or an empty 304 response.
+    """
+    etag = validators.etag
+    encoding = None
+    if compress:
+        # A published generation is never modified, its variants are written at
+        # publication time
+        path, encoding = select_precompressed_variant(
+            path,
+            request.headers.get("accept-encoding"),
+            create=not constants.VERSIONED_OUTPUTS,
+        )
+        if encoding:
+            # Each encoding is a separate representation with its own strong ETag
+            etag = f'{etag[:-1]}-{encoding}"'
+
+    response_headers = {
+        "ETag": etag,
+        "Last-Modified": validators.last_modified,
+        "Cache-Control": cache_control,
+    }
+    if compress:
+        response_headers["Vary"] = "Accept-Encoding"
+
+    if is_not_modified(request.headers, etag, validators.mtime):
+        return Response(status_code=304, headers=response_headers)
+
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    response_headers.update(headers or {})
+    return FileResponse(path, media_type=media_type, headers=response_headers, **kwargs)
+
 
 @app.get("/")
 def home():
@@ -38,17 +243,26 @@ def home():
         "weather_data_csv": "/data?type=weather",
         "highest_temp_csv": "/data?type=highest_temp",
         "lowest_humidity_csv": "/data?type=lowest_humidity",
+        "weather_data_query": "/data/query?type=weather&city=London&start=2024-12-02T00:00&limit=100",
+        "daily_rollup_query": "/data/query?type=daily_rollup&city=London&start=2024-11-01",
+        "weekly_rollup_query": "/data/query?type=weekly_rollup&city=London&metric=Wind Speed (m/s) P90",
         "temperature_city_graph": "/graphs?type=temperature_city",
         "city_temperature_time_graph": "/graphs?type=city_temperature_time",
         "highest_temperature_time_graph": "/graphs?type=highest_temperature_time",
         "lowest_humidity_time_graph": "/graphs?type=lowest_humidity_time",
         "temperature_wind_speed_graph": "/graphs?type=temperature_wind_speed",
         "wind_speed_city_graph": "/graphs?type=wind_speed_city",
+        "render_graph": "/graphs/render?type=city_temperature_time&city=London&format=svg",
+        "metrics": "/metrics",
+        "history": "/history?city=London&metric=Temperature (°C)&start=2024-11-01T00:00",
+        "events": "/events?city=London&city=Paris",
+        "events_websocket": "/events/ws?type=ranking",
     }
 
 
 @app.get("/graphs")
 def get_graph_file(
+    request: Request,
     type: str = Query(..., description="Type of graph to fetch"),
     download: bool = Query(
         False, description="Set to True to download the graph instead of viewing"
@@ -69,8 +283,8 @@ def get_graph_file(
             detail=f"Invalid type. Allowed values are: {', '.join(GRAPH_FILES.keys())}.",
         )
 
-    graph_file = GRAPH_FILES[type]
-    if not graph_file.exists() or not graph_file.is_file():
+    graph_file, validators = resolve_output_file(GRAPH_FILES[type])
+    if graph_file is None:
         raise HTTPException(
             status_code=404,
             detail=f"{type.replace('_', ' ').capitalize()} graph not found.",
@@ -80,21 +294,142 @@ def get_graph_file(
         if download
         else None
     )
-    return FileResponse(graph_file, media_type="image/png", headers=headers)
+    return cached_file_response(
+        request,
+        graph_file,
+        validators,
+        "image/png",
+        GRAPH_CACHE_CONTROL,
+        headers=headers,
+    )
+
+
+@app.get("/graphs/render")
+async def render_graph(
+    request: Request,
+    type: str = Query(..., description="Type of graph to render"),
+    city: Optional[List[str]] = Query(
+        None, description="Cities to plot, repeat the parameter for several cities"
+    ),
+    metric: Optional[str] = Query(
+        None,
+        description="Column to plot over time, only for city_temperature_time",
+    ),
+    start: Optional[str] = Query(
+        None, description="First hour to plot, e.g. 2024-12-02T00:00"
+    ),
+    end: Optional[str] = Query(None, description="Last hour to plot"),
+    width: int = Query(1000, ge=200, le=4000, description="Image width in pixels"),
+    height: int = Query(600, ge=200, le=4000, description="Image height in pixels"),
+    format: str = Query("png", description="Image format (png, svg)"),
+):
+    """
+    Render a graph for the requested cities, time window, size and format.
+    Images are cached per parameters and data version, and identical requests
+    arriving together share a single render.
+
+    Args:
+        type (str): The type of graph to render.
+        city (list, optional): Cities to plot. Defaults to every city.
+        metric (str, optional): Column to plot over time for city_temperature_time.
+        start (str, optional): First hour to plot.
+        end (str, optional): Last hour to plot.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+        format (str): png or svg.
+
+    Returns:
+        Response: The rendered image.
+    """
+    if type not in RENDERABLE_GRAPHS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid type. Allowed values are: {', '.join(RENDERABLE_GRAPHS.keys())}.",
+        )
+    if format not in IMAGE_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid format. Allowed values are: {', '.join(IMAGE_MEDIA_TYPES.keys())}.",
+        )
+    if metric and type != "city_temperature_time":
+        raise HTTPException(
+            status_code=400,
+            detail="metric is only supported for city_temperature_time graphs.",
+        )
+
+    data_type, plot_name = RENDERABLE_GRAPHS[type]
+    try:
+        # A changed file is parsed again, off the event loop so streams keep flowing
+        cached = await asyncio.to_thread(data_cache.get, data_type)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=404, detail=f"{data_type.capitalize()} data not found."
+        )
+
+    cities = tuple(sorted(set(city))) if city else None
+    key = (type, cities, metric, start, end, width, height, format, cached.version)
+    etag = f'"{hashlib.sha256(repr(key).encode()).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": GRAPH_CACHE_CONTROL}
+    if is_not_modified(request.headers, etag, cached.version[0] // 10**9):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data = await asyncio.to_thread(
+            query_frame,
+            cached.df,
+            TIME_COLUMNS[data_type],
+            cities=cities,
+            start=start,
+            end=end,
+            metrics=[metric] if metric else None,
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {e.args[0]}.")
+    if data.empty:
+        raise HTTPException(
+            status_code=404,
+            detail="No data matches the requested cities and time range.",
+        )
+
+    kwargs = {}
+    if metric:
+        kwargs["metric"] = metric
+    if cities and len(cities) == 1 and type == "city_temperature_time":
+        kwargs["selected_city"] = cities[0]
+
+    async def render():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            app.state.render_pool,
+            render_in_worker,
+            plot_name,
+            data,
+            (width / RENDER_DPI, height / RENDER_DPI),
+            format,
+            kwargs,
+        )
+
+    image = await render_cache.get_or_render(key, render)
+    return Response(
+        content=image, media_type=IMAGE_MEDIA_TYPES[format], headers=headers
+    )
 
 
 @app.get("/data")
 def get_weather_data(
+    request: Request,
     type: str = Query(
         ...,
-        description="Type of data to fetch (weather, highest_temp, lowest_humidity)",
-    )
+        description="Type of data to fetch (weather, highest_temp, lowest_humidity, "
+        "daily_rollup, weekly_rollup)",
+    ),
 ):
     """
     Serve the requested CSV file based on the type.
 
     Args:
-        type (str): The type of CSV data to fetch (weather, highest_temp, lowest_humidity).
+        type (str): The type of CSV data to fetch (weather, highest_temp, lowest_humidity,
+            daily_rollup, weekly_rollup).
 
     Returns:
         FileResponse: The requested CSV file.
@@ -105,10 +440,337 @@ def get_weather_data(
             detail=f"Invalid type. Allowed values are: {', '.join(CSV_FILES.keys())}.",
         )
 
-    csv_file = CSV_FILES[type]
-    if not csv_file.exists() or not csv_file.is_file():
+    csv_file, validators = resolve_output_file(CSV_FILES[type])
+    if csv_file is None:
+        raise HTTPException(
+            status_code=404, detail=f"{type.capitalize()} data not found."
+        )
+
+    return cached_file_response(
+        request,
+        csv_file,
+        validators,
+        "text/csv",
+        DATA_CACHE_CONTROL,
+        compress=True,
+        filename=f"{type}_data.csv",
+    )
+
+
+def _ndjson_chunks(df):
+    for start in range(0, len(df), NDJSON_CHUNK_ROWS):
+        chunk = df.iloc[start : start + NDJSON_CHUNK_ROWS]
+        lines = chunk.to_json(orient="records", lines=True, force_ascii=False)
+        # Older pandas versions leave out the final newline
+        yield lines if lines.endswith("\n") else lines + "\n"
+
+
+@app.get("/data/query")
+def query_weather_data(
+    type: str = Query(
+        ...,
+        description="Type of data to query (weather, highest_temp, lowest_humidity, "
+        "daily_rollup, weekly_rollup)",
+    ),
+    city: Optional[List[str]] = Query(
+        None, description="Cities to return, repeat the parameter for several cities"
+    ),
+    start: Optional[str] = Query(
+        None, description="First hour to return, e.g. 2024-12-02T00:00"
+    ),
+    end: Optional[str] = Query(
+        None, description="Last hour to return, e.g. 2024-12-03T23:00"
+    ),
+    metric: Optional[List[str]] = Query(
+        None, description="Columns to return, e.g. Temperature (°F)"
+    ),
+    limit: int = Query(1000, ge=1, le=100000, description="Maximum rows to return"),
+    offset: int = Query(
+        0, ge=0, description="Rows to skip before the first returned row"
+    ),
+    format: str = Query("json", description="Response format (json, ndjson)"),
+):
+    """
+    Query the processed data from the in-memory cache instead of downloading the whole CSV.
+
+    Args:
+        type (str): The type of data to query (weather, highest_temp, lowest_humidity,
+            daily_rollup, weekly_rollup).
+        city (list, optional): Cities to return.
+        start (str, optional): First hour (or date, for the rollups) to return.
+        end (str, optional): Last hour (or date, for the rollups) to return.
+        metric (list, optional): Columns to return, City and time are always included.
+        limit (int): Maximum number of rows to return.
+        offset (int): Number of matching rows to skip.
+        format (str): json for a single document, ndjson for one JSON object per line.
+
+    Returns:
+        Response: The matching rows as JSON or NDJSON.
+    """
+    if type not in CSV_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid type. Allowed values are: {', '.join(CSV_FILES.keys())}.",
+        )
+    if format not in ("json", "ndjson"):
+        raise HTTPException(
+            status_code=400, detail="Invalid format. Allowed values are: json, ndjson."
+        )
+
+    try:
+        if constants.STORAGE_FORMAT == "sqlite" and type in PROCESSED_TABLES:
+            # Indexed queries against the copy of the outputs in the database
+            total, page = query_processed(
+                type,
+                cities=city,
+                start=start,
+                end=end,
+                metrics=metric,
+                limit=limit,
+                offset=offset,
+                store=sqlite_store,
+            )
+        else:
+            result = query_frame(
+                data_cache.get(type).df,
+                TIME_COLUMNS[type],
+                cities=city,
+                start=start,
+                end=end,
+                metrics=metric,
+            )
+            total = len(result)
+            page = result.iloc[offset : offset + limit]
+    except FileNotFoundError:
         raise HTTPException(
             status_code=404, detail=f"{type.capitalize()} data not found."
         )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown metric: {e.args[0]}.")
+
+    if format == "ndjson":
+        return StreamingResponse(
+            _ndjson_chunks(page),
+            media_type="application/x-ndjson",
+            headers={"X-Total-Count": str(total)},
+        )
+
+    rows = page.to_json(orient="records", force_ascii=False)
+    body = (
+        f'{{"type": {json.dumps(type)}, "total": {total}, "offset": {offset}, '
+        f'"limit": {limit}, "rows": {rows}}}'
+    )
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/history")
+def query_history(
+    city: str = Query(..., description="City to return"),
+    metric: str = Query("Temperature (°C)", description="Metric to return"),
+    start: Optional[str] = Query(
+        None, description="First hour to return (UTC), e.g. 2024-11-01T00:00"
+    ),
+    end: Optional[str] = Query(
+        None, description="Last hour to return (UTC), e.g. 2024-12-01T23:00"
+    ),
+):
+    """
+    Query the historical store for one metric of one city over any number of days.
+
+    Args:
+        city (str): The city to return.
+        metric (str): Raw column name, e.g. Temperature (°C), or Open Meteo variable.
+        start (str, optional): First hour to return.
+        end (str, optional): Last hour to return.
+
+    Returns:
+        Response: The hours and values as two JSON arrays, missing values are null.
+    """
+    if metric not in METRICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid metric. Allowed values are: {', '.join(METRICS)}.",
+        )
+    try:
+        times, values = history_store.query(city, metric, start, end)
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail="start and end must be ISO formatted times."
+        )
 
-    return FileResponse(csv_file, media_type="text/csv", filename=f"{type}_data.csv")
+    # float32 values print as their shortest decimal text
+    formatted = values.astype(str)
+    formatted[np.isnan(values)] = "null"
+    hours = np.datetime_as_string(times.astype("datetime64[s]"), unit="m")
+    body = (
+        f'{{"city": {json.dumps(city)}, "metric": {json.dumps(metric)}, '
+        f'"count": {len(times)}, "time": {json.dumps(hours.tolist())}, '
+        f'"values": [{", ".join(formatted)}]}}'
+    )
+    return Response(content=body, media_type="application/json")
+
+
+def _check_event_types(types):
+    invalid = sorted(set(types or []) - set(EVENT_TYPES))
+    if invalid:
+        return (
+            f"Invalid type {', '.join(invalid)}. "
+            f"Allowed values are: {', '.join(EVENT_TYPES)}."
+        )
+    return None
+
+
+def _sse_message(event):
+    lines = [f"event: {event['type']}"]
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _sse_messages(cities, types, last_event_id):
+    # Subscribed here rather than in the endpoint, so the finally clause runs for
+    # every subscription the response was started with
+    subscription = event_broker.subscribe(cities, types, last_event_id)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.get(), SSE_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield _sse_message(event)
+    finally:
+        event_broker.unsubscribe(subscription)
+
+
+@app.get("/events")
+def stream_events(
+    request: Request,
+    city: Optional[List[str]] = Query(
+        None, description="Cities to follow, repeat the parameter for several cities"
+    ),
+    type: Optional[List[str]] = Query(
+        None, description="Event types to receive (observation, ranking)"
+    ),
+):
+    """
+    Push new observations and rankings as Server-Sent Events.
+
+    The pipeline publishes an observation event for every stored city series and
+    a ranking event per ranking file once processing finished. A client that
+    falls behind loses its oldest events and gets a "dropped" event instead; a
+    reconnecting client sending Last-Event-ID gets the events it missed, or a
+    "reset" event if they are no longer buffered.
+
+    Args:
+        request (Request): The incoming request.
+        city (list, optional): Only receive events about these cities.
+        type (list, optional): Only receive these event types.
+
+    Returns:
+        StreamingResponse: The text/event-stream response.
+    """
+    error = _check_event_types(type)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    return StreamingResponse(
+        _sse_messages(city, type, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _send_events(websocket, subscription):
+    while True:
+        await websocket.send_text(json.dumps(await subscription.get()))
+
+
+def _parse_filters(message):
+    # Either filter may be left out, otherwise it has to be a list of strings
+    cities, types = message.get("city"), message.get("type")
+    for values in (cities, types):
+        if values is not None and not (
+            isinstance(values, list) and all(isinstance(v, str) for v in values)
+        ):
+            raise ValueError("Filters must be lists of strings")
+    return cities, types
+
+
+async def _receive_filters(websocket, subscription):
+    # Clients change their filters with {"city": [...], "type": [...]} messages
+    while True:
+        try:
+            cities, types = _parse_filters(await websocket.receive_json())
+        except (ValueError, AttributeError):
+            await websocket.send_json(
+                {"type": "error", "detail": 'Expected {"city": [...], "type": [...]}.'}
+            )
+            continue
+        error = _check_event_types(types)
+        if error:
+            await websocket.send_json({"type": "error", "detail": error})
+            continue
+        subscription.set_filter(cities, types)
+
+
+@app.websocket("/events/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    city: Optional[List[str]] = Query(None),
+    type: Optional[List[str]] = Query(None),
+    last_event_id: Optional[str] = Query(None),
+):
+    """
+    Push the events of /events over a WebSocket, one JSON message per event.
+
+    Args:
+        websocket (WebSocket): The connection.
+        city (list, optional): Only receive events about these cities.
+        type (list, optional): Only receive these event types.
+        last_event_id (str, optional): Resume after this event id.
+    """
+    error = _check_event_types(type)
+    if error:
+        await websocket.close(code=1008, reason=error)
+        return
+
+    await websocket.accept()
+    subscription = event_broker.subscribe(city, type, last_event_id)
+    tasks = [
+        asyncio.create_task(_send_events(websocket, subscription)),
+        asyncio.create_task(_receive_filters(websocket, subscription)),
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            # A disconnect ends the session, anything else is a real error
+            if not isinstance(task.exception(), WebSocketDisconnect):
+                task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_broker.unsubscribe(subscription)
+
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Export metrics in the Prometheus text format.
+
+    Samples of the API process carry source="api". The fetch, process and plot
+    metrics of CLI runs and of the scheduler are read from the snapshots those
+    processes save in cache/metrics, with their process as source.
+
+    Returns:
+        Response: The exposition text.
+    """
+    snapshots = load_snapshots(BASE_DIR / get_metrics_dir())
+    snapshots["api"] = REGISTRY.snapshot()
+    return Response(
+        content=render_prometheus(snapshots),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
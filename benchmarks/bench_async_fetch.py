@@ -0,0 +1,62 @@
+"""
+Throughput of the concurrent fetch engine against a local stub server.
+
+Usage:
+    python -m benchmarks.bench_async_fetch --cities 200 --latency 0.05
+    python -m benchmarks.bench_async_fetch --cities 2000 --batch-size 50
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from benchmarks.stub_server import StubWeatherServer
+from utils.async_fetcher import fetch_weather_data_concurrently
+
+
+def synthetic_cities(count):
+    return [
+        {
+            "City": f"City {i}",
+            "Latitude": -60 + (i % 120),
+            "Longitude": -170 + (i % 340),
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument(
+        "--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64]
+    )
+    args = parser.parse_args()
+
+    cities = synthetic_cities(args.cities)
+    print(f"{'concurrency':>12} {'seconds':>10} {'cities/s':>10} {'requests':>10}")
+    with StubWeatherServer(latency=args.latency) as server:
+        for concurrency in args.levels:
+            requests_before = server.request_count
+            start = time.perf_counter()
+            results = fetch_weather_data_concurrently(
+                cities,
+                url=server.url,
+                concurrency=concurrency,
+                rate_limit=0,
+                batch_size=args.batch_size,
+            )
+            elapsed = time.perf_counter() - start
+            assert all(results.values()), "stub server returned a failure"
+            requests_made = server.request_count - requests_before
+            print(
+                f"{concurrency:>12} {elapsed:>10.2f} {len(cities) / elapsed:>10.1f} {requests_made:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
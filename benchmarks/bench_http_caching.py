@@ -0,0 +1,92 @@
+"""
+Bytes and latency per request for /data and /graphs, plain against cached.
+
+Runs the FastAPI app with uvicorn on a local port and compares full downloads
+with revalidated (304) and gzip encoded responses.
+
+Usage:
+    python -m benchmarks.bench_http_caching --requests 200
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+import uvicorn
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from app import app
+
+ENDPOINTS = [
+    "/data?type=weather",
+    "/data?type=highest_temp",
+    "/graphs?type=city_temperature_time",
+]
+
+
+def start_server(port):
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def measure(session, url, count, headers):
+    latencies, transferred = [], 0
+    for _ in range(count):
+        start = time.perf_counter()
+        # stream=True keeps requests from decoding, so the wire size is measured
+        response = session.get(url, headers=headers, stream=True)
+        body = response.raw.read()
+        latencies.append(time.perf_counter() - start)
+        transferred += len(body)
+    return (
+        transferred / count,
+        statistics.median(latencies) * 1000,
+        response.status_code,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server, thread = start_server(args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    print(
+        f"{'endpoint':<38} {'mode':<12} {'status':>6} {'bytes/req':>10} {'p50 ms':>8}"
+    )
+    with requests.Session() as session:
+        for endpoint in ENDPOINTS:
+            url = base + endpoint
+            first = session.get(url, headers={"Accept-Encoding": "gzip"})
+            modes = [
+                ("plain", {"Accept-Encoding": "identity"}),
+                ("gzip", {"Accept-Encoding": "gzip"}),
+                (
+                    "revalidate",
+                    {"Accept-Encoding": "gzip", "If-None-Match": first.headers["ETag"]},
+                ),
+            ]
+            for mode, headers in modes:
+                size, p50, status = measure(session, url, args.requests, headers)
+                print(
+                    f"{endpoint:<38} {mode:<12} {status:>6} {size:>10.0f} {p50:>8.2f}"
+                )
+
+    server.should_exit = True
+    thread.join()
+
+
+if __name__ == "__main__":
+    main()
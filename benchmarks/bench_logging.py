@@ -0,0 +1,98 @@
+"""
+Per-city logging overhead on the fetch path, synchronous file logging against the queue mode.
+
+Usage:
+    python -m benchmarks.bench_logging --cities 2000 --threads 8
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from benchmarks.stub_server import build_forecast_payload
+from utils import logger as logger_module
+from utils.logger import log_payload, setup_logger
+
+# (label, LOG_MODE, LOG_FORMAT, payload logged at INFO as the fetcher used to)
+CONFIGS = [
+    ("sync, payload at INFO (before)", "sync", "text", True),
+    ("sync, payload sampled at DEBUG", "sync", "text", False),
+    ("queue, payload sampled at DEBUG", "queue", "text", False),
+    ("queue, JSON lines", "queue", "json", False),
+]
+
+
+def log_city(logger, city_name, payload, payload_at_info):
+    """The log calls made for one city between fetching and saving it."""
+    logger.info("Starting to fetch city weather data using meteo api")
+    logger.info(f"Weather data fetched successfully for {city_name}")
+    if payload_at_info:
+        logger.info(payload)
+    else:
+        log_payload(logger, city_name, payload)
+    logger.info("Extracting weather data received from API and saving in CSV")
+
+
+def run(config, cities, threads, payload, log_dir):
+    label, mode, log_format, payload_at_info = config
+    constants.LOG_MODE = mode
+    constants.LOG_FORMAT = log_format
+    logger = setup_logger(
+        f"bench.{mode}.{log_format}.{payload_at_info}",
+        str(Path(log_dir) / f"{mode}-{log_format}-{payload_at_info}.log"),
+        console_output=False,
+    )
+
+    def log_one(i):
+        start = time.perf_counter()
+        log_city(logger, f"City {i}", payload, payload_at_info)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        per_city = list(executor.map(log_one, range(cities)))
+    caller_time = time.perf_counter() - start
+    # Wait for the background writer, so the total includes every write
+    logger_module.stop_log_listeners()
+    total_time = time.perf_counter() - start
+
+    per_city.sort()
+    return (
+        label,
+        sum(per_city) / cities * 1e6,
+        per_city[int(cities * 0.99)] * 1e6,
+        caller_time,
+        total_time,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cities", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--hours", type=int, default=168)
+    args = parser.parse_args()
+
+    payload = build_forecast_payload(51.5, -0.12, args.hours)
+    with tempfile.TemporaryDirectory() as log_dir:
+        print(
+            f"{'configuration':34} {'mean/city':>11} {'p99/city':>11} "
+            f"{'callers':>9} {'total':>9}"
+        )
+        for config in CONFIGS:
+            label, mean, p99, caller_time, total_time = run(
+                config, args.cities, args.threads, payload, log_dir
+            )
+            print(
+                f"{label:34} {mean:9.1f}us {p99:9.1f}us "
+                f"{caller_time:8.3f}s {total_time:8.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+End to end pipeline run against a local stub of Open Meteo, timing every stage and API endpoint.
+
+Every stage (fetch, process, rollup, plot, publish) runs in a scratch folder on
+synthetic forecasts for the given city and hour counts, then the API serves its
+outputs through uvicorn. Stage durations, endpoint latencies and peak RSS are
+written as JSON, and --compare reports the changes against an earlier result.
+
+Usage:
+    python -m benchmarks.bench_pipeline --cities 1000 --hours 168 --output results.json
+    python -m benchmarks.bench_pipeline --cities 1000 --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+import uvicorn
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from benchmarks.stub_server import StubWeatherServer
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+STAGES = ["fetch", "process", "rollup", "plot", "publish"]
+
+ENDPOINTS = [
+    "/data?type=weather",
+    "/data?type=highest_temp",
+    "/data?type=daily_rollup",
+    "/data/query?type=weather&city=City 0&limit=100",
+    "/data/query?type=highest_temp&start=2024-12-03T00:00&end=2024-12-03T23:00",
+    "/graphs?type=city_temperature_time",
+    "/graphs/render?type=city_temperature_time&city=City 0&format=svg",
+    "/history?city=City 0&start=2024-12-02T00:00",
+]
+
+# Timings that grew by more than this share are reported as regressions
+DEFAULT_TOLERANCE = 0.1
+
+
+def synthetic_cities(count):
+    # A tenth of a degree apart, so nearby city merging never kicks in
+    return [
+        {
+            "City": f"City {i}",
+            "Latitude": -60 + (i % 120),
+            "Longitude": -170 + 0.1 * (i // 120),
+        }
+        for i in range(count)
+    ]
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def run_stages(args):
+    """
+    Run every pipeline stage once in the current folder.
+
+    Returns:
+        dict: Duration in seconds and peak RSS after every stage.
+    """
+    from utils.data_plotter import (
+        plot_city_temperature_charts,
+        plot_graphs_from_processed_data,
+    )
+    from utils.generate_file_name import get_raw_weather_data_path
+    from utils.process_weather_data import process_weather_data
+    from utils.publication import publish_outputs
+    from utils.rollups import update_rollups
+    from weather_scrap import fetch_weather_data_for_cities
+
+    def plot():
+        plot_graphs_from_processed_data(force=True)
+        if args.city_charts:
+            plot_city_temperature_charts(force=True)
+
+    stage_functions = {
+        "fetch": lambda: fetch_weather_data_for_cities(
+            batch_size=args.batch_size, concurrency=args.concurrency
+        ),
+        "process": lambda: process_weather_data(
+            get_raw_weather_data_path(constants.STORAGE_FORMAT), top_k=args.top_k
+        ),
+        "rollup": lambda: update_rollups(full=True),
+        "plot": plot,
+        "publish": publish_outputs,
+    }
+
+    results = {}
+    for stage in STAGES:
+        start = time.perf_counter()
+        stage_functions[stage]()
+        results[stage] = {
+            "seconds": round(time.perf_counter() - start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        }
+    return results
+
+
+def start_server(port):
+    # Imported once the scratch folder is set up, app paths are fixed at import
+    from app import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def measure_endpoints(port, count):
+    """
+    Request every endpoint `count` times, after one untimed warm up request.
+
+    Returns:
+        dict: Status, response size and latency percentiles of every endpoint.
+    """
+    base = f"http://127.0.0.1:{port}"
+    results = {}
+    with requests.Session() as session:
+        for endpoint in ENDPOINTS:
+            first = session.get(base + endpoint)
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                response = session.get(base + endpoint)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            results[endpoint] = {
+                "status": response.status_code,
+                "bytes": len(response.content),
+                "first_ms": round(first.elapsed.total_seconds() * 1000, 3),
+                "p50_ms": round(statistics.median(latencies), 3),
+                "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+            }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timings(result):
+    """
+    Flatten the timings of a result into {name: seconds or milliseconds}.
+    """
+    flat = {
+        f"stage {stage}": stats["seconds"] for stage, stats in result["stages"].items()
+    }
+    flat.update(
+        {
+            f"endpoint {endpoint}": stats["p50_ms"]
+            for endpoint, stats in result["endpoints"].items()
+        }
+    )
+    flat["peak rss"] = result["peak_rss_mb"]
+    return flat
+
+
+def compare(result, baseline, tolerance):
+    """
+    Print the change of every timing against a baseline result.
+
+    Returns:
+        list: Names of the timings that grew by more than `tolerance`.
+    """
+    if baseline["config"] != result["config"]:
+        print("\nThe baseline was run with other settings, changes are not comparable")
+    current, previous = timings(result), timings(baseline)
+    regressions = []
+    print(
+        f"\n{'vs ' + baseline.get('commit', '?'):<72} {'before':>10} {'after':>10} {'change':>8}"
+    )
+    for name, value in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        change = value / before - 1
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  slower"
+        print(f"{name:<72} {before:>10.3f} {value:>10.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cities", type=int, default=1000)
+    parser.add_argument("--hours", type=int, default=168)
+    parser.add_argument(
+        "--latency", type=float, default=0.01, help="Stub server delay per request"
+    )
+    parser.add_argument("--batch-size", type=int, default=constants.FETCH_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=constants.FETCH_CONCURRENCY)
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--city-charts", action="store_true")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Pipeline runs, each in a fresh folder, stage times are the median",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=50, help="Timed requests per endpoint"
+    )
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    baseline_file = Path(args.compare).resolve() if args.compare else None
+
+    # Every run starts cold, outside the repository's own data folders
+    constants.CITIES = synthetic_cities(args.cities)
+    constants.FETCH_RATE_LIMIT = 0
+    constants.RESPONSE_CACHE_ENABLED = False
+    constants.EVENTS_ENABLED = False
+
+    work_dir = os.getcwd()
+    scratch = tempfile.TemporaryDirectory()
+    runs = []
+    with StubWeatherServer(latency=args.latency, hours=args.hours) as server:
+        constants.WEATHER_API_URL = server.url
+        for run in range(args.repeat):
+            run_dir = Path(scratch.name) / f"run-{run}"
+            for folder in ("Data", "Graphs", "weather_data", "cache"):
+                (run_dir / folder).mkdir(parents=True)
+            os.chdir(run_dir)
+            runs.append(run_stages(args))
+            print(
+                f"run {run + 1}: "
+                + "  ".join(
+                    f"{stage} {runs[-1][stage]['seconds']:.2f}s" for stage in STAGES
+                )
+            )
+
+    # The API serves the outputs of the last run
+    os.environ["WEATHER_APP_DIR"] = str(run_dir)
+    server, thread = start_server(args.port)
+    try:
+        endpoints = measure_endpoints(args.port, args.requests)
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    stages = {
+        stage: {
+            "seconds": round(statistics.median(r[stage]["seconds"] for r in runs), 4),
+            "runs": [r[stage]["seconds"] for r in runs],
+            "peak_rss_mb": runs[-1][stage]["peak_rss_mb"],
+            "children_peak_rss_mb": runs[-1][stage]["children_peak_rss_mb"],
+        }
+        for stage in STAGES
+    }
+    result = {
+        "benchmark": "pipeline",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {
+            "cities": args.cities,
+            "hours": args.hours,
+            "latency": args.latency,
+            "batch_size": args.batch_size,
+            "concurrency": args.concurrency,
+            "top_k": args.top_k,
+            "city_charts": args.city_charts,
+            "repeat": args.repeat,
+            "requests": args.requests,
+            "storage_format": constants.STORAGE_FORMAT,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": stages,
+        "endpoints": endpoints,
+        "peak_rss_mb": peak_rss_mb(),
+        "children_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    os.chdir(work_dir)
+    scratch.cleanup()
+
+    print(f"\n{'stage':<10} {'seconds':>10} {'peak RSS MB':>12}")
+    for stage, stats in stages.items():
+        print(f"{stage:<10} {stats['seconds']:>10.3f} {stats['peak_rss_mb']:>12.1f}")
+    print(f"\n{'endpoint':<72} {'status':>6} {'bytes':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for endpoint, stats in endpoints.items():
+        print(
+            f"{endpoint:<72} {stats['status']:>6} {stats['bytes']:>10} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f}"
+        )
+
+    if output:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {output}")
+
+    if baseline_file:
+        regressions = compare(
+            result, json.loads(baseline_file.read_text()), args.tolerance
+        )
+        if regressions:
+            print(
+                f"\n{len(regressions)} timings are more than {args.tolerance:.0%} slower"
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
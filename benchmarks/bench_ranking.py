@@ -0,0 +1,71 @@
+"""
+Per-hour city ranking: grouped idxmax/idxmin against the original per-hour loop.
+
+Usage:
+    python -m benchmarks.bench_ranking --cities 10000 --hours 168
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from benchmarks.synthetic import synthetic_weather_frame
+from utils.process_weather_data import rank_cities_per_hour
+
+
+def rank_cities_per_hour_loop(df, metric, ascending=False):
+    """The per-hour filter and sort loop process_weather_data used before."""
+    data = []
+    for hour in df["Time"].unique():
+        hour_df = df[df["Time"] == hour].sort_values(metric, ascending=ascending)[
+            ["City", metric]
+        ]
+        data.append(
+            {
+                "Hour": hour,
+                "City": hour_df["City"].iloc[0],
+                metric: hour_df[metric].iloc[0],
+            }
+        )
+    return pd.DataFrame(data)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cities", type=int, default=10000)
+    parser.add_argument("--hours", type=int, default=168)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    df = synthetic_weather_frame(args.cities, args.hours)
+    df["Temperature (°F)"] = (df["Temperature (°C)"] * 9 / 5) + 32
+    print(f"{len(df):,} rows ({args.cities} cities x {args.hours} hours)")
+
+    for metric, ascending in (
+        ("Temperature (°F)", False),
+        ("Relative Humidity (%)", True),
+    ):
+        loop, loop_time = timed(rank_cities_per_hour_loop, df, metric, ascending)
+        grouped, grouped_time = timed(rank_cities_per_hour, df, metric, ascending)
+        _, top_k_time = timed(rank_cities_per_hour, df, metric, ascending, args.top_k)
+
+        # Ties may resolve to different cities, the ranked values must match
+        assert (loop[metric].to_numpy() == grouped[metric].to_numpy()).all()
+        print(
+            f"{metric:<24} loop {loop_time:7.3f}s  grouped {grouped_time:7.3f}s "
+            f"({loop_time / grouped_time:5.1f}x)  top-{args.top_k} {top_k_time:7.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Fetch runs with the response cache: cold, fresh, revalidated and after a model update.
+
+Usage:
+    python -m benchmarks.bench_response_cache --cities 500 --latency 0.05
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from benchmarks.stub_server import StubWeatherServer
+from utils.async_fetcher import fetch_weather_data_concurrently
+from utils.response_cache import ResponseCache
+
+
+class HourlyRunClock:
+    """Wall clock shifted by one hour per simulated run."""
+
+    def __init__(self):
+        self.runs = 0
+
+    def __call__(self):
+        return time.time() + self.runs * 3600
+
+
+def city_list(count):
+    return [
+        {"City": f"City {i}", "Latitude": -60 + i % 120, "Longitude": -170 + i // 120}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=1)
+    args = parser.parse_args()
+
+    cities = city_list(args.cities)
+    with tempfile.TemporaryDirectory() as cache_dir, StubWeatherServer(
+        latency=args.latency, etag=True
+    ) as server:
+        # Runs an hour apart, so every cached response has passed a model update
+        clock = HourlyRunClock()
+        cache = ResponseCache(cache_dir, clock=clock)
+
+        def run(label):
+            requests_before = server.request_count
+            not_modified_before = server.not_modified_count
+            hits, misses, revalidated = cache.hits, cache.misses, cache.revalidated
+            start = time.perf_counter()
+            results = fetch_weather_data_concurrently(
+                cities,
+                url=server.url,
+                rate_limit=0,
+                batch_size=args.batch_size,
+                cache=cache,
+            )
+            elapsed = time.perf_counter() - start
+            assert all(series is not None for series in results.values())
+            print(
+                f"{label:24} {elapsed:7.2f}s  requests {server.request_count - requests_before:5}"
+                f"  304s {server.not_modified_count - not_modified_before:5}"
+                f"  hits {cache.hits - hits:5}  misses {cache.misses - misses:5}"
+                f"  revalidated {cache.revalidated - revalidated:5}"
+            )
+
+        run("cold cache")
+        run("fresh cache")
+        clock.runs += 1
+        run("stale, unchanged model")
+        clock.runs += 1
+        server.model_run += 1
+        run("stale, new model run")
+
+
+if __name__ == "__main__":
+    main()
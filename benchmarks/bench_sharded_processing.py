@@ -0,0 +1,68 @@
+"""
+Full processing runs on one process against city hash shards on 1 to N worker processes.
+
+Usage:
+    python -m benchmarks.bench_sharded_processing --cities 20000 --hours 168 --max-workers 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from benchmarks.synthetic import synthetic_weather_frame
+from utils.process_weather_data import process_weather_data
+from utils.sharded_processing import process_weather_data_sharded
+
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--cities", type=int, default=20000)
+    parser.add_argument("--hours", type=int, default=168)
+    parser.add_argument("--top-k", type=int, default=1)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        raw_file = str(Path(work_dir) / "weather.csv")
+        synthetic_weather_frame(args.cities, args.hours).to_csv(raw_file, index=False)
+        size = os.path.getsize(raw_file) / 2**20
+        print(f"{args.cities * args.hours:,} rows, {size:.0f} MB raw CSV")
+
+        # Outputs go to Data/ relative to the working directory
+        os.chdir(work_dir)
+        os.makedirs("Data")
+        baseline = timed(
+            process_weather_data, raw_file, args.top_k, incremental=False, workers=1
+        )
+        print(f"{'single process':18} {baseline:7.2f}s")
+        for workers in worker_counts(args.max_workers):
+            elapsed = timed(
+                process_weather_data_sharded, raw_file, args.top_k, workers=workers
+            )
+            print(
+                f"{f'{workers} worker shards':18} {elapsed:7.2f}s  "
+                f"({baseline / elapsed:4.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
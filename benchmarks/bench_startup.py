@@ -0,0 +1,72 @@
+"""
+Import time of the entry points, measured with python -X importtime.
+
+Every module is imported in a fresh interpreter, so nothing is cached between
+measurements. The heaviest imports pulled in by each entry point are listed too.
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = [
+    "weather_scrap",
+    "app",
+    "utils.process_weather_data",
+    "utils.data_plotter",
+    "scheduler",
+]
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        dict: Cumulative import time in microseconds of every imported package.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        total = statistics.median(run[module] for run in runs) / 1000
+        heaviest = sorted(
+            (name for name in runs[-1] if "." not in name and name != module),
+            key=runs[-1].get,
+            reverse=True,
+        )[: args.top]
+        details = ", ".join(
+            f"{name} {runs[-1][name] / 1000:.0f}ms" for name in heaviest
+        )
+        print(f"{module:<28} {total:8.1f} ms   ({details})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def build_forecast_payload(latitude, longitude, hours=168, start=None, unixtime=False):
+    """
+    Build a synthetic Open Meteo hourly forecast payload for one location.
+
+    Args:
+        latitude (float): Latitude of the location.
+        longitude (float): Longitude of the location.
+        hours (int): Number of hourly points to generate.
+        start (datetime, optional): First hour of the series. Defaults to 3 days ago.
+        unixtime (bool): Send times as epoch seconds, like timeformat=unixtime.
+
+    Returns:
+        dict: Payload shaped like the Open Meteo forecast response.
+    """
+    start = start or datetime(2024, 12, 2)
+    seed = abs(hash((round(latitude, 4), round(longitude, 4)))) % 1000
+    times, temps, humidity, codes, wind = [], [], [], [], []
+    for i in range(hours):
+        hour = start + timedelta(hours=i)
+        if unixtime:
+            times.append(int(hour.replace(tzinfo=timezone.utc).timestamp()))
+        else:
+            times.append(hour.strftime("%Y-%m-%dT%H:%M"))
+        temps.append(round(15 + 10 * math.sin((i + seed) / 24 * 2 * math.pi), 1))
+        humidity.append(40 + (i * 7 + seed) % 50)
+        codes.append((i + seed) % 4)
+        wind.append(round(1 + ((i * 13 + seed) % 90) / 10, 2))
+
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": "GMT",
+        "utc_offset_seconds": 0,
+        "hourly": {
+            "time": times,
+            "temperature_2m": temps,
+            "relative_humidity_2m": humidity,
+            "weather_code": codes,
+            "wind_speed_10m": wind,
+        },
+    }
+
+
+class StubWeatherServer:
+    """
+    Local stand-in for the Open Meteo forecast endpoint.
+    Accepts single or comma separated latitude/longitude lists and answers after
+    an artificial latency, so client side concurrency can be measured offline.
+
+    With etag=True responses carry an ETag, and a matching If-None-Match gets a
+    304 Not Modified. Increase model_run to simulate a model update, which
+    changes the data and therefore the ETag. max_age adds a Cache-Control header.
+    """
+
+    def __init__(
+        self,
+        latency=0.05,
+        hours=168,
+        host="127.0.0.1",
+        port=0,
+        etag=False,
+        max_age=None,
+    ):
+        self.latency = latency
+        self.hours = hours
+        self.etag = etag
+        self.max_age = max_age
+        self.model_run = 0
+        self.request_count = 0
+        self.not_modified_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.request_count += 1
+                query = parse_qs(urlsplit(self.path).query)
+                latitudes = [float(v) for v in query["latitude"][0].split(",")]
+                longitudes = [float(v) for v in query["longitude"][0].split(",")]
+                unixtime = query.get("timeformat") == ["unixtime"]
+                payloads = [
+                    build_forecast_payload(lat, lon, stub.hours, unixtime=unixtime)
+                    for lat, lon in zip(latitudes, longitudes)
+                ]
+                for payload in payloads:
+                    hourly = payload["hourly"]
+                    hourly["temperature_2m"] = [
+                        round(value + stub.model_run * 0.1, 1)
+                        for value in hourly["temperature_2m"]
+                    ]
+                body = json.dumps(payloads[0] if len(payloads) == 1 else payloads)
+                body = body.encode()
+
+                headers = {}
+                if stub.etag:
+                    headers["ETag"] = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+                if stub.max_age is not None:
+                    headers["Cache-Control"] = f"max-age={stub.max_age}"
+
+                time.sleep(stub.latency)
+                if stub.etag and self.headers.get("If-None-Match") == headers["ETag"]:
+                    with stub._lock:
+                        stub.not_modified_count += 1
+                    self.send_response(304)
+                    body = b""
+                else:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+RAW_COLUMNS = [
+    "City",
+    "Latitude",
+    "Longitude",
+    "Weather Code",
+    "Timezone",
+    "Time",
+    "Relative Humidity (%)",
+    "Temperature (°C)",
+    "Wind Speed (m/s)",
+]
+
+
+def synthetic_weather_frame(cities=1000, hours=168, seed=0, start="2024-12-02"):
+    """
+    Build a DataFrame shaped like weather_data/weather_<date>.csv.
+
+    Args:
+        cities (int): Number of distinct cities.
+        hours (int): Number of hourly rows per city.
+        seed (int): Random seed, the same arguments always give the same frame.
+        start (str): First hour of every series.
+
+    Returns:
+        pd.DataFrame: One row per city and hour, ordered city by city like the scraper writes it.
+    """
+    rng = np.random.default_rng(seed)
+    rows = cities * hours
+    times = pd.date_range(start, periods=hours, freq="h").strftime("%Y-%m-%dT%H:%M")
+
+    return pd.DataFrame(
+        {
+            "City": np.repeat([f"City {i}" for i in range(cities)], hours),
+            "Latitude": np.repeat(rng.uniform(-60, 70, cities).round(4), hours),
+            "Longitude": np.repeat(rng.uniform(-180, 180, cities).round(4), hours),
+            "Weather Code": rng.integers(0, 4, rows),
+            "Timezone": "GMT",
+            "Time": np.tile(times, cities),
+            "Relative Humidity (%)": rng.integers(5, 100, rows),
+            "Temperature (°C)": rng.normal(15, 10, rows).round(1),
+            "Wind Speed (m/s)": rng.gamma(2, 2, rows).round(2),
+        },
+        columns=RAW_COLUMNS,
+    )
@@ -25,6 +25,103 @@ WEATHER_API_PARAMS = {
     "timezone": "GMT",
     "wind_speed_unit": "ms",
     "past_days": 3,
+    # Epoch seconds decode straight into the int64 time axis of WeatherSeries
+    "timeformat": "unixtime",
 }
 
 GEO_NINJAS_API_URL = "https://api.api-ninjas.com/v1/geocoding?city={}"
+
+# Concurrent fetch engine settings
+FETCH_CONCURRENCY = 16  # Maximum in-flight requests, 1 keeps the sequential fetch
+FETCH_RATE_LIMIT = 50  # Requests per second per host, 0 disables rate limiting
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.5  # Base delay in seconds, doubled on every retry
+FETCH_TIMEOUT = 30
+
+# Multi location requests, Open Meteo accepts comma separated coordinate lists
+FETCH_BATCH_SIZE = 50  # Cities per request, 1 sends one request per city
+FETCH_MAX_URL_LENGTH = 8000
+
+# Cities closer than this share one upstream request, the forecast models resolve
+# a few kilometres at best, so nearby cities would get the same grid cell anyway.
+# The series is stored under every city name. 0 only merges repeated city names.
+SPATIAL_DEDUP_DISTANCE_KM = 2.0
+
+# Forecast response cache in cache/responses. A response is reused without a request
+# until the next model update boundary (or the upstream Cache-Control max-age, if
+# shorter), then revalidated with its ETag. Entries unused for MAX_AGE are deleted.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MODEL_UPDATE_INTERVAL = 3600  # Seconds between weather model updates
+RESPONSE_CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Geocode cache, coordinates rarely change so entries live for a long time
+GEOCODE_CACHE_TTL = 90 * 24 * 60 * 60  # Seconds, None keeps entries forever
+GEOCODE_CACHE_MAX_ENTRIES = 50000  # Least recently used entries are evicted first
+GEOCODE_WORKERS = 8  # Parallel geocoder requests for cache misses
+
+# Raw weather data storage, "csv" appends to weather_data/weather_<date>.csv,
+# "parquet" writes date partitioned files under weather_data/parquet and "sqlite"
+# upserts into weather_data/weather.db, which also gets a copy of the processed
+# outputs that processing, plotting and the API query instead of the CSV files
+STORAGE_FORMAT = "csv"
+PARQUET_BATCH_ROWS = 100000  # Rows buffered in memory before a part file is written
+SQLITE_BATCH_ROWS = 100000  # Rows upserted per transaction
+
+# Every fetched series is also appended to the historical store in weather_data/history,
+# which answers multi day range queries without re-reading the daily files
+HISTORY_STORE_ENABLED = True
+
+# Daily and weekly per city aggregates built from the historical store into
+# Data/daily_rollups.csv and Data/weekly_rollups.csv, only changed days are recomputed
+ROLLUP_PERCENTILES = [50, 90]
+ROLLUP_DAILY_WINDOW = 7  # Days in the rolling mean of the daily table
+ROLLUP_WEEKLY_WINDOW = 4  # Weeks in the rolling mean of the weekly table
+
+# Incremental processing only handles rows added to the raw data since the last run
+INCREMENTAL_PROCESSING = False
+
+# Processes sharing a full processing run, the raw rows are split by city hash and
+# handed to a process pool through shared memory. 1 processes in a single process,
+# None uses every core.
+PROCESS_WORKERS = 1
+
+# Streaming processing reads the raw data in chunks of PROCESS_CHUNK_ROWS rows and
+# keeps running per hour rankings, so memory stays flat however large the input is
+STREAMING_PROCESSING = False
+PROCESS_CHUNK_ROWS = 200000
+
+# Live updates, the pipeline appends an event per stored city series and per ranking
+# file to cache/events.jsonl, which the API pushes to SSE and WebSocket subscribers
+EVENTS_ENABLED = True
+EVENT_LOG_MAX_BYTES = 16 * 1024 * 1024  # Rotate the event log at this size
+
+# Versioned outputs, every run publishes the Data and Graphs files as a new generation
+# in published/<id> and atomically points published/current at it, which the API
+# serves from. Files that did not change are hard linked from the previous generation.
+VERSIONED_OUTPUTS = True
+PUBLISH_KEEP_GENERATIONS = 5  # Older generations are deleted, rollbacks pick from these
+
+# Graph rendering
+PLOT_WORKERS = None  # Processes used to render graphs, None uses every core
+
+# Scheduler daemon, every group runs fetch -> process -> plot on its own interval.
+# An empty city list uses CITIES, otherwise names are resolved with the geocoder.
+SCHEDULE_GROUPS = [
+    {"name": "default", "cities": [], "interval": 3600, "jitter": 120},
+]
+
+# Logging, "queue" hands records to a background writer thread, "sync" writes
+# them on the calling thread. LOG_FORMAT is "text" or "json" (one object per line).
+LOG_MODE = "queue"
+LOG_FORMAT = "text"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log file at this size, 0 never rotates
+LOG_ROTATE_WHEN = None  # Rotate on time instead, e.g. "midnight"
+LOG_BACKUP_COUNT = 5
+# Every program (weather_scrap, scheduler, uvicorn...) writes and rotates its own
+# file, e.g. logs/weather_scrapper.scheduler.log, its worker processes append to it
+LOG_FILE_PER_PROCESS = True
+LOG_PAYLOAD_SAMPLE_RATE = 0.01  # Share of API payloads logged, only at DEBUG level
+
+# Dump a cProfile (or pyinstrument, when installed) profile of every CLI and
+# scheduler run to cache/profiles, also enabled with the --profile CLI flag
+PROFILE_RUNS = False
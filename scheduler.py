@@ -0,0 +1,222 @@
+import json
+import os
+import random
+import signal
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import constants
+from utils.async_fetcher import build_session
+from utils.generate_file_name import (
+    get_raw_weather_data_path,
+    get_scheduler_metrics_file,
+)
+from utils.geocode_cache import GeocodeCache
+from utils.history_store import compact_settled_days
+from utils.logger import setup_logger
+from utils.metrics import load_process_metrics, save_process_metrics
+from utils.profiler import profile_run
+from utils.response_cache import ResponseCache
+from weather_scrap import fetch_weather_data_for_cities
+from utils.process_weather_data import process_weather_data
+from utils.rollups import update_rollups
+from utils.data_plotter import plot_graphs_from_processed_data
+from utils.publication import publish_outputs
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+
+class GroupMetrics:
+    """
+    Run counters and timings of one city group.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_started = None
+        self.last_status = None
+        self.stage_seconds = {}
+
+    def as_dict(self):
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_started": self.last_started,
+            "last_status": self.last_status,
+            "stage_seconds": self.stage_seconds,
+        }
+
+
+class WeatherScheduler:
+    """
+    Long running service that runs fetch -> process -> plot for every city group
+    on its own interval, keeping the HTTP session and geocode cache warm between runs.
+
+    A group never overlaps with itself: a run that is due while the previous run
+    of the group is still going is skipped. Groups fetch concurrently, but their
+    writes to the shared daily files go through the store lock of
+    fetch_weather_data_for_cities. Processing and plotting work on the shared
+    daily files, so those stages are serialised across groups. Processing is
+    always incremental, so every cycle only handles the rows fetched since the
+    previous one instead of the whole day.
+    """
+
+    def __init__(self, groups=None, metrics_file=None):
+        self.groups = groups or constants.SCHEDULE_GROUPS
+        self.metrics_file = metrics_file or get_scheduler_metrics_file()
+        self.session = build_session(constants.FETCH_CONCURRENCY)
+        self.geocode_cache = GeocodeCache()
+        self.response_cache = (
+            ResponseCache() if constants.RESPONSE_CACHE_ENABLED else None
+        )
+        self.metrics = {
+            group["name"]: GroupMetrics(group["name"]) for group in self.groups
+        }
+        self._running = {group["name"]: threading.Lock() for group in self.groups}
+        self._pipeline_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._stop = threading.Event()
+        load_process_metrics("scheduler")
+
+    def _timed(self, metrics, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        metrics.stage_seconds[stage] = round(time.perf_counter() - start, 3)
+        return result
+
+    def run_group(self, group):
+        """
+        Run fetch -> process -> plot once for a city group, unless it is already running.
+
+        Args:
+            group (dict): Group config with name and cities keys.
+
+        Returns:
+            bool: False if the run was skipped because the previous one is still going.
+        """
+        metrics = self.metrics[group["name"]]
+        if not self._running[group["name"]].acquire(blocking=False):
+            metrics.skipped += 1
+            logger.warning(
+                f"Skipping {group['name']} run, the previous run is still going"
+            )
+            return False
+
+        try:
+            metrics.runs += 1
+            metrics.last_started = time.time()
+            with profile_run(f"scheduler-{group['name']}"):
+                self._run_stages(group, metrics)
+            metrics.last_status = "ok"
+            logger.info(f"Run of {group['name']} finished: {metrics.stage_seconds}")
+        except Exception as e:
+            metrics.failures += 1
+            metrics.last_status = f"error: {e}"
+            logger.exception(f"Run of {group['name']} failed")
+        finally:
+            self._running[group["name"]].release()
+            self.write_metrics()
+        return True
+
+    def _run_stages(self, group, metrics):
+        self._timed(
+            metrics,
+            "fetch",
+            fetch_weather_data_for_cities,
+            group["cities"],
+            session=self.session,
+            geocode_cache=self.geocode_cache,
+            response_cache=self.response_cache,
+        )
+        with self._pipeline_lock:
+            self._timed(
+                metrics,
+                "process",
+                process_weather_data,
+                get_raw_weather_data_path(constants.STORAGE_FORMAT),
+                incremental=True,
+            )
+            if constants.HISTORY_STORE_ENABLED:
+                self._timed(metrics, "compact", compact_settled_days)
+                self._timed(metrics, "rollup", update_rollups)
+            self._timed(metrics, "plot", plot_graphs_from_processed_data)
+            if constants.VERSIONED_OUTPUTS:
+                self._timed(metrics, "publish", publish_outputs)
+
+    def write_metrics(self):
+        """
+        Write the metrics of every group to the metrics file, and the pipeline
+        metrics to the snapshot exported by the API.
+        """
+        with self._metrics_lock:
+            save_process_metrics("scheduler")
+            path = Path(self.metrics_file)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(
+                    {name: metrics.as_dict() for name, metrics in self.metrics.items()},
+                    f,
+                    indent=2,
+                )
+            os.replace(tmp_path, path)
+
+    def _group_loop(self, group):
+        # Start every group at a random point of its jitter window, so groups spread out
+        delay = random.uniform(0, group.get("jitter", 0))
+        while not self._stop.wait(delay):
+            threading.Thread(
+                target=self.run_group, args=(group,), name=f"run-{group['name']}"
+            ).start()
+            jitter = group.get("jitter", 0)
+            delay = max(0, group["interval"] + random.uniform(-jitter, jitter))
+
+    def start(self):
+        """
+        Start one timer thread per group and return immediately.
+        """
+        for group in self.groups:
+            threading.Thread(
+                target=self._group_loop,
+                args=(group,),
+                name=f"schedule-{group['name']}",
+                daemon=True,
+            ).start()
+        logger.info(
+            f"Scheduler started with groups: {[g['name'] for g in self.groups]}"
+        )
+
+    def stop(self):
+        """
+        Stop scheduling new runs and wait for the runs already going to finish.
+        """
+        self._stop.set()
+        for running in self._running.values():
+            with running:
+                pass
+        self.session.close()
+
+    def run_forever(self):
+        """
+        Start the scheduler and block until SIGINT or SIGTERM.
+        """
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self._stop.set())
+        self.start()
+        self._stop.wait()
+        logger.info("Scheduler stopping")
+        self.stop()
+
+
+def main():
+    WeatherScheduler().run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import synthetic_weather_frame  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Run the test in an empty folder laid out like the repository, every getter
+    in utils.generate_file_name is relative to the working directory.
+    """
+    for folder in ("Data", "Graphs", "cache", "weather_data"):
+        (tmp_path / folder).mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def output_files():
+    """
+    The files every processing mode writes, compared between modes.
+    """
+    return [
+        "Data/weather_data.csv",
+        "Data/highest_temp_cities.csv",
+        "Data/lowest_humidity_cities.csv",
+    ]
+
+
+@pytest.fixture
+def read_outputs(output_files):
+    """
+    Read the processed files of the working directory, as DataFrames or, with
+    raw=True, as the bytes written.
+    """
+
+    def read(raw=False):
+        if raw:
+            return {path: Path(path).read_bytes() for path in output_files}
+        return {path: pd.read_csv(path) for path in output_files}
+
+    return read
+
+
+@pytest.fixture
+def write_raw_with_ties(workdir):
+    """
+    Write a synthetic raw CSV with the cases rankings must order like a full
+    run: equal values, missing values, a city without temperatures and city
+    hours fetched twice. Returns the path of the file.
+    """
+
+    def write(cities, hours, repeated_rows, shuffle=False):
+        df = synthetic_weather_frame(cities=cities, hours=hours)
+        # Whole degrees make ties, and a repeated fetch repeats city hours
+        df["Temperature (°C)"] = df["Temperature (°C)"].round()
+        df.loc[[5, 70, 200], "Relative Humidity (%)"] = np.nan
+        df.loc[df["City"] == "City 4", "Temperature (°C)"] = np.nan
+        if shuffle:
+            df = df.sample(frac=1.0, random_state=0)
+        df.to_csv("weather_data/raw.csv", index=False)
+        df.head(repeated_rows).to_csv(
+            "weather_data/raw.csv", index=False, mode="a", header=False
+        )
+        return "weather_data/raw.csv"
+
+    return write
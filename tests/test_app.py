@@ -0,0 +1,126 @@
+import asyncio
+import importlib
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic import synthetic_weather_frame
+from utils.process_weather_data import process_weather_data
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    """
+    The app serving the outputs of a processing run in a temporary folder.
+    """
+    base_dir = tmp_path_factory.mktemp("app")
+    for folder in ("Data", "Graphs", "cache", "weather_data"):
+        (base_dir / folder).mkdir()
+    cwd = os.getcwd()
+    os.chdir(base_dir)
+    try:
+        synthetic_weather_frame(cities=5, hours=48).to_csv(
+            "weather_data/raw.csv", index=False
+        )
+        process_weather_data("weather_data/raw.csv", incremental=False, workers=1)
+    finally:
+        os.chdir(cwd)
+
+    os.environ["WEATHER_APP_DIR"] = str(base_dir)
+    try:
+        sys.modules.pop("app", None)
+        yield importlib.import_module("app")
+    finally:
+        del os.environ["WEATHER_APP_DIR"]
+        sys.modules.pop("app", None)
+
+
+@pytest.fixture
+def client(app_module):
+    with TestClient(app_module.app) as client:
+        yield client
+
+
+def test_data_is_served_with_generation_validators(client):
+    response = client.get("/data?type=weather", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    revalidated = client.get(
+        "/data?type=weather",
+        headers={"Accept-Encoding": "identity", "If-None-Match": etag},
+    )
+    assert revalidated.status_code == 304
+
+
+def test_published_variants_are_never_written(client, app_module):
+    generation = app_module.current_generation(app_module.PUBLICATION_DIR)
+    csv_file = generation.file("Data/weather_data.csv")
+    served = client.get("/data?type=weather", headers={"Accept-Encoding": "gzip"})
+    assert served.headers["Content-Encoding"] == "gzip"
+
+    for variant in csv_file.parent.glob(csv_file.name + ".*"):
+        variant.unlink()
+    response = client.get("/data?type=weather", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert response.content == csv_file.read_bytes() == served.content
+    assert list(csv_file.parent.glob(csv_file.name + ".*")) == []
+
+
+def test_render_parses_and_filters_off_the_event_loop(client, app_module, monkeypatch):
+    on_loop = []
+
+    def record(func):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(func.__name__)
+            except RuntimeError:
+                pass
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    monkeypatch.setattr(app_module.data_cache, "get", record(app_module.data_cache.get))
+    monkeypatch.setattr(app_module, "query_frame", record(app_module.query_frame))
+
+    response = client.get("/graphs/render?type=temperature_city&city=Nowhere")
+    assert response.status_code == 404
+    assert on_loop == []
+
+
+def test_history_metrics_and_events_use_the_app_folder(app_module):
+    base_dir = app_module.BASE_DIR
+    assert app_module.history_store.root == base_dir / "weather_data" / "history"
+    assert app_module.event_broker.path == base_dir / "cache" / "events.jsonl"
+    assert app_module.sqlite_store.path == str(base_dir / "weather_data" / "weather.db")
+
+
+def test_metrics_read_snapshots_of_the_app_folder(client, app_module):
+    metrics_dir = app_module.BASE_DIR / "cache" / "metrics"
+    metrics_dir.mkdir(exist_ok=True)
+    app_module.REGISTRY.save(metrics_dir / "bench.json")
+
+    assert 'source="bench"' in client.get("/metrics").text
+
+
+@pytest.mark.parametrize(
+    "message",
+    ["not json", [], {"city": "Paris"}, {"type": "observation"}, {"city": [1]}],
+)
+def test_websocket_rejects_malformed_filters(client, message):
+    with client.websocket_connect("/events/ws") as websocket:
+        if message == "not json":
+            websocket.send_text(message)
+        else:
+            websocket.send_json(message)
+        # Answered with an error of its own, so a message that was let through
+        # fails the test instead of waiting forever
+        websocket.send_json({"type": ["unknown"]})
+        assert websocket.receive_json() == {
+            "type": "error",
+            "detail": 'Expected {"city": [...], "type": [...]}.',
+        }
@@ -0,0 +1,50 @@
+import pytest
+import requests
+
+from benchmarks.stub_server import StubWeatherServer
+from utils.async_fetcher import fetch_weather_data_concurrently
+
+CITIES = [
+    {"City": f"City {i}", "Latitude": -60 + 10 * i, "Longitude": 10.0 * i}
+    for i in range(4)
+]
+
+
+class TruncatingSession(requests.Session):
+    """Cuts the body of the first responses for one latitude short."""
+
+    def __init__(self, latitude, truncated):
+        super().__init__()
+        self.latitude = str(latitude)
+        self.truncated = truncated
+
+    def get(self, url, **kwargs):
+        response = super().get(url, **kwargs)
+        if self.truncated and str(kwargs["params"]["latitude"]) == self.latitude:
+            self.truncated -= 1
+            response._content = response.content[:40]
+        return response
+
+
+@pytest.mark.parametrize("truncated, fetched", [(1, True), (3, False)])
+def test_truncated_json_is_retried(truncated, fetched):
+    session = TruncatingSession(CITIES[1]["Latitude"], truncated)
+    with StubWeatherServer(latency=0, hours=24) as server:
+        results = fetch_weather_data_concurrently(
+            CITIES,
+            url=server.url,
+            concurrency=2,
+            rate_limit=0,
+            retries=2,
+            backoff=0,
+            batch_size=1,
+            session=session,
+        )
+        # City 1 is requested until its body is complete, at most three times
+        assert server.request_count == len(CITIES) - 1 + min(truncated + 1, 3)
+    session.close()
+
+    assert (results["City 1"] is not None) == fetched
+    assert all(
+        results[city["City"]] is not None for city in CITIES if city != CITIES[1]
+    )
@@ -0,0 +1,64 @@
+import pytest
+import requests
+
+from utils.batch_request import build_batch_params, build_batches, split_batch_response
+
+URL = "https://api.open-meteo.com/v1/forecast"
+
+CITIES = [
+    {"City": f"City {i}", "Latitude": -45.123 + 3.5 * i, "Longitude": 120.5 - 7.25 * i}
+    for i in range(10)
+]
+
+
+def request_url(batch):
+    return requests.Request("GET", URL, params=build_batch_params(batch)).prepare().url
+
+
+def test_batches_are_capped_by_count():
+    batches = build_batches(CITIES, URL, batch_size=4, max_url_length=10_000)
+
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [city for batch in batches for city in batch] == CITIES
+
+
+@pytest.mark.parametrize("cities_per_url", [1, 3, 4])
+def test_url_length_cap_splits_a_batch(cities_per_url):
+    # The longest URL of that many cities is exactly at the cap
+    max_url_length = max(
+        len(request_url(CITIES[i : i + cities_per_url]))
+        for i in range(len(CITIES) - cities_per_url + 1)
+    )
+
+    batches = build_batches(CITIES, URL, batch_size=50, max_url_length=max_url_length)
+
+    assert [city for batch in batches for city in batch] == CITIES
+    assert len(batches) > 1
+    assert max(len(batch) for batch in batches) >= cities_per_url
+    for batch in batches:
+        assert len(request_url(batch)) <= max_url_length
+    # Greedy packing, the next city would not have fit
+    for batch, following in zip(batches, batches[1:]):
+        assert len(request_url(batch + following[:1])) > max_url_length
+
+
+def test_single_location_response_is_an_object():
+    payload = {"latitude": CITIES[0]["Latitude"], "hourly": {}}
+
+    assert split_batch_response(payload, CITIES[:1]) == [("City 0", payload)]
+
+
+def test_list_response_follows_request_order():
+    payloads = [{"latitude": city["Latitude"]} for city in CITIES[:3]]
+
+    assert split_batch_response(payloads, CITIES[:3]) == [
+        (city["City"], payload) for city, payload in zip(CITIES, payloads)
+    ]
+
+
+@pytest.mark.parametrize("records", [1, 2, 4])
+def test_count_mismatch_raises(records):
+    payload = [{"latitude": 0.0}] * records if records > 1 else {"latitude": 0.0}
+
+    with pytest.raises(ValueError, match="Expected 3 locations"):
+        split_batch_response(payload, CITIES[:3])
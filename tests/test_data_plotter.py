@@ -0,0 +1,19 @@
+from benchmarks.synthetic import synthetic_weather_frame
+from utils import data_plotter
+from utils.process_weather_data import process_weather_data
+
+
+def test_city_charts_only_for_requested_cities(workdir, monkeypatch):
+    synthetic_weather_frame(cities=5, hours=6).to_csv(
+        "weather_data/raw.csv", index=False
+    )
+    process_weather_data("weather_data/raw.csv", incremental=False, workers=1)
+    jobs = []
+    monkeypatch.setattr(
+        data_plotter,
+        "render_graph_jobs",
+        lambda pending, *args, **kwargs: jobs.extend(pending),
+    )
+
+    data_plotter.plot_city_temperature_charts(cities=["City 1", "City 3"])
+    assert [job[2]["selected_city"] for job in jobs] == ["City 1", "City 3"]
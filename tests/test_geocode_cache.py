@@ -0,0 +1,57 @@
+import json
+import time
+
+from utils import city_geo_mapper
+from utils.city_geo_mapper import fetch_and_build_city_latitude_longitude_data
+from utils.geocode_cache import GeocodeCache
+
+
+def city(name, latitude, longitude):
+    return {"City": name, "Latitude": latitude, "Longitude": longitude}
+
+
+def test_save_keeps_newer_entries_of_other_processes(tmp_path):
+    path = tmp_path / "geocode.json"
+    ours = GeocodeCache(path, seed=[])
+    ours.put(city("Lyon", 45.0, 4.0))
+
+    theirs = GeocodeCache(path, seed=[])
+    time.sleep(0.01)
+    theirs.put(city("Lyon", 45.7, 4.8))
+    theirs.put(city("Nice", 43.7, 7.3))
+    theirs.save()
+
+    ours.save()
+    saved = json.loads(path.read_text())
+    assert saved["lyon"]["Latitude"] == 45.7
+    assert saved["nice"]["Latitude"] == 43.7
+
+
+def test_save_overwrites_older_entries(tmp_path):
+    path = tmp_path / "geocode.json"
+    theirs = GeocodeCache(path, seed=[])
+    theirs.put(city("Lyon", 45.0, 4.0))
+    theirs.save()
+
+    ours = GeocodeCache(path, seed=[])
+    time.sleep(0.01)
+    ours.put(city("Lyon", 45.7, 4.8))
+    ours.save()
+    assert json.loads(path.read_text())["lyon"]["Latitude"] == 45.7
+
+
+def test_empty_cache_passed_in_is_used(workdir, monkeypatch):
+    cache = GeocodeCache(workdir / "geocode.json", seed=[])
+    assert len(cache) == 0
+    monkeypatch.setenv("NINJAS_API_KEY", "key")
+    monkeypatch.setattr(
+        city_geo_mapper,
+        "fetch_city_latitude_longitude",
+        lambda name, api_key: city(name, 43.7, 7.3),
+    )
+
+    cities = fetch_and_build_city_latitude_longitude_data(["Nice"], cache=cache)
+    assert cities == [city("Nice", 43.7, 7.3)]
+    assert "Nice" in cache
+    # Nothing went to the default cache file
+    assert not (workdir / "cache" / "geocode_cache.json").exists()
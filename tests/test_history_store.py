@@ -0,0 +1,147 @@
+import multiprocessing
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from benchmarks.stub_server import build_forecast_payload
+from utils.history_store import (
+    SECONDS_PER_DAY,
+    HistoryStore,
+    HistoryWriter,
+    compact_settled_days,
+    to_epoch_seconds,
+)
+from utils.weather_series import WeatherSeries
+
+CITIES = [("Oslo", 59.9, 10.7), ("Rome", 41.9, 12.5)]
+
+
+def forecast(name, latitude, longitude, start, hours, shift=0.0):
+    payload = build_forecast_payload(latitude, longitude, hours, start=start)
+    hourly = payload["hourly"]
+    hourly["temperature_2m"] = [v + shift for v in hourly["temperature_2m"]]
+    return WeatherSeries.from_payload(payload, name)
+
+
+def append(root, start, hours, shift=0.0):
+    series = {}
+    with HistoryWriter(root) as writer:
+        for name, latitude, longitude in CITIES:
+            series[name] = forecast(name, latitude, longitude, start, hours, shift)
+            writer.append(series[name], name)
+    return series
+
+
+def segments(root, day):
+    store = HistoryStore(root)
+    partition = store._partition(store.root / f"day={day}")
+    return {city: len(s) for city, s in partition.index["cities"].items()}
+
+
+def test_round_trip(tmp_path):
+    series = append(tmp_path, datetime(2024, 12, 2), 60)
+    store = HistoryStore(tmp_path)
+
+    assert store.days() == ["2024-12-02", "2024-12-03", "2024-12-04"]
+    for name, stored in series.items():
+        for variable, values in stored.values.items():
+            times, read = store.query(name, variable)
+            np.testing.assert_array_equal(times, stored.time)
+            np.testing.assert_array_equal(read, values.astype(np.float32))
+    times, values = store.query("Oslo", "Temperature (°C)")
+    np.testing.assert_array_equal(values, series["Oslo"].values["temperature_2m"])
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        ("2024-12-02T05:00", "2024-12-02T09:00"),
+        ("2024-12-02T20:00", "2024-12-04T03:00"),
+        (None, "2024-12-03T00:00"),
+        ("2024-12-04T10:00", None),
+        ("2024-12-10T00:00", None),
+    ],
+)
+def test_range_queries(tmp_path, start, end):
+    series = append(tmp_path, datetime(2024, 12, 2), 60)["Rome"]
+    first = -np.inf if start is None else to_epoch_seconds(start)
+    last = np.inf if end is None else to_epoch_seconds(end)
+    expected = (series.time >= first) & (series.time <= last)
+
+    times, values = HistoryStore(tmp_path).query("Rome", "temperature_2m", start, end)
+
+    np.testing.assert_array_equal(times, series.time[expected])
+    np.testing.assert_array_equal(values, series.values["temperature_2m"][expected])
+
+
+def test_latest_value_wins(tmp_path):
+    append(tmp_path, datetime(2024, 12, 2), 48)
+    # A later fetch repeats the second day with updated values
+    latest = append(tmp_path, datetime(2024, 12, 3), 48, shift=2.0)["Oslo"]
+    store = HistoryStore(tmp_path)
+
+    times, values = store.query("Oslo", "temperature_2m", "2024-12-03T00:00")
+    np.testing.assert_array_equal(times, latest.time)
+    np.testing.assert_allclose(values, latest.values["temperature_2m"])
+
+    day = store.read_day("2024-12-03", ["Temperature (°C)"])
+    assert len(day) == 24 * len(CITIES)
+    oslo = day[day["City"] == "Oslo"]
+    np.testing.assert_allclose(
+        oslo["Temperature (°C)"], latest.values["temperature_2m"][:24]
+    )
+
+
+def test_settled_days_are_compacted(tmp_path):
+    for shift in (0.0, 1.0, 2.0):
+        append(tmp_path, datetime(2024, 12, 2), 72, shift=shift)
+    store = HistoryStore(tmp_path)
+    before = {
+        day: store.read_day(day, ["Temperature (°C)", "Wind Speed (m/s)"])
+        for day in store.days()
+    }
+    assert segments(tmp_path, "2024-12-02") == {"Oslo": 3, "Rome": 3}
+
+    # With past_days = 3, fetches on Dec 7 still write Dec 4
+    compacted = compact_settled_days(tmp_path, today=date(2024, 12, 7))
+
+    assert compacted == ["2024-12-02", "2024-12-03"]
+    assert segments(tmp_path, "2024-12-02") == {"Oslo": 1, "Rome": 1}
+    assert segments(tmp_path, "2024-12-04") == {"Oslo": 3, "Rome": 3}
+    store = HistoryStore(tmp_path)
+    for day, df in before.items():
+        after = store.read_day(day, ["Temperature (°C)", "Wind Speed (m/s)"])
+        assert after.equals(df)
+    # Compacted days are left alone from then on
+    assert compact_settled_days(tmp_path, today=date(2024, 12, 7)) == []
+
+
+def _append_many(root, worker):
+    start = datetime(2024, 12, 2)
+    for i in range(15):
+        with HistoryWriter(root) as writer:
+            series = forecast(f"City {worker}", worker, worker, start, 24)
+            writer.append(series, f"City {worker}")
+
+
+def test_processes_append_to_the_same_partition(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_append_many, args=(tmp_path, i)) for i in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    counts = segments(tmp_path, "2024-12-02")
+    assert counts == {f"City {i}": 15 for i in range(3)}
+    partition = tmp_path / "day=2024-12-02"
+    assert (partition / "time.i64").stat().st_size == 3 * 15 * 24 * 8
+    day = HistoryStore(tmp_path).read_day("2024-12-02", ["temperature_2m"])
+    assert len(day) == 3 * 24
+    assert (np.diff(day["Time"].to_numpy()) % 3600 == 0).all()
+    assert day["Time"].min() == to_epoch_seconds("2024-12-02T00:00")
+    assert day["Time"].max() < to_epoch_seconds("2024-12-02T00:00") + SECONDS_PER_DAY
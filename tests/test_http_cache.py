@@ -0,0 +1,90 @@
+import gzip
+
+import pytest
+
+from utils.http_cache import (
+    ENCODINGS,
+    parse_accept_encoding,
+    precompress_file,
+    select_precompressed_variant,
+)
+
+PREFERRED = ENCODINGS[0][0]
+SUFFIXES = {encoding: suffix for encoding, suffix, _ in ENCODINGS}
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, {}),
+        ("gzip, br", {"gzip": 1.0, "br": 1.0}),
+        ("gzip;q=0.5, BR; Q=0.8", {"gzip": 0.5, "br": 0.8}),
+        ("gzip;q=0, identity", {"gzip": 0.0, "identity": 1.0}),
+        ("gzip;q=0.0, *;q=0.1", {"gzip": 0.0, "*": 0.1}),
+        ("gzip;q=0.000", {"gzip": 0.0}),
+        ("gzip;q=high", {"gzip": 0.0}),
+    ],
+)
+def test_accept_encoding_is_parsed(header, expected):
+    assert parse_accept_encoding(header) == expected
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "weather_data.csv"
+    path.write_text("City,Time\n" + "Oslo,2024-12-02T00:00\n" * 200)
+    return path
+
+
+@pytest.mark.parametrize(
+    "header, encoding",
+    [
+        ("gzip", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip; q=0.0", None),
+        # A q value of 0.05 is not a refusal
+        ("gzip;q=0.05", "gzip"),
+        ("*", PREFERRED),
+        ("*;q=0.5, gzip;q=0", None if PREFERRED == "gzip" else PREFERRED),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_refused_encodings_are_not_served(data_file, header, encoding):
+    path, selected = select_precompressed_variant(data_file, header)
+
+    assert selected == encoding
+    if encoding is None:
+        assert path == data_file
+    else:
+        assert (
+            path.name
+            == data_file.name + dict((e, s) for e, s, _ in ENCODINGS)[encoding]
+        )
+
+
+def test_variants_are_created_on_demand(data_file):
+    path, encoding = select_precompressed_variant(data_file, "gzip")
+
+    assert encoding == "gzip"
+    assert gzip.decompress(path.read_bytes()) == data_file.read_bytes()
+
+
+def test_existing_variants_only_without_create(data_file):
+    listing = sorted(data_file.parent.iterdir())
+    assert select_precompressed_variant(data_file, "gzip", create=False) == (
+        data_file,
+        None,
+    )
+    assert sorted(data_file.parent.iterdir()) == listing
+
+    precompress_file(data_file)
+    path, encoding = select_precompressed_variant(data_file, "gzip", create=False)
+    assert (path.name, encoding) == (data_file.name + ".gz", "gzip")
+
+    # A variant older than the file is not served either
+    data_file.write_text("City,Time\n")
+    assert select_precompressed_variant(data_file, "gzip", create=False) == (
+        data_file,
+        None,
+    )
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_weather_frame
+from utils.incremental_processing import drop_unchanged_rows
+from utils.process_weather_data import process_weather_data
+
+
+def fetches():
+    # Every fetch repeats the earlier hours, some of them with updated values
+    first = synthetic_weather_frame(cities=8, hours=24)
+    second = synthetic_weather_frame(cities=8, hours=30)
+    updated = second.sample(frac=0.1, random_state=1).index
+    second.loc[updated, "Temperature (°C)"] += 1.5
+    for df in (first, second):
+        df.loc[[3, 40], "Relative Humidity (%)"] = np.nan
+    return first, second
+
+
+@pytest.mark.parametrize("top_k", [1, 3])
+def test_incremental_matches_full_run_over_latest_rows(workdir, read_outputs, top_k):
+    first, second = fetches()
+    first.to_csv("weather_data/raw.csv", index=False)
+    process_weather_data("weather_data/raw.csv", top_k=top_k, incremental=True)
+    second.to_csv("weather_data/raw.csv", index=False, mode="a", header=False)
+    process_weather_data("weather_data/raw.csv", top_k=top_k, incremental=True)
+    incremental = read_outputs()
+
+    latest = pd.read_csv("weather_data/raw.csv").drop_duplicates(
+        ["City", "Time"], keep="last"
+    )
+    latest.to_csv("weather_data/latest.csv", index=False)
+    process_weather_data(
+        "weather_data/latest.csv", top_k=top_k, incremental=False, workers=1
+    )
+    for path, df in read_outputs().items():
+        pd.testing.assert_frame_equal(incremental[path], df, obj=path)
+
+
+def test_missing_values_that_did_not_change_are_dropped():
+    rows = pd.DataFrame(
+        {
+            "City": ["Oslo", "Oslo", "Rome"],
+            "Time": ["2024-12-02T00:00", "2024-12-02T01:00", "2024-12-02T00:00"],
+            "Relative Humidity (%)": [np.nan, 50.0, np.nan],
+            "Temperature (°C)": [1.0, 2.0, 9.0],
+            "Wind Speed (m/s)": [3.0, 3.0, 3.0],
+        }
+    )
+    processed = rows.iloc[:2].copy()
+    processed.loc[1, "Temperature (°C)"] = 2.5
+
+    changed = drop_unchanged_rows(rows, processed)
+    # Oslo 01:00 changed, Rome was never processed
+    assert changed.index.tolist() == [1, 2]
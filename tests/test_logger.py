@@ -0,0 +1,77 @@
+import logging
+import multiprocessing
+import sys
+from pathlib import Path
+
+import pytest
+
+import constants
+from utils.logger import process_log_file, setup_logger
+
+
+@pytest.mark.parametrize(
+    "argv, expected",
+    [
+        (["scheduler.py"], "logs/weather_scrapper.scheduler.log"),
+        (
+            ["/srv/weather/weather_scrap.py", "--top-k", "3"],
+            "logs/weather_scrapper.weather_scrap.log",
+        ),
+        (
+            ["/usr/lib/python3/site-packages/uvicorn/__main__.py"],
+            "logs/weather_scrapper.uvicorn.log",
+        ),
+        (["-c"], "logs/weather_scrapper.python.log"),
+        ([], "logs/weather_scrapper.python.log"),
+    ],
+)
+def test_every_program_logs_to_its_own_file(monkeypatch, argv, expected):
+    monkeypatch.setattr(sys, "argv", argv)
+
+    assert process_log_file("logs/weather_scrapper.log") == expected
+    monkeypatch.setattr(constants, "LOG_FILE_PER_PROCESS", False)
+    assert process_log_file("logs/weather_scrapper.log") == "logs/weather_scrapper.log"
+
+
+def worker_logger(name, log_file):
+    # Not propagating keeps setup_logger from seeing pytest's handlers on the root
+    logging.getLogger(name).propagate = False
+    return setup_logger(name, log_file, console_output=False)
+
+
+def log_lines(name, log_file, count):
+    constants.LOG_MODE = "sync"
+    constants.LOG_MAX_BYTES = 2000
+    constants.LOG_ROTATE_WHEN = None
+    logger = worker_logger(name, log_file)
+    for i in range(count):
+        logger.info(f"Worker line {i}")
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_worker_processes_never_rotate_the_file(tmp_path, monkeypatch, start_method):
+    monkeypatch.setattr(constants, "LOG_MODE", "sync")
+    monkeypatch.setattr(constants, "LOG_MAX_BYTES", 2000)
+    monkeypatch.setattr(constants, "LOG_ROTATE_WHEN", None)
+    log_file = str(tmp_path / "weather_scrapper.log")
+    name = f"tests.log_worker.{start_method}"
+    logger = worker_logger(name, log_file)
+    try:
+        logger.info("Parent line")
+        worker = multiprocessing.get_context(start_method).Process(
+            target=log_lines, args=(name, log_file, 200)
+        )
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+    finally:
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+            handler.close()
+
+    written = Path(process_log_file(log_file))
+    # Only the parent rotates, the worker wrote far more than LOG_MAX_BYTES
+    assert [path.name for path in tmp_path.iterdir()] == [written.name]
+    lines = written.read_text().splitlines()
+    assert len(lines) == 201
+    assert lines[-1].endswith("Worker line 199")
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+import constants
+import weather_scrap
+from benchmarks.stub_server import StubWeatherServer
+from utils.async_fetcher import fetch_weather_data_concurrently
+from utils.metrics import (
+    CITY_FETCH_SECONDS,
+    REGISTRY,
+    RENDER_CACHE_EVENTS,
+    STAGE_SECONDS,
+    render_prometheus,
+)
+from utils.render_cache import RenderCache
+
+CITIES = [
+    {"City": f"City {i}", "Latitude": -60 + 10 * i, "Longitude": 10.0 * i}
+    for i in range(5)
+]
+
+
+def observed_count(histogram):
+    return sum(value["count"] for _, value in histogram.state())
+
+
+def observed_sum(histogram, **labels):
+    return sum(value["sum"] for key, value in histogram.state() if key == labels)
+
+
+def counter_value(counter, **labels):
+    return sum(value for key, value in counter.state() if key == labels)
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+def test_concurrent_fetch_observes_every_city(batch_size):
+    before = observed_count(CITY_FETCH_SECONDS)
+    with StubWeatherServer(hours=24) as server:
+        results = fetch_weather_data_concurrently(
+            CITIES, url=server.url, concurrency=2, rate_limit=0, batch_size=batch_size
+        )
+
+    assert all(series is not None for series in results.values())
+    assert observed_count(CITY_FETCH_SECONDS) - before == len(CITIES)
+
+
+def test_render_cache_events_are_counted():
+    cache = RenderCache()
+    before = {
+        event: counter_value(RENDER_CACHE_EVENTS, event=event)
+        for event in ("hits", "misses")
+    }
+
+    async def render():
+        return b"image"
+
+    async def main():
+        await cache.get_or_render(("graph", 1), render)
+        await cache.get_or_render(("graph", 1), render)
+        await cache.get_or_render(("graph", 1), render)
+
+    asyncio.run(main())
+
+    assert counter_value(RENDER_CACHE_EVENTS, event="misses") - before["misses"] == 1
+    assert counter_value(RENDER_CACHE_EVENTS, event="hits") - before["hits"] == 2
+    exposition = render_prometheus({"api": REGISTRY.snapshot()})
+    assert "# TYPE weather_render_cache_events_total counter" in exposition
+
+
+def test_fetch_stage_times_the_whole_fetch(workdir, monkeypatch):
+    monkeypatch.setattr(constants, "CITIES", CITIES)
+    monkeypatch.setattr(constants, "FETCH_RATE_LIMIT", 0)
+    monkeypatch.setattr(constants, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(constants, "EVENTS_ENABLED", False)
+    monkeypatch.setattr(constants, "HISTORY_STORE_ENABLED", False)
+    monkeypatch.setattr(constants, "STORAGE_FORMAT", "csv")
+    before = observed_sum(STAGE_SECONDS, stage="fetch")
+
+    with StubWeatherServer(latency=0.1, hours=24) as server:
+        monkeypatch.setattr(constants, "WEATHER_API_URL", server.url)
+        weather_scrap.fetch_weather_data_for_cities(concurrency=1, batch_size=1)
+
+    # Five sequential requests of at least 0.1 seconds each
+    assert observed_sum(STAGE_SECONDS, stage="fetch") - before >= 0.5
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_weather_frame
+from utils.process_weather_data import (
+    PROCESSED_COLUMNS,
+    process_weather_data,
+    rank_cities_per_hour,
+)
+
+
+def sort_loop_ranking(df, metric, ascending, top_k):
+    # The per hour sort of the original implementation
+    rows = []
+    for hour in df["Time"].unique():
+        hour_df = df[df["Time"] == hour].sort_values(
+            metric, ascending=ascending, kind="stable"
+        )
+        for rank, (_, row) in enumerate(hour_df.head(top_k).iterrows(), start=1):
+            rows.append({"Hour": hour, "City": row["City"], metric: row[metric]})
+            if top_k > 1:
+                rows[-1]["Rank"] = rank
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("top_k", [1, 3])
+@pytest.mark.parametrize(
+    "metric, ascending",
+    [("Temperature (°C)", False), ("Relative Humidity (%)", True)],
+)
+def test_ranking_matches_sort_loop(metric, ascending, top_k):
+    df = synthetic_weather_frame(cities=30, hours=24)
+    # Repeated values, to check ties resolve to the earlier row
+    df[metric] = df[metric].round(-1)
+    df.loc[df.sample(frac=0.2, random_state=0).index, metric] = np.nan
+
+    ranked = rank_cities_per_hour(df, metric, ascending=ascending, top_k=top_k)
+    expected = sort_loop_ranking(df, metric, ascending, top_k)
+    pd.testing.assert_frame_equal(ranked, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("top_k", [1, 2])
+def test_ranking_hour_without_values(top_k):
+    df = pd.DataFrame(
+        {
+            "City": ["Oslo", "Oslo", "Rome", "Rome"],
+            "Time": ["2024-12-02T00:00", "2024-12-02T01:00"] * 2,
+            "Temperature (°C)": [1.0, np.nan, 9.0, np.nan],
+        }
+    )
+    ranked = rank_cities_per_hour(df, "Temperature (°C)", top_k=top_k)
+    expected = sort_loop_ranking(df, "Temperature (°C)", False, top_k)
+    pd.testing.assert_frame_equal(ranked, expected, check_dtype=False)
+    assert ranked["City"].iloc[top_k] == "Oslo"
+
+
+def test_single_city_with_missing_hour(workdir):
+    raw = synthetic_weather_frame(cities=1, hours=6)
+    raw.loc[2, ["Temperature (°C)", "Relative Humidity (%)"]] = np.nan
+    raw.to_csv("weather_data/raw.csv", index=False)
+
+    process_weather_data("weather_data/raw.csv", incremental=False, workers=1)
+
+    highest = pd.read_csv("Data/highest_temp_cities.csv")
+    assert len(highest) == 6
+    assert np.isnan(highest.loc[2, "Temperature (°F)"])
+    assert list(pd.read_csv("Data/weather_data.csv").columns) == PROCESSED_COLUMNS
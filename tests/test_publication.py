@@ -0,0 +1,82 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from utils.publication import (
+    CURRENT_LINK,
+    current_generation,
+    current_generation_id,
+    list_generations,
+    publish_outputs,
+    rollback,
+)
+
+
+def write(path, text):
+    Path(path).write_text(text)
+
+
+@pytest.fixture
+def outputs(workdir):
+    write("Data/weather_data.csv", "City,Time\nOslo,2024-12-02T00:00\n")
+    write("Data/highest_temp_cities.csv", "Hour,City\n2024-12-02T00:00,Oslo\n")
+    write("Graphs/temperature.png", "png")
+    return workdir
+
+
+def test_publication_links_unchanged_files(outputs):
+    first = publish_outputs(root="published")
+    write("Data/highest_temp_cities.csv", "Hour,City\n2024-12-02T00:00,Rome\n")
+    second = publish_outputs(root="published")
+
+    generation = current_generation("published")
+    assert generation.id == second != first
+    assert os.readlink(Path("published") / CURRENT_LINK) == second
+
+    # Unchanged files share the inode and the ETag of the first generation
+    for path in ("Data/weather_data.csv", "Graphs/temperature.png"):
+        before = Path("published", first, path).stat()
+        assert generation.file(path).stat().st_ino == before.st_ino
+        assert generation.validators(path).etag == f'"{first}"'
+    changed = "Data/highest_temp_cities.csv"
+    assert generation.validators(changed).etag == f'"{second}"'
+    assert generation.file(changed).read_text().endswith("Rome\n")
+    # The previous generation is never modified
+    assert Path("published", first, changed).read_text().endswith("Oslo\n")
+    # Processed CSV files get their compressed variants
+    assert generation.file("Data/weather_data.csv.gz").exists()
+    assert generation.validators("Data/missing.csv") is None
+
+
+def test_rollback_and_prune(outputs):
+    published = []
+    for i in range(4):
+        write("Data/weather_data.csv", f"City,Time\nCity {i},2024-12-02T00:00\n")
+        published.append(publish_outputs(root="published", keep=3))
+
+    assert list_generations("published") == published[1:]
+    assert rollback(root="published") == published[2]
+    assert current_generation_id("published") == published[2]
+    assert rollback(published[1], root="published") == published[1]
+    with pytest.raises(ValueError):
+        rollback(root="published")
+    with pytest.raises(ValueError):
+        rollback(published[0], root="published")
+
+    # Pruning never deletes the generation being served
+    write("Data/weather_data.csv", "City,Time\nCity 9,2024-12-02T00:00\n")
+    latest = publish_outputs(root="published", keep=1)
+    assert list_generations("published") == [latest]
+    assert current_generation_id("published") == latest
+
+
+def test_files_being_written_are_not_published(outputs):
+    write("Data/weather_data.csv.tmp", "partial")
+    write("Data/weather_data.csv.gz", "stale variant")
+    generation_id = publish_outputs(root="published")
+
+    files = current_generation("published").files
+    assert generation_id and "Data/weather_data.csv" in files
+    assert "Data/weather_data.csv.tmp" not in files
+    assert "Data/weather_data.csv.gz" not in files
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from benchmarks.stub_server import StubWeatherServer
+from utils.async_fetcher import build_weather_params, fetch_weather_data_concurrently
+from utils.response_cache import ResponseCache
+
+CITIES = [
+    {"City": f"City {i}", "Latitude": -60 + 10 * i, "Longitude": 10.0 * i}
+    for i in range(4)
+]
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def fetch(server, cache, batch_size=1):
+    results = fetch_weather_data_concurrently(
+        CITIES,
+        url=server.url,
+        concurrency=2,
+        rate_limit=0,
+        batch_size=batch_size,
+        cache=cache,
+    )
+    return {city: series.values["temperature_2m"] for city, series in results.items()}
+
+
+def assert_same_values(first, second):
+    assert first.keys() == second.keys()
+    for city in first:
+        np.testing.assert_array_equal(first[city], second[city])
+
+
+@pytest.fixture
+def clock():
+    # Early in an hour, so the entries stay fresh until the next model update
+    return Clock(3600 * 1000 + 60)
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_fresh_responses_skip_the_network(tmp_path, clock, batch_size):
+    cache = ResponseCache(tmp_path, model_update_interval=3600, clock=clock)
+    with StubWeatherServer(latency=0, hours=24, etag=True) as server:
+        first = fetch(server, cache, batch_size)
+        requests = server.request_count
+        clock.now += 1800
+        second = fetch(server, cache, batch_size)
+
+        assert server.request_count == requests
+    # One entry per request, a batch of cities shares one
+    assert requests == len(CITIES) // batch_size
+    assert cache.misses == requests
+    assert cache.hits == requests
+    assert_same_values(first, second)
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_stale_responses_are_revalidated(tmp_path, clock, batch_size):
+    cache = ResponseCache(tmp_path, model_update_interval=3600, clock=clock)
+    with StubWeatherServer(latency=0, hours=24, etag=True) as server:
+        first = fetch(server, cache, batch_size)
+        requests = server.request_count
+        clock.now += 3600
+        second = fetch(server, cache, batch_size)
+
+        # The model did not run, the stored bodies are reused
+        assert server.not_modified_count == requests
+        assert cache.revalidated == requests
+        assert_same_values(first, second)
+
+        # A revalidated entry is fresh again until the next model update
+        fetch(server, cache, batch_size)
+        assert server.request_count == 2 * requests
+        assert cache.hits == requests
+
+
+def test_model_update_replaces_the_body(tmp_path, clock):
+    cache = ResponseCache(tmp_path, model_update_interval=3600, clock=clock)
+    with StubWeatherServer(latency=0, hours=24, etag=True) as server:
+        first = fetch(server, cache)
+        server.model_run += 1
+        clock.now += 3600
+        second = fetch(server, cache)
+
+        assert server.not_modified_count == 0
+    assert cache.misses == 2 * len(CITIES)
+    for city in first:
+        np.testing.assert_allclose(second[city], first[city] + 0.1, atol=1e-4)
+
+    # The new body replaced the stored one
+    city = CITIES[0]
+    entry = cache.get(
+        server.url, build_weather_params(city["Latitude"], city["Longitude"])
+    )
+    np.testing.assert_allclose(
+        entry.payload["hourly"]["temperature_2m"], second["City 0"], atol=1e-4
+    )
+
+
+def test_max_age_shortens_freshness(tmp_path, clock):
+    cache = ResponseCache(tmp_path, model_update_interval=3600, clock=clock)
+    with StubWeatherServer(latency=0, hours=24, etag=True, max_age=60) as server:
+        fetch(server, cache)
+        clock.now += 30
+        fetch(server, cache)
+        assert cache.hits == len(CITIES)
+        assert server.not_modified_count == 0
+
+        clock.now += 31
+        fetch(server, cache)
+        assert cache.revalidated == len(CITIES)
+        assert server.not_modified_count == len(CITIES)
+
+
+def test_responses_without_validators_are_fetched_again(tmp_path, clock):
+    cache = ResponseCache(tmp_path, model_update_interval=3600, clock=clock)
+    with StubWeatherServer(latency=0, hours=24) as server:
+        fetch(server, cache)
+        clock.now += 3600
+        fetch(server, cache)
+
+        assert server.not_modified_count == 0
+        assert server.request_count == 2 * len(CITIES)
+    assert cache.misses == 2 * len(CITIES)
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks.stub_server import build_forecast_payload
+from utils.generate_file_name import get_daily_rollup_file, get_weekly_rollup_file
+from utils.history_store import HistoryWriter
+from utils.rollups import update_rollups
+
+CITIES = [("City 0", 10.0, 20.0), ("City 1", -30.0, 40.0), ("City 2", 50.0, -5.0)]
+
+
+def append_history(start, hours, shift=0.0):
+    with HistoryWriter() as writer:
+        for name, latitude, longitude in CITIES:
+            payload = build_forecast_payload(latitude, longitude, hours, start=start)
+            hourly = payload["hourly"]
+            hourly["temperature_2m"] = [v + shift for v in hourly["temperature_2m"]]
+            writer.append(payload, name)
+
+
+def read_rollups():
+    return (
+        pd.read_csv(get_daily_rollup_file(), float_precision="round_trip"),
+        pd.read_csv(get_weekly_rollup_file(), float_precision="round_trip"),
+    )
+
+
+def test_incremental_rollups_match_a_full_rebuild(workdir):
+    # Monday to Thursday, then a refetch of Wednesday on into the next week
+    append_history(datetime(2024, 12, 2), 4 * 24)
+    update_rollups()
+    append_history(datetime(2024, 12, 4), 9 * 24, shift=1.5)
+    update_rollups()
+    # Another fetch that only repeats hours already stored
+    append_history(datetime(2024, 12, 10), 24, shift=-2.0)
+    update_rollups()
+    daily, weekly = read_rollups()
+
+    update_rollups(full=True)
+    full_daily, full_weekly = read_rollups()
+
+    assert len(daily) == len(CITIES) * 11
+    assert len(weekly) == len(CITIES) * 2
+    pd.testing.assert_frame_equal(daily, full_daily)
+    pd.testing.assert_frame_equal(weekly, full_weekly)
+
+
+def test_unchanged_history_keeps_the_rollups(workdir):
+    append_history(datetime(2024, 12, 2), 3 * 24)
+    update_rollups()
+    daily, weekly = read_rollups()
+
+    update_rollups()
+
+    pd.testing.assert_frame_equal(read_rollups()[0], daily)
+    pd.testing.assert_frame_equal(read_rollups()[1], weekly)
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import constants
+import scheduler
+import weather_scrap
+from benchmarks.stub_server import StubWeatherServer
+
+CITIES = [
+    {"City": f"City {i}", "Latitude": -60 + 10 * i, "Longitude": 10.0 * i}
+    for i in range(6)
+]
+
+
+def test_concurrent_fetches_never_write_at_once(workdir, monkeypatch):
+    monkeypatch.setattr(constants, "CITIES", CITIES)
+    monkeypatch.setattr(constants, "FETCH_RATE_LIMIT", 0)
+    monkeypatch.setattr(constants, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(constants, "EVENTS_ENABLED", False)
+    monkeypatch.setattr(constants, "STORAGE_FORMAT", "csv")
+
+    active = 0
+    overlaps = []
+    lock = threading.Lock()
+    write_csv = weather_scrap.extract_and_save_data_in_csv
+
+    def slow_write(series, city_name):
+        nonlocal active
+        with lock:
+            active += 1
+            overlaps.append(active)
+        time.sleep(0.01)
+        write_csv(series, city_name)
+        with lock:
+            active -= 1
+
+    monkeypatch.setattr(weather_scrap, "extract_and_save_data_in_csv", slow_write)
+
+    with StubWeatherServer(hours=24) as server:
+        monkeypatch.setattr(constants, "WEATHER_API_URL", server.url)
+        threads = [
+            threading.Thread(
+                target=weather_scrap.fetch_weather_data_for_cities,
+                kwargs={"concurrency": 4, "batch_size": 1},
+            )
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(overlaps) == 2 * len(CITIES)
+    assert max(overlaps) == 1
+    lines = open(weather_scrap.get_csv_file_name_for_given_date()).read().splitlines()
+    assert lines[0].startswith("City,")
+    assert len(lines) == 1 + 2 * len(CITIES) * 24
+
+
+def test_scheduler_processes_incrementally(workdir, monkeypatch):
+    monkeypatch.setattr(constants, "INCREMENTAL_PROCESSING", False)
+    monkeypatch.setattr(constants, "HISTORY_STORE_ENABLED", False)
+    monkeypatch.setattr(constants, "VERSIONED_OUTPUTS", False)
+    calls = []
+    monkeypatch.setattr(
+        scheduler, "fetch_weather_data_for_cities", lambda *a, **k: None
+    )
+    monkeypatch.setattr(
+        scheduler, "process_weather_data", lambda *a, **k: calls.append(k)
+    )
+    monkeypatch.setattr(scheduler, "plot_graphs_from_processed_data", lambda: None)
+
+    group = {"name": "test", "cities": ["Paris"], "interval": 60}
+    weather_scheduler = scheduler.WeatherScheduler(
+        groups=[group], metrics_file=str(workdir / "cache" / "scheduler.json")
+    )
+    try:
+        assert weather_scheduler.run_group(group)
+    finally:
+        weather_scheduler.session.close()
+
+    assert weather_scheduler.metrics["test"].last_status == "ok"
+    assert calls == [{"incremental": True}]
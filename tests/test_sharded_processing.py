@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+from benchmarks.stub_server import build_forecast_payload
+from benchmarks.synthetic import synthetic_weather_frame
+from utils.columnar_store import ColumnarWeatherWriter
+from utils.process_weather_data import process_weather_data
+from utils.sharded_processing import process_weather_data_sharded
+
+
+def assert_same_outputs(read_outputs, expected):
+    for path, content in read_outputs(raw=True).items():
+        assert content == expected[path], path
+
+
+@pytest.mark.parametrize("top_k", [1, 3])
+@pytest.mark.parametrize("shards", [2, 5])
+def test_sharded_csv_run_matches_single_process(
+    write_raw_with_ties, read_outputs, top_k, shards
+):
+    raw_file = write_raw_with_ties(cities=12, hours=30, repeated_rows=50, shuffle=True)
+
+    process_weather_data(raw_file, top_k, incremental=False, workers=1)
+    expected = read_outputs(raw=True)
+    process_weather_data_sharded(raw_file, top_k, workers=2, shards=shards)
+
+    assert_same_outputs(read_outputs, expected)
+
+
+def test_sharded_parquet_run_matches_single_process(workdir, read_outputs):
+    partition = "weather_data/parquet"
+    with ColumnarWeatherWriter(partition) as writer:
+        for fetch in range(2):
+            for i in range(8):
+                payload = build_forecast_payload(
+                    -40 + 10 * i, 5.0 * i, hours=36, start=datetime(2024, 12, 2 + fetch)
+                )
+                writer.append(payload, f"City {i}")
+
+    process_weather_data(partition, top_k=2, incremental=False, workers=1)
+    expected = read_outputs(raw=True)
+    process_weather_data_sharded(partition, top_k=2, workers=2, shards=3)
+
+    assert_same_outputs(read_outputs, expected)
+
+
+def test_sharded_run_of_header_only_csv(workdir, read_outputs):
+    synthetic_weather_frame(cities=1, hours=1).head(0).to_csv(
+        "weather_data/raw.csv", index=False
+    )
+
+    process_weather_data("weather_data/raw.csv", top_k=1, incremental=False, workers=1)
+    expected = read_outputs(raw=True)
+    process_weather_data_sharded("weather_data/raw.csv", top_k=1, workers=2, shards=2)
+
+    assert_same_outputs(read_outputs, expected)
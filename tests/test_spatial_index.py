@@ -0,0 +1,134 @@
+import math
+import random
+
+import pandas as pd
+import pytest
+
+import constants
+import weather_scrap
+from benchmarks.stub_server import StubWeatherServer
+from utils.generate_file_name import get_csv_file_name_for_given_date
+from utils.spatial_index import EARTH_RADIUS_KM, group_nearby_cities
+
+DEGREE_KM = EARTH_RADIUS_KM * math.pi / 180
+
+
+def city(name, latitude, longitude):
+    return {"City": name, "Latitude": latitude, "Longitude": longitude}
+
+
+def haversine_km(a, b):
+    lat1, lat2 = math.radians(a["Latitude"]), math.radians(b["Latitude"])
+    dlat = lat2 - lat1
+    dlon = math.radians(b["Longitude"] - a["Longitude"])
+    h = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def grouped_names(cities, distance_km=constants.SPATIAL_DEDUP_DISTANCE_KM):
+    return [names for _, names in group_nearby_cities(cities, distance_km)]
+
+
+@pytest.mark.parametrize("factor, merged", [(0.5, True), (0.99, True), (1.01, False)])
+def test_cities_merge_within_the_distance(factor, merged):
+    offset = factor * constants.SPATIAL_DEDUP_DISTANCE_KM / DEGREE_KM
+    cities = [city("North", 48.0 + offset, 2.0), city("South", 48.0, 2.0)]
+
+    expected = [["North", "South"]] if merged else [["North"], ["South"]]
+    assert grouped_names(cities) == expected
+
+
+@pytest.mark.parametrize(
+    "cities",
+    [
+        # 0.01 degree apart across the antimeridian, about 1.1 km
+        [city("East", 0.0, 179.995), city("West", 0.0, -179.995)],
+        [city("East", -16.5, 180.0), city("West", -16.5, -180.0)],
+        # Across the pole, and different longitudes of the pole itself
+        [city("A", 89.995, 0.0), city("B", 89.995, 180.0)],
+        [city("A", -90.0, 0.0), city("B", -90.0, 123.0)],
+    ],
+)
+def test_cells_wrap_at_the_antimeridian_and_the_poles(cities):
+    assert grouped_names(cities) == [[c["City"] for c in cities]]
+
+
+def test_members_join_the_nearest_representative():
+    step = 1.2 / DEGREE_KM
+    cities = [
+        city("A", 10.0, 10.0),
+        city("B", 10.0 + 2 * step, 10.0),
+        # 1.8 km from A, 0.6 km from B
+        city("C", 10.0 + 1.5 * step, 10.0),
+    ]
+
+    assert grouped_names(cities) == [["A"], ["B", "C"]]
+
+
+def test_zero_distance_only_merges_repeated_names():
+    cities = [
+        city("Oslo", 59.9, 10.7),
+        city("Oslo", 59.9, 10.7),
+        city("Bergen", 59.9, 10.7),
+    ]
+
+    assert grouped_names(cities, 0) == [["Oslo"], ["Bergen"]]
+
+
+def test_groups_match_a_brute_force_search():
+    rng = random.Random(0)
+    cities = [
+        city(f"City {i}", 45 + rng.uniform(-0.1, 0.1), 7 + rng.uniform(-0.1, 0.1))
+        for i in range(300)
+    ]
+    distance_km = 2.0
+
+    groups = group_nearby_cities(cities, distance_km)
+    by_name = {c["City"]: c for c in cities}
+    order = {c["City"]: i for i, c in enumerate(cities)}
+    representatives = [representative for representative, _ in groups]
+    assert sorted(n for _, names in groups for n in names) == sorted(by_name)
+    for representative, names in groups:
+        for name in names:
+            # Members join the nearest representative known when they are added
+            earlier = [r for r in representatives if order[r["City"]] <= order[name]]
+            distances = [haversine_km(by_name[name], r) for r in earlier]
+            assert haversine_km(by_name[name], representative) == min(distances)
+            assert min(distances) <= distance_km * (1 + 1e-9)
+    for i, a in enumerate(representatives):
+        for b in representatives[i + 1 :]:
+            assert haversine_km(a, b) > distance_km
+
+
+def test_one_request_fans_out_to_every_member(workdir, monkeypatch):
+    offset = 0.5 / DEGREE_KM
+    cities = [
+        city("Paris", 48.85, 2.35),
+        city("Paris Nord", 48.85 + offset, 2.35),
+        city("Lyon", 45.76, 4.84),
+        city("Paris Sud", 48.85 - offset, 2.35),
+    ]
+    monkeypatch.setattr(constants, "CITIES", cities)
+    monkeypatch.setattr(constants, "FETCH_RATE_LIMIT", 0)
+    monkeypatch.setattr(constants, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(constants, "EVENTS_ENABLED", False)
+    monkeypatch.setattr(constants, "HISTORY_STORE_ENABLED", False)
+    monkeypatch.setattr(constants, "STORAGE_FORMAT", "csv")
+
+    with StubWeatherServer(latency=0, hours=24) as server:
+        monkeypatch.setattr(constants, "WEATHER_API_URL", server.url)
+        weather_scrap.fetch_weather_data_for_cities(concurrency=1, batch_size=1)
+        assert server.request_count == 2
+
+    raw = pd.read_csv(get_csv_file_name_for_given_date())
+    assert sorted(raw["City"].unique()) == sorted(c["City"] for c in cities)
+    rows = {
+        name: df.drop(columns="City").reset_index(drop=True)
+        for name, df in raw.groupby("City")
+    }
+    for name in ("Paris Nord", "Paris Sud"):
+        pd.testing.assert_frame_equal(rows[name], rows["Paris"], obj=name)
+    assert len(rows["Lyon"]) == 24
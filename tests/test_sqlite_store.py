@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+
+import constants
+from benchmarks.stub_server import build_forecast_payload
+from utils.data_cache import query_frame
+from utils.generate_file_name import (
+    get_csv_file_name_for_given_date,
+    get_sqlite_database_file,
+)
+from utils.process_weather_data import process_weather_data
+from utils.sqlite_store import (
+    PROCESSED_TABLES,
+    SQLiteWeatherWriter,
+    query_processed,
+)
+from weather_scrap import extract_and_save_data_in_csv
+
+CITIES = [(f"City {i}", -50 + 12 * i, 7.5 * i) for i in range(6)]
+
+
+def fetch(shift=0.0, hours=36):
+    for name, latitude, longitude in CITIES:
+        payload = build_forecast_payload(latitude, longitude, hours)
+        hourly = payload["hourly"]
+        hourly["temperature_2m"] = [v + shift for v in hourly["temperature_2m"]]
+        yield payload, name
+
+
+def write_csv(fetches):
+    for payload, name in fetches:
+        extract_and_save_data_in_csv(payload, name)
+
+
+def write_sqlite(fetches):
+    with SQLiteWeatherWriter() as writer:
+        for payload, name in fetches:
+            writer.append(payload, name)
+
+
+@pytest.fixture
+def sqlite_format(monkeypatch):
+    monkeypatch.setattr(constants, "STORAGE_FORMAT", "sqlite")
+    monkeypatch.setattr(constants, "EVENTS_ENABLED", False)
+
+
+def process_csv_over_latest_rows(read_outputs, top_k):
+    # SQLite keeps one row per city and hour, the latest fetch wins
+    raw = pd.read_csv(get_csv_file_name_for_given_date())
+    raw.drop_duplicates(["City", "Time"], keep="last").to_csv(
+        "weather_data/latest.csv", index=False
+    )
+    process_weather_data("weather_data/latest.csv", top_k, incremental=False, workers=1)
+    return read_outputs()
+
+
+@pytest.mark.parametrize("top_k", [1, 2])
+def test_sqlite_outputs_match_csv_storage(workdir, sqlite_format, read_outputs, top_k):
+    # The second fetch repeats every hour with updated values
+    for shift in (0.0, 1.5):
+        write_csv(fetch(shift))
+        write_sqlite(fetch(shift))
+    expected = process_csv_over_latest_rows(read_outputs, top_k)
+
+    process_weather_data(
+        get_sqlite_database_file(), top_k, incremental=False, workers=1
+    )
+
+    for path, df in read_outputs().items():
+        pd.testing.assert_frame_equal(df, expected[path], obj=path)
+
+
+def test_incremental_sqlite_run_matches_full_run(workdir, sqlite_format, read_outputs):
+    write_sqlite(fetch())
+    process_weather_data(get_sqlite_database_file(), incremental=True)
+    write_sqlite(fetch(shift=1.5, hours=40))
+    process_weather_data(get_sqlite_database_file(), incremental=True)
+    incremental = read_outputs()
+
+    process_weather_data(get_sqlite_database_file(), incremental=False, workers=1)
+
+    for path, df in read_outputs().items():
+        pd.testing.assert_frame_equal(incremental[path], df, obj=path)
+
+
+@pytest.mark.parametrize(
+    "data_type, filters",
+    [
+        ("weather", {"cities": ["City 1", "City 4"]}),
+        ("weather", {"start": "2024-12-02T10:00", "end": "2024-12-03T02:00"}),
+        ("weather", {"metrics": ["Wind Speed (mph)"], "cities": ["City 0"]}),
+        ("highest_temp", {"start": "2024-12-03T00:00"}),
+        ("lowest_humidity", {}),
+    ],
+)
+def test_indexed_queries_match_the_processed_files(
+    workdir, sqlite_format, data_type, filters
+):
+    write_sqlite(fetch())
+    process_weather_data(get_sqlite_database_file(), incremental=False, workers=1)
+    get_file, time_column = PROCESSED_TABLES[data_type]
+    processed = pd.read_csv(get_file())
+    expected = query_frame(processed, time_column, **filters).reset_index(drop=True)
+
+    total, page = query_processed(data_type, **filters)
+    assert total == len(expected)
+    pd.testing.assert_frame_equal(page, expected, check_dtype=False)
+
+    _, page = query_processed(data_type, limit=5, offset=3, **filters)
+    pd.testing.assert_frame_equal(
+        page, expected.iloc[3:8].reset_index(drop=True), check_dtype=False
+    )
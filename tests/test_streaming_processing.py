@@ -0,0 +1,23 @@
+import pandas as pd
+import pytest
+
+from utils.process_weather_data import process_weather_data
+from utils.streaming_processing import process_weather_data_streaming
+
+
+@pytest.mark.parametrize("top_k", [1, 3])
+@pytest.mark.parametrize("chunk_rows", [37, 1000])
+def test_streaming_matches_full_run(
+    write_raw_with_ties, read_outputs, top_k, chunk_rows
+):
+    raw_file = write_raw_with_ties(cities=10, hours=30, repeated_rows=45)
+
+    process_weather_data(raw_file, top_k, incremental=False, workers=1)
+    expected = read_outputs()
+    process_weather_data_streaming(raw_file, top_k, chunk_rows)
+
+    # Rows and their order are the same, values only differ by float32 rounding
+    for path, df in read_outputs().items():
+        pd.testing.assert_frame_equal(
+            df, expected[path], check_dtype=False, rtol=1e-6, obj=path
+        )
@@ -0,0 +1,130 @@
+import csv
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.stub_server import build_forecast_payload
+from utils.generate_file_name import get_csv_file_name_for_given_date
+from utils.weather_series import (
+    HOURLY_COLUMNS,
+    RAW_FILE_COLUMNS,
+    WeatherSeries,
+    series_to_frame,
+)
+from weather_scrap import extract_and_save_data_in_csv
+
+# Kolkata is five and a half hours ahead of UTC
+UTC_OFFSET = 19800
+
+
+def local_payload(latitude, longitude, hours=30):
+    payload = build_forecast_payload(
+        latitude, longitude, hours, start=datetime(2024, 12, 2)
+    )
+    payload["timezone"] = "Asia/Kolkata"
+    payload["utc_offset_seconds"] = UTC_OFFSET
+    return payload
+
+
+def with_missing_values(payload):
+    hourly = payload["hourly"]
+    hourly["temperature_2m"][3] = None
+    hourly["relative_humidity_2m"][5] = None
+    hourly["weather_code"][0] = None
+    hourly["wind_speed_10m"][-1] = None
+    return payload
+
+
+def write_with_lists(path, payloads):
+    # The writer used before payloads were decoded into series
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(RAW_FILE_COLUMNS)
+        for payload, city_name in payloads:
+            hourly = payload["hourly"]
+            writer.writerows(
+                [
+                    city_name,
+                    payload["latitude"],
+                    payload["longitude"],
+                    weather_code,
+                    payload["timezone"],
+                    time,
+                    humidity,
+                    temp,
+                    wind_speed,
+                ]
+                for time, weather_code, humidity, temp, wind_speed in zip(
+                    hourly["time"],
+                    hourly["weather_code"],
+                    hourly["relative_humidity_2m"],
+                    hourly["temperature_2m"],
+                    hourly["wind_speed_10m"],
+                )
+            )
+
+
+def test_unixtime_and_local_times_decode_to_the_same_hours():
+    payload = local_payload(19.07, 72.88)
+    unixtime = local_payload(19.07, 72.88)
+    local = np.array(payload["hourly"]["time"], dtype="datetime64[s]").astype(np.int64)
+    unixtime["hourly"]["time"] = (local - UTC_OFFSET).tolist()
+
+    series = WeatherSeries.from_payload(payload, "Mumbai")
+    from_unixtime = WeatherSeries.from_payload(unixtime, "Mumbai")
+
+    assert series.time.dtype == np.int64
+    np.testing.assert_array_equal(from_unixtime.time, series.time)
+    assert (
+        series.time[0] == datetime(2024, 12, 1, 18, 30, tzinfo=timezone.utc).timestamp()
+    )
+    # Local times print back the hours the API sent
+    assert from_unixtime.local_times().tolist() == payload["hourly"]["time"]
+
+
+def test_formatted_values_match_the_payload_text():
+    payload = with_missing_values(local_payload(19.07, 72.88))
+    series = WeatherSeries.from_payload(payload, "Mumbai")
+
+    assert series.values["relative_humidity_2m"].dtype == np.float32
+    assert series.values["weather_code"].dtype == np.float32
+    assert series.values["temperature_2m"].dtype == np.float32
+    for variable in HOURLY_COLUMNS:
+        expected = ["" if v is None else str(v) for v in payload["hourly"][variable]]
+        assert series.formatted_values(variable).tolist() == expected, variable
+
+
+def test_integer_variables_stay_integers():
+    series = WeatherSeries.from_payload(local_payload(19.07, 72.88), "Mumbai")
+
+    assert series.values["relative_humidity_2m"].dtype == np.int16
+    assert series.formatted_values("relative_humidity_2m")[0] == str(
+        series.values["relative_humidity_2m"][0]
+    )
+
+
+@pytest.mark.parametrize("missing", [False, True])
+def test_series_round_trip_matches_the_list_writer(workdir, missing):
+    payloads = []
+    for i, (latitude, longitude) in enumerate([(19.07, 72.88), (28.61, 77.2)]):
+        payload = local_payload(latitude, longitude)
+        payloads.append(
+            (with_missing_values(payload) if missing else payload, f"City {i}")
+        )
+    write_with_lists("weather_data/lists.csv", payloads)
+    expected = pd.read_csv("weather_data/lists.csv")
+
+    series = [WeatherSeries.from_payload(p, name) for p, name in payloads]
+    frame = series_to_frame(series)
+
+    pd.testing.assert_frame_equal(frame, expected)
+    assert (frame["Relative Humidity (%)"].dtype == np.int64) != missing
+    # The series writer writes the same bytes as the list writer
+    for payload, name in payloads:
+        extract_and_save_data_in_csv(payload, name)
+    with open(get_csv_file_name_for_given_date(), "rb") as f:
+        written = f.read()
+    with open("weather_data/lists.csv", "rb") as f:
+        assert written == f.read()
@@ -0,0 +1,386 @@
+import asyncio
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.batch_request import build_batch_params, build_batches, split_batch_response
+from utils.logger import log_payload, setup_logger
+from utils.metrics import (
+    CITY_FETCH_SECONDS,
+    FETCH_BYTES,
+    FETCH_REQUEST_SECONDS,
+    FETCH_REQUESTS,
+    FETCH_RETRIES,
+)
+from utils.weather_series import WeatherSeries
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Status codes worth retrying, everything else is treated as a final answer
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """
+    Token bucket rate limiter keeping one bucket per host.
+    Each bucket refills at `rate` tokens per second and holds at most `burst` tokens.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._buckets = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, host):
+        """
+        Wait until a request to the given host is allowed.
+
+        Args:
+            host (str): Host name the request is going to.
+        """
+        if not self.rate:
+            return
+
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+def build_session(pool_size):
+    """
+    Build a requests session whose connection pool is shared by all workers.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def build_weather_params(latitude, longitude):
+    """
+    Build the Open Meteo query parameters for one coordinate pair
+    without mutating the shared constants.WEATHER_API_PARAMS.
+
+    Args:
+        latitude (float): Latitude of the city.
+        longitude (float): Longitude of the city.
+
+    Returns:
+        dict: Query parameters for the forecast endpoint.
+    """
+    params = dict(constants.WEATHER_API_PARAMS)
+    params["latitude"] = latitude
+    params["longitude"] = longitude
+    return params
+
+
+async def request_json_with_retries(
+    session,
+    semaphore,
+    limiter,
+    url,
+    params,
+    label,
+    retries,
+    backoff,
+    cache=None,
+    cities=1,
+):
+    """
+    GET a JSON document, retrying transient failures with exponential backoff and jitter.
+
+    Args:
+        session (requests.Session): Shared HTTP session.
+        semaphore (asyncio.Semaphore): Limits the number of in-flight requests.
+        limiter (HostRateLimiter): Per host rate limiter.
+        url (str): Endpoint URL.
+        params (dict): Query parameters.
+        label (str): Human readable name of the request used in logs.
+        retries (int): Number of retries after the first attempt.
+        backoff (float): Base delay in seconds between retries.
+        cache (ResponseCache, optional): Answers fresh requests without the network
+            and revalidates stale ones.
+        cities (int): Cities covered by the request, the fetch duration is
+            observed once for each of them.
+
+    Returns:
+        dict | list | None: Decoded JSON payload, or None if every attempt failed.
+    """
+    # Waiting for the rate limiter or a free slot is not part of the fetch
+    start = time.perf_counter()
+    waited = 0.0
+    try:
+        headers = None
+        if cache is not None:
+            payload = cache.get_fresh(url, params)
+            if payload is not None:
+                logger.info(f"Using cached weather data for {label}")
+                return payload
+            headers = cache.conditional_headers(url, params)
+
+        host = urlsplit(url).netloc
+
+        for attempt in range(retries + 1):
+            queued = time.perf_counter()
+            await limiter.acquire(host)
+            try:
+                async with semaphore:
+                    waited += time.perf_counter() - queued
+                    with FETCH_REQUEST_SECONDS.time():
+                        response = await asyncio.to_thread(
+                            session.get,
+                            url,
+                            params=params,
+                            headers=headers,
+                            timeout=constants.FETCH_TIMEOUT,
+                        )
+            except requests.RequestException as e:
+                FETCH_REQUESTS.inc(status="error")
+                logger.warning(
+                    f"Request for {label} failed (attempt {attempt + 1}): {e}"
+                )
+            else:
+                FETCH_REQUESTS.inc(status=str(response.status_code))
+                FETCH_BYTES.inc(len(response.content))
+                try:
+                    if cache is not None and response.status_code in (200, 304):
+                        payload = cache.handle_response(url, params, response)
+                    elif response.status_code == 200:
+                        payload = response.json()
+                    else:
+                        payload = None
+                except ValueError as e:
+                    # A truncated body is retried like a dropped connection
+                    logger.warning(
+                        f"Invalid JSON for {label} (attempt {attempt + 1}): {e}"
+                    )
+                else:
+                    if payload is not None:
+                        logger.info(f"Weather data fetched successfully for {label}")
+                        log_payload(logger, label, payload)
+                        return payload
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        logger.error(
+                            f"API Error while fetching {label} weather data, status code: {response.status_code}"
+                        )
+                        return None
+                    logger.warning(
+                        f"Retryable status {response.status_code} for {label} (attempt {attempt + 1})"
+                    )
+
+            if attempt < retries:
+                FETCH_RETRIES.inc()
+                delay = backoff * (2**attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+
+        logger.error(f"Giving up on {label} after {retries + 1} attempts")
+        return None
+    finally:
+        elapsed = time.perf_counter() - start - waited
+        for _ in range(cities):
+            CITY_FETCH_SECONDS.observe(elapsed)
+
+
+async def fetch_city_weather_data_async(
+    session, semaphore, limiter, city, url, retries, backoff, cache=None
+):
+    """
+    Fetch weather data for one city.
+
+    Args:
+        session (requests.Session): Shared HTTP session.
+        semaphore (asyncio.Semaphore): Limits the number of in-flight requests.
+        limiter (HostRateLimiter): Per host rate limiter.
+        city (dict): City record with City, Latitude and Longitude keys.
+        url (str): Forecast endpoint URL.
+        retries (int): Number of retries after the first attempt.
+        backoff (float): Base delay in seconds between retries.
+        cache (ResponseCache, optional): Response cache consulted before the request.
+
+    Returns:
+        list: A single (city_name, weather_data) tuple, weather_data is None on failure.
+    """
+    params = build_weather_params(city["Latitude"], city["Longitude"])
+    weather_data = await request_json_with_retries(
+        session,
+        semaphore,
+        limiter,
+        url,
+        params,
+        city["City"],
+        retries,
+        backoff,
+        cache,
+    )
+    return [(city["City"], weather_data)]
+
+
+async def fetch_batch_weather_data_async(
+    session, semaphore, limiter, batch, url, retries, backoff, cache=None
+):
+    """
+    Fetch weather data for a batch of cities with a single multi location request.
+
+    Args:
+        session (requests.Session): Shared HTTP session.
+        semaphore (asyncio.Semaphore): Limits the number of in-flight requests.
+        limiter (HostRateLimiter): Per host rate limiter.
+        batch (list): City dicts with City, Latitude and Longitude keys.
+        url (str): Forecast endpoint URL.
+        retries (int): Number of retries after the first attempt.
+        backoff (float): Base delay in seconds between retries.
+        cache (ResponseCache, optional): Response cache consulted before the request.
+
+    Returns:
+        list: (city_name, weather_data) tuples, weather_data is None on failure.
+    """
+    if len(batch) == 1:
+        return await fetch_city_weather_data_async(
+            session, semaphore, limiter, batch[0], url, retries, backoff, cache
+        )
+
+    label = f"batch of {len(batch)} cities ({batch[0]['City']} .. {batch[-1]['City']})"
+    payload = await request_json_with_retries(
+        session,
+        semaphore,
+        limiter,
+        url,
+        build_batch_params(batch),
+        label,
+        retries,
+        backoff,
+        cache,
+        cities=len(batch),
+    )
+    if payload is None:
+        return [(city["City"], None) for city in batch]
+    try:
+        return split_batch_response(payload, batch)
+    except ValueError as e:
+        logger.error(f"Invalid response for {label}: {e}")
+        return [(city["City"], None) for city in batch]
+
+
+def _decode_series(weather_data, city_name):
+    if weather_data is None:
+        return None
+    try:
+        return WeatherSeries.from_payload(weather_data, city_name)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"Invalid weather data for {city_name}: {e}")
+        return None
+
+
+async def _fetch_all(
+    city_list,
+    on_result,
+    url,
+    concurrency,
+    rate_limit,
+    retries,
+    backoff,
+    batch_size,
+    session,
+    cache,
+):
+    # Blocking requests run in worker threads, size the pool to the concurrency limit
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(concurrency))
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = HostRateLimiter(rate_limit)
+    results = {}
+
+    # A session passed in by the caller stays open so its connections can be reused
+    owns_session = session is None
+    session = session or build_session(concurrency)
+    try:
+        tasks = [
+            fetch_batch_weather_data_async(
+                session, semaphore, limiter, batch, url, retries, backoff, cache
+            )
+            for batch in build_batches(city_list, url, batch_size)
+        ]
+        for task in asyncio.as_completed(tasks):
+            for city_name, weather_data in await task:
+                series = _decode_series(weather_data, city_name)
+                results[city_name] = series
+                if series is not None and on_result is not None:
+                    # Callbacks run on the event loop thread, so writers are never concurrent
+                    on_result(series, city_name)
+    finally:
+        if owns_session:
+            session.close()
+
+    return results
+
+
+def fetch_weather_data_concurrently(
+    city_list,
+    on_result=None,
+    url=None,
+    concurrency=None,
+    rate_limit=None,
+    retries=None,
+    backoff=None,
+    batch_size=None,
+    session=None,
+    cache=None,
+):
+    """
+    Fetch weather data for many cities concurrently.
+
+    Args:
+        city_list (list): List of city dicts with City, Latitude and Longitude keys.
+        on_result (callable, optional): Called as on_result(series, city_name) with
+            the decoded WeatherSeries of every successful response.
+        url (str, optional): Forecast endpoint URL. Defaults to constants.WEATHER_API_URL.
+        concurrency (int, optional): Maximum number of in-flight requests.
+        rate_limit (float, optional): Maximum requests per second per host, 0 disables it.
+        retries (int, optional): Number of retries for transient failures.
+        backoff (float, optional): Base backoff delay in seconds.
+        batch_size (int, optional): Cities packed into one multi location request,
+            1 sends one request per city. Defaults to constants.FETCH_BATCH_SIZE.
+        session (requests.Session, optional): Session to reuse across calls, see
+            build_session. A new session is created and closed by default.
+        cache (ResponseCache, optional): Response cache consulted before every request.
+
+    Returns:
+        dict: Mapping of city name to WeatherSeries (None for failures).
+    """
+    return asyncio.run(
+        _fetch_all(
+            city_list,
+            on_result,
+            url or constants.WEATHER_API_URL,
+            concurrency or constants.FETCH_CONCURRENCY,
+            constants.FETCH_RATE_LIMIT if rate_limit is None else rate_limit,
+            constants.FETCH_RETRIES if retries is None else retries,
+            constants.FETCH_BACKOFF if backoff is None else backoff,
+            batch_size or constants.FETCH_BATCH_SIZE,
+            session,
+            cache,
+        )
+    )
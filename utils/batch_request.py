@@ -0,0 +1,91 @@
+import sys
+from pathlib import Path
+from urllib.parse import quote, urlencode
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+
+# Every extra coordinate adds an url encoded comma ("%2C") to both lists
+_SEPARATOR_LENGTH = 2 * len(quote(","))
+
+
+def build_batch_params(batch):
+    """
+    Build Open Meteo query parameters requesting several locations at once.
+
+    Args:
+        batch (list): List of city dicts with Latitude and Longitude keys.
+
+    Returns:
+        dict: Query parameters with comma separated latitude/longitude lists.
+    """
+    params = dict(constants.WEATHER_API_PARAMS)
+    params["latitude"] = ",".join(str(city["Latitude"]) for city in batch)
+    params["longitude"] = ",".join(str(city["Longitude"]) for city in batch)
+    return params
+
+
+def build_batches(city_list, url, batch_size=None, max_url_length=None):
+    """
+    Pack cities into batches bounded both by count and by the resulting URL length.
+
+    Args:
+        city_list (list): List of city dicts with City, Latitude and Longitude keys.
+        url (str): Forecast endpoint URL, counted towards the URL length.
+        batch_size (int, optional): Maximum cities per request.
+            Defaults to constants.FETCH_BATCH_SIZE.
+        max_url_length (int, optional): Maximum length of the full request URL.
+            Defaults to constants.FETCH_MAX_URL_LENGTH.
+
+    Returns:
+        list: List of batches, each a list of city dicts.
+    """
+    batch_size = batch_size or constants.FETCH_BATCH_SIZE
+    max_url_length = max_url_length or constants.FETCH_MAX_URL_LENGTH
+
+    base_params = build_batch_params([])
+    base_length = len(url) + 1 + len(urlencode(base_params, doseq=True))
+
+    batches = []
+    batch, length = [], base_length
+    for city in city_list:
+        city_length = len(quote(str(city["Latitude"]))) + len(
+            quote(str(city["Longitude"]))
+        )
+        if batch:
+            city_length += _SEPARATOR_LENGTH
+        if batch and (
+            len(batch) >= batch_size or length + city_length > max_url_length
+        ):
+            batches.append(batch)
+            batch, length = [], base_length
+            city_length -= _SEPARATOR_LENGTH
+        batch.append(city)
+        length += city_length
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def split_batch_response(payload, batch):
+    """
+    Split a multi location response back into per city records.
+    Open Meteo answers with a list in request order, or a single object
+    when only one location was requested.
+
+    Args:
+        payload (dict | list): Decoded JSON response.
+        batch (list): The city dicts the request was built from.
+
+    Returns:
+        list: List of (city_name, weather_data) tuples.
+
+    Raises:
+        ValueError: If the response does not contain one record per city.
+    """
+    records = payload if isinstance(payload, list) else [payload]
+    if len(records) != len(batch):
+        raise ValueError(
+            f"Expected {len(batch)} locations in batch response, got {len(records)}"
+        )
+    return [(city["City"], record) for city, record in zip(batch, records)]
@@ -1,58 +1,91 @@
 import requests
 import os
-import requests
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 import constants
+from utils.geocode_cache import GeocodeCache
+
+
+def fetch_city_latitude_longitude(city, api_key):
+    """
+    Fetch latitude and longitude for a single city from the geocoding API.
+    Picks the first result from the API response.
+
+    Args:
+        city (str): City name.
+        api_key (str): API Ninjas key.
+
+    Returns:
+        dict | None: City dict with City, Latitude and Longitude keys, or None.
+    """
+    try:
+        url = constants.GEO_NINJAS_API_URL.format(city)
+        response = requests.get(url, headers={"X-Api-Key": api_key})
 
+        if response.status_code == 200:
+            data = response.json()
+            if data:
+                first_result = data[0]
+                city_info = {
+                    "City": city,
+                    "Latitude": first_result["latitude"],
+                    "Longitude": first_result["longitude"],
+                }
+                print(f"Fetched data for {city}: {city_info}")
+                return city_info
+            print(f"No data found for city: {city}")
+        else:
+            print(
+                f"Error fetching data for {city}: {response.status_code} - {response.text}"
+            )
+    except Exception as e:
+        print(f"Exception occurred while fetching data for {city}: {e}")
+    return None
 
-def fetch_and_build_city_latitude_longitude_data(city_list):
+
+def fetch_and_build_city_latitude_longitude_data(city_list, cache=None):
     """
     Fetch latitude and longitude for a list of cities and return a list of dictionaries.
-    Picks the first result from the API response for each city.
+    Cities found in the geocode cache are answered locally, only misses are sent
+    to the geocoding API, in parallel.
 
     Args:
         city_list (list): List of city names.
+        cache (GeocodeCache, optional): Cache to use. Defaults to the on-disk cache.
 
     Returns:
         list: A list of dictionaries with city, latitude, and longitude.
     """
-    api_url = constants.GEO_NINJAS_API_URL
-    api_key = os.getenv("NINJAS_API_KEY")  # API key from env variable
-
-    if not api_key:
-        print("Error: NINJAS_API_KEY environment variable is not set.")
-        return []
-
-    city_data = []
+    cache = cache if cache is not None else GeocodeCache()
 
+    resolved = {}
+    misses = []
     for city in city_list:
-        try:
-            url = api_url.format(city)
-            response = requests.get(url, headers={"X-Api-Key": api_key})
-
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    first_result = data[0]
-                    city_info = {
-                        "City": city,
-                        "Latitude": first_result["latitude"],
-                        "Longitude": first_result["longitude"],
-                    }
-                    city_data.append(city_info)
-                    print(f"Fetched data for {city}: {city_info}")
-                else:
-                    print(f"No data found for city: {city}")
-            else:
-                print(
-                    f"Error fetching data for {city}: {response.status_code} - {response.text}"
+        city_info = cache.get(city)
+        if city_info:
+            resolved[city] = city_info
+        elif city not in misses:
+            misses.append(city)
+
+    if misses:
+        api_key = os.getenv("NINJAS_API_KEY")  # API key from env variable
+        if not api_key:
+            print("Error: NINJAS_API_KEY environment variable is not set.")
+        else:
+            with ThreadPoolExecutor(max_workers=constants.GEOCODE_WORKERS) as executor:
+                fetched = executor.map(
+                    lambda city: fetch_city_latitude_longitude(city, api_key), misses
                 )
-        except Exception as e:
-            print(f"Exception occurred while fetching data for {city}: {e}")
-    return city_data
+                for city, city_info in zip(misses, fetched):
+                    if city_info:
+                        cache.put(city_info)
+                        resolved[city] = city_info
+            cache.save()
+
+    return [resolved[city] for city in city_list if city in resolved]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_parquet_partition_dir_for_given_date
+from utils.logger import setup_logger
+from utils.weather_series import HOURLY_COLUMNS, WeatherSeries
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Same column names as the CSV files, so readers work with either format.
+# Repeated strings are dictionary encoded, Time has only a few hundred distinct values.
+WEATHER_SCHEMA = pa.schema(
+    [
+        ("City", pa.dictionary(pa.int32(), pa.string())),
+        ("Latitude", pa.float64()),
+        ("Longitude", pa.float64()),
+        ("Weather Code", pa.int16()),
+        ("Timezone", pa.dictionary(pa.int8(), pa.string())),
+        ("Time", pa.dictionary(pa.int32(), pa.string())),
+        ("Relative Humidity (%)", pa.float32()),
+        ("Temperature (°C)", pa.float32()),
+        ("Wind Speed (m/s)", pa.float32()),
+    ]
+)
+
+
+class ColumnarWeatherWriter:
+    """
+    Buffers decoded hourly series and writes them as Parquet part files into a
+    date partition once `batch_rows` rows have accumulated.
+    Use it as a context manager, or call close() to write the last batch.
+    """
+
+    def __init__(self, partition_dir=None, batch_rows=None):
+        self.partition_dir = Path(
+            partition_dir or get_parquet_partition_dir_for_given_date()
+        )
+        self.batch_rows = batch_rows or constants.PARQUET_BATCH_ROWS
+        self._series = []
+        self._rows = 0
+        self._parts = 0
+
+    def append(self, weather_data, city_name):
+        """
+        Buffer the hourly series of one city.
+
+        Args:
+            weather_data (WeatherSeries | dict): The decoded series, or the weather
+                data retrieved from the Meteo API.
+            city_name (str): Name of city.
+        """
+        series = WeatherSeries.coerce(weather_data, city_name)
+        self._series.append(series)
+        self._rows += len(series)
+        if self._rows >= self.batch_rows:
+            self.flush()
+
+    def _build_table(self):
+        series_list = self._series
+        counts = [len(series) for series in series_list]
+
+        def per_city(values):
+            return np.repeat(values, counts)
+
+        columns = {
+            "City": per_city([series.city.name for series in series_list]),
+            "Latitude": per_city([series.city.latitude for series in series_list]),
+            "Longitude": per_city([series.city.longitude for series in series_list]),
+            "Timezone": per_city([series.city.timezone for series in series_list]),
+            "Time": np.concatenate([series.local_times() for series in series_list]),
+        }
+        for variable, column in HOURLY_COLUMNS.items():
+            columns[column] = np.concatenate(
+                [series.values[variable] for series in series_list]
+            )
+        # from_pandas turns the NaN of integer variables with gaps into nulls
+        return pa.table(
+            [
+                pa.array(columns[field.name], from_pandas=True).cast(field.type)
+                for field in WEATHER_SCHEMA
+            ],
+            schema=WEATHER_SCHEMA,
+        )
+
+    def flush(self):
+        """
+        Write the buffered rows as a new part file in the partition.
+        """
+        if not self._rows:
+            return
+
+        table = self._build_table()
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+        part_file = (
+            self.partition_dir
+            / f"part-{time.time_ns()}-{os.getpid()}-{self._parts:05d}.parquet"
+        )
+        # Write under a hidden name first, readers skip files starting with "."
+        tmp_file = part_file.with_name(f".{part_file.name}")
+        pq.write_table(table, tmp_file, compression="zstd")
+        os.replace(tmp_file, part_file)
+        logger.info(f"Wrote {self._rows} rows to {part_file}")
+
+        self._series = []
+        self._rows = 0
+        self._parts += 1
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_weather_data(partition_dir=None, columns=None):
+    """
+    Load a date partition written by ColumnarWeatherWriter.
+    Only the requested columns are read from disk.
+
+    Args:
+        partition_dir (str, optional): Partition folder. Defaults to today's partition.
+        columns (list, optional): Columns to load. Defaults to all columns.
+
+    Returns:
+        pd.DataFrame: The weather data, dictionary encoded columns become categoricals.
+    """
+    partition_dir = Path(partition_dir or get_parquet_partition_dir_for_given_date())
+    part_files = sorted(
+        path
+        for path in partition_dir.glob("*.parquet")
+        if not path.name.startswith(".")
+    )
+    if not part_files:
+        raise FileNotFoundError(f"No parquet files found in {partition_dir}")
+
+    tables = [pq.read_table(path, columns=columns) for path in part_files]
+    return pa.concat_tables(tables, promote_options="permissive").to_pandas()
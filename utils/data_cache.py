@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+# Column holding the hour of each row in every data set
+TIME_COLUMNS = {
+    "weather": "Time",
+    "highest_temp": "Hour",
+    "lowest_humidity": "Hour",
+    "daily_rollup": "Date",
+    "weekly_rollup": "Week",
+}
+
+
+class CachedFrame:
+    """
+    A loaded CSV file along with the file version it was loaded from.
+    """
+
+    __slots__ = ("df", "version")
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+
+
+class DataCache:
+    """
+    In-memory cache of the processed CSV files.
+
+    Every file is parsed once into a DataFrame, with the City column stored as a
+    categorical so filtering by city compares small integer codes. A file is
+    reloaded when its modification time or size changes, checked at most once
+    every `check_interval` seconds per file.
+    """
+
+    def __init__(self, files, check_interval=1.0):
+        self.files = files
+        self.check_interval = check_interval
+        self._frames = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _file_version(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, data_type):
+        path = self.files[data_type]
+        version = self._file_version(path)
+        df = pd.read_csv(path, float_precision="round_trip")
+        if "City" in df.columns:
+            df["City"] = df["City"].astype("category")
+        self._frames[data_type] = CachedFrame(df, version)
+        return self._frames[data_type]
+
+    def load_all(self):
+        """
+        Load every file that exists, used to warm the cache at start up.
+        """
+        for data_type, path in self.files.items():
+            if os.path.exists(path):
+                with self._lock:
+                    self._load(data_type)
+
+    def get(self, data_type):
+        """
+        Return the cached data, reloading it if the file changed on disk.
+
+        Args:
+            data_type (str): Key of the file in `files`.
+
+        Returns:
+            CachedFrame: The data and the file version it was loaded from.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+        """
+        now = time.monotonic()
+        cached = self._frames.get(data_type)
+        if cached and now - self._checked_at.get(data_type, 0) < self.check_interval:
+            return cached
+
+        with self._lock:
+            cached = self._frames.get(data_type)
+            version = self._file_version(self.files[data_type])
+            if not cached or cached.version != version:
+                cached = self._load(data_type)
+            self._checked_at[data_type] = now
+            return cached
+
+
+def query_frame(df, time_column, cities=None, start=None, end=None, metrics=None):
+    """
+    Filter cached data by city, time range and columns.
+
+    Args:
+        df (pd.DataFrame): Cached data.
+        time_column (str): Column holding the hour of each row.
+        cities (list, optional): Cities to keep.
+        start (str, optional): First hour to keep, ISO formatted ("2024-12-02T00:00").
+        end (str, optional): Last hour to keep, ISO formatted.
+        metrics (list, optional): Metric columns to keep. City and time are always kept.
+
+    Returns:
+        pd.DataFrame: The matching rows.
+
+    Raises:
+        KeyError: If a requested metric is not a column of the data.
+    """
+    mask = pd.Series(True, index=df.index)
+    if cities:
+        mask &= df["City"].isin(cities)
+    # ISO timestamps compare correctly as plain strings
+    if start:
+        mask &= df[time_column] >= start
+    if end:
+        mask &= df[time_column] <= end
+
+    columns = list(df.columns)
+    if metrics:
+        unknown = [metric for metric in metrics if metric not in df.columns]
+        if unknown:
+            raise KeyError(", ".join(unknown))
+        columns = [
+            column for column in df.columns if column in ("City", time_column)
+        ] + [metric for metric in metrics if metric not in ("City", time_column)]
+
+    return df.loc[mask.to_numpy(), columns]
@@ -1,181 +1,488 @@
+import hashlib
+import io
+import json
 import os
 import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 
+import matplotlib
+
+# Graphs are only ever saved to files, never shown, so no display is needed
+matplotlib.use("Agg")
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.ticker import MaxNLocator
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
 from utils.generate_file_name import (
+    get_graph_manifest_file,
     get_weather_processed_file,
     get_highest_temperature_cities_file,
     get_lowest_humidity_cities_file,
 )
+from utils.logger import setup_logger
+from utils.metrics import GRAPH_RENDER_SECONDS, STAGE_SECONDS
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
 
+# Set by render_graph_bytes to draw figures at a requested size
+_figsize_override = ContextVar("figsize_override", default=None)
 
-def plot_temperature_vs_city(data):
+
+@contextmanager
+def new_figure(figsize):
     """
-    Plot temperature vs city as a bar chart.
+    Create a figure that is not tracked by pyplot and free it once saved.
+
+    Args:
+        figsize (tuple): Figure size in inches, unless render_graph_bytes overrides it.
+
+    Yields:
+        tuple: (figure, axes)
     """
+    fig = Figure(figsize=_figsize_override.get() or figsize)
+    try:
+        yield fig, fig.add_subplot()
+    finally:
+        fig.clear()
 
-    plt.figure(figsize=(10, 6))
-    plt.bar(
-        data["City"],
-        data["Temperature (°F)"],
-        color="skyblue",
-        label="Temperature (°F)",
-    )
-    plt.xlabel("City")
-    plt.ylabel("Temperature (°F)")
-    plt.title("Temperature (°F) by City")
-    plt.xticks(rotation=45, ha="right")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("Graphs/temperature_by_city.png")
-    plt.show(block=False)
+
+def rotate_x_labels(ax):
+    """
+    Rotate x tick labels by 45 degrees, anchored at their right end.
+    """
+    ax.tick_params(axis="x", labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
 
 
-def plot_wind_speed_vs_city(data):
+def plot_temperature_vs_city(data, output_file="Graphs/temperature_by_city.png"):
+    """
+    Plot temperature vs city as a bar chart.
+    """
+    with new_figure((10, 6)) as (fig, ax):
+        ax.bar(
+            data["City"],
+            data["Temperature (°F)"],
+            color="skyblue",
+            label="Temperature (°F)",
+        )
+        ax.set_xlabel("City")
+        ax.set_ylabel("Temperature (°F)")
+        ax.set_title("Temperature (°F) by City")
+        rotate_x_labels(ax)
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(output_file)
+    return output_file
+
+
+def plot_wind_speed_vs_city(data, output_file="Graphs/wind_speed_by_city.png"):
     """
     Plot wind speed vs city as a bar chart.
     """
-    plt.figure(figsize=(10, 6))
-    plt.bar(
-        data["City"], data["Wind Speed (mph)"], color="orange", label="Wind Speed (mph)"
-    )
-    plt.xlabel("City")
-    plt.ylabel("Wind Speed (mph)")
-    plt.title("Wind Speed (mph) by City")
-    plt.xticks(rotation=45, ha="right")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("Graphs/wind_speed_by_city.png")
-    plt.show(block=False)
+    with new_figure((10, 6)) as (fig, ax):
+        ax.bar(
+            data["City"],
+            data["Wind Speed (mph)"],
+            color="orange",
+            label="Wind Speed (mph)",
+        )
+        ax.set_xlabel("City")
+        ax.set_ylabel("Wind Speed (mph)")
+        ax.set_title("Wind Speed (mph) by City")
+        rotate_x_labels(ax)
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(output_file)
+    return output_file
 
 
-def plot_temperature_vs_wind_speed(data):
+def plot_temperature_vs_wind_speed(
+    data, output_file="Graphs/temperature_vs_wind_speed.png"
+):
     """
     Plot temperature vs wind speed as a scatter plot.
     """
-    plt.figure(figsize=(10, 6))
-    plt.scatter(
-        data["Temperature (°F)"],
-        data["Wind Speed (m/s)"],
-        color="green",
-        label="Data Points",
-    )
-    plt.xlabel("Temperature (°F)")
-    plt.ylabel("Wind Speed (mph)")
-    plt.title("Temperature vs. Wind Speed")
-    plt.grid(alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("Graphs/temperature_vs_wind_speed.png")
-    plt.show(block=False)
+    with new_figure((10, 6)) as (fig, ax):
+        ax.scatter(
+            data["Temperature (°F)"],
+            data["Wind Speed (m/s)"],
+            color="green",
+            label="Data Points",
+        )
+        ax.set_xlabel("Temperature (°F)")
+        ax.set_ylabel("Wind Speed (mph)")
+        ax.set_title("Temperature vs. Wind Speed")
+        ax.grid(alpha=0.3)
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(output_file)
+    return output_file
 
 
-def plot_highest_temperature_over_time(data):
+def plot_highest_temperature_over_time(
+    data, output_file="Graphs/highest_temperature_over_time.png"
+):
     """
     Plot the highest temperature over time as a line chart.
     """
-    plt.figure(figsize=(10, 6))
-    plt.plot(
-        data["Hour"],
-        data["Temperature (°F)"],
-        marker="o",
-        color="red",
-        label="Highest Temp (°F)",
-    )
-    plt.xlabel("Hour")
-    plt.ylabel("Temperature (°F)")
-    plt.title("Highest Temperature Over Time")
-    plt.grid(alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("Graphs/highest_temperature_over_time.png")
-    plt.show(block=False)
+    with new_figure((10, 6)) as (fig, ax):
+        ax.plot(
+            data["Hour"],
+            data["Temperature (°F)"],
+            marker="o",
+            color="red",
+            label="Highest Temp (°F)",
+        )
+        ax.set_xlabel("Hour")
+        ax.set_ylabel("Temperature (°F)")
+        ax.set_title("Highest Temperature Over Time")
+        ax.grid(alpha=0.3)
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(output_file)
+    return output_file
 
 
-def plot_lowest_humidity_over_time(data):
+def plot_lowest_humidity_over_time(
+    data, output_file="Graphs/lowest_humidity_over_time.png"
+):
     """
     Plot the lowest humidity over time as a line chart.
     """
-    plt.figure(figsize=(10, 6))
-    plt.plot(
-        data["Hour"],
-        data["Relative Humidity (%)"],
-        marker="o",
-        color="blue",
-        label="Lowest Humidity (%)",
-    )
-    plt.xlabel("Hour")
-    plt.ylabel("Relative Humidity (%)")
-    plt.title("Lowest Humidity Over Time")
-    plt.grid(alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("Graphs/lowest_humidity_over_time.png")
-    plt.show(block=False)
+    with new_figure((10, 6)) as (fig, ax):
+        ax.plot(
+            data["Hour"],
+            data["Relative Humidity (%)"],
+            marker="o",
+            color="blue",
+            label="Lowest Humidity (%)",
+        )
+        ax.set_xlabel("Hour")
+        ax.set_ylabel("Relative Humidity (%)")
+        ax.set_title("Lowest Humidity Over Time")
+        ax.grid(alpha=0.3)
+        ax.legend()
+        fig.tight_layout()
+        fig.savefig(output_file)
+    return output_file
 
 
-def plot_city_temperature_vs_time(data, selected_city=None):
+def plot_city_temperature_vs_time(
+    data, selected_city=None, output_file=None, metric="Temperature (°F)"
+):
     """
     Plot temperature vs time for each city as a line chart.
     If selected_city is provided, only plot data for that city.
+    Another column of the data can be plotted instead of temperature with metric.
     """
-    plt.figure(figsize=(12, 8))
-
-    if selected_city:
-        city_data = data[data["City"] == selected_city]
-        plt.plot(
-            city_data["Time"],
-            city_data["Temperature (°F)"],
-            marker="o",
-            label=f"{selected_city}",
-        )
-    else:
-        cities = data["City"].unique()
-        for city in cities:
-            city_data = data[data["City"] == city]
-            plt.plot(
+    with new_figure((12, 8)) as (fig, ax):
+        if selected_city:
+            city_data = data[data["City"] == selected_city]
+            ax.plot(
                 city_data["Time"],
-                city_data["Temperature (°F)"],
+                city_data[metric],
                 marker="o",
-                label=city,
+                label=f"{selected_city}",
             )
+        else:
+            for city, city_data in data.groupby("City", sort=False, observed=True):
+                ax.plot(
+                    city_data["Time"],
+                    city_data[metric],
+                    marker="o",
+                    label=city,
+                )
+
+        title = "Temperature" if metric == "Temperature (°F)" else metric
+        ax.set_xlabel("Time")
+        ax.set_ylabel(metric)
+        ax.set_title(
+            f"City {title} vs. Time{' - ' + selected_city if selected_city else ''}"
+        )
+        ax.xaxis.set_major_locator(MaxNLocator(nbins=10))
+        rotate_x_labels(ax)
+
+        ax.legend(title="City")
+        ax.grid(alpha=0.3)
+        fig.tight_layout()
+
+        output_file = (
+            output_file
+            or f"Graphs/city_temperature_vs_time_{selected_city if selected_city else 'all'}.png"
+        )
+        fig.savefig(output_file)
+    return output_file
+
+
+def render_graph_bytes(plot_name, data, figsize, image_format, **kwargs):
+    """
+    Render a graph into memory instead of the Graphs folder.
+
+    Args:
+        plot_name (str): Name of a plot_* function of this module.
+        data (pd.DataFrame): Data to plot.
+        figsize (tuple): Figure size in inches.
+        image_format (str): Image format understood by matplotlib, e.g. png or svg.
+        **kwargs: Passed on to the plot function.
+
+    Returns:
+        bytes: The encoded image.
+    """
+    buffer = io.BytesIO()
+    token = _figsize_override.set(figsize)
+    try:
+        with matplotlib.rc_context({"savefig.format": image_format}):
+            globals()[plot_name](data, output_file=buffer, **kwargs)
+    finally:
+        _figsize_override.reset(token)
+    return buffer.getvalue()
+
+
+# Fixed graphs rendered from the processed data as (plot function, input file getter, output file)
+GRAPH_JOBS = [
+    (
+        plot_temperature_vs_city,
+        get_weather_processed_file,
+        "Graphs/temperature_by_city.png",
+    ),
+    (
+        plot_wind_speed_vs_city,
+        get_weather_processed_file,
+        "Graphs/wind_speed_by_city.png",
+    ),
+    (
+        plot_temperature_vs_wind_speed,
+        get_weather_processed_file,
+        "Graphs/temperature_vs_wind_speed.png",
+    ),
+    (
+        plot_highest_temperature_over_time,
+        get_highest_temperature_cities_file,
+        "Graphs/highest_temperature_over_time.png",
+    ),
+    (
+        plot_lowest_humidity_over_time,
+        get_lowest_humidity_cities_file,
+        "Graphs/lowest_humidity_over_time.png",
+    ),
+    (
+        plot_city_temperature_vs_time,
+        get_weather_processed_file,
+        "Graphs/city_temperature_vs_time_all.png",
+    ),
+]
 
-    plt.xlabel("Time")
-    plt.ylabel("Temperature (°F)")
-    plt.title(
-        f"City Temperature vs. Time{' - ' + selected_city if selected_city else ''}"
+# Explicit dtypes of the graph inputs, City codes and float32 metrics take a
+# fraction of the memory of object strings and float64 columns
+PLOT_DTYPES = {
+    "City": "category",
+    "Temperature (°C)": np.float32,
+    "Temperature (°F)": np.float32,
+    "Relative Humidity (%)": np.float32,
+    "Wind Speed (m/s)": np.float32,
+    "Wind Speed (mph)": np.float32,
+}
+
+# Data loaded once per worker process by _init_worker
+_worker_data = {}
+
+
+def read_plot_data(input_file, columns=None, cities=None):
+    """
+    Load a processed CSV file with the compact PLOT_DTYPES. With the sqlite
+    storage format the rows come from its copy in the database instead.
+
+    Args:
+        input_file (str): Processed or ranking CSV file.
+        columns (list, optional): Columns to load. Defaults to all columns.
+        cities (list, optional): Cities to load. Defaults to every city.
+
+    Returns:
+        pd.DataFrame: The data.
+    """
+    if constants.STORAGE_FORMAT == "sqlite":
+        from utils.sqlite_store import PROCESSED_TABLES, read_processed
+
+        data_type = next(
+            data_type
+            for data_type, (get_file, _) in PROCESSED_TABLES.items()
+            if get_file() == input_file
+        )
+        return read_processed(data_type, columns, cities=cities, dtype=PLOT_DTYPES)
+
+    data = pd.read_csv(input_file, usecols=columns, dtype=PLOT_DTYPES)
+    return data[data["City"].isin(cities)] if cities else data
+
+
+def _init_worker(input_files):
+    for input_file in input_files:
+        _worker_data[input_file] = read_plot_data(input_file)
+
+
+def _render_job(plot_name, input_file, kwargs):
+    # Workers are separate processes, the parent records the render time
+    start = time.perf_counter()
+    globals()[plot_name](_worker_data[input_file], **kwargs)
+    return time.perf_counter() - start
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_graph_manifest(manifest_file):
+    try:
+        with open(manifest_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_graph_manifest(manifest, manifest_file):
+    manifest_file = Path(manifest_file)
+    manifest_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=manifest_file.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_file)
+
+
+def render_graph_jobs(jobs, input_files, workers=None, manifest_file=None, force=False):
+    """
+    Render graphs in a process pool, skipping graphs whose input data did not
+    change since they were last rendered.
+
+    Args:
+        jobs (list): (plot function name, input file, kwargs, output file, data hash) tuples.
+        input_files (list): CSV files each worker loads once at start up.
+        workers (int, optional): Number of processes. Defaults to constants.PLOT_WORKERS.
+        manifest_file (str, optional): Where data hashes of rendered graphs are kept.
+        force (bool): Render every graph even if its data did not change.
+
+    Returns:
+        list: Output files that were rendered.
+    """
+    manifest_file = manifest_file or get_graph_manifest_file()
+    manifest = load_graph_manifest(manifest_file)
+
+    pending = [
+        job
+        for job in jobs
+        if force or manifest.get(job[3]) != job[4] or not os.path.exists(job[3])
+    ]
+    logger.info(
+        f"Rendering {len(pending)} of {len(jobs)} graphs, the rest are up to date"
     )
-    plt.xticks(rotation=45, ha="right")
+    if not pending:
+        return []
 
-    ax = plt.gca()
-    ax.xaxis.set_major_locator(MaxNLocator(nbins=10))
+    rendered = []
+    workers = min(workers or constants.PLOT_WORKERS or os.cpu_count(), len(pending))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(input_files,)
+    ) as executor:
+        futures = [
+            (
+                executor.submit(_render_job, plot_name, input_file, kwargs),
+                plot_name,
+                output,
+                h,
+            )
+            for plot_name, input_file, kwargs, output, h in pending
+        ]
+        for future, plot_name, output_file, data_hash in futures:
+            try:
+                GRAPH_RENDER_SECONDS.observe(future.result(), graph=plot_name)
+            except Exception as e:
+                logger.error(f"Failed to render {output_file}: {e}")
+                continue
+            manifest[output_file] = data_hash
+            rendered.append(output_file)
 
-    plt.legend(title="City")
-    plt.grid(alpha=0.3)
-    plt.tight_layout()
+    save_graph_manifest(manifest, manifest_file)
+    return rendered
 
-    filename = f"Graphs/city_temperature_vs_time_{selected_city if selected_city else 'all'}.png"
-    plt.savefig(filename)
-    plt.show(block=False)
 
+@STAGE_SECONDS.timed(stage="plot")
+def plot_graphs_from_processed_data(workers=None, force=False):
+    """
+    Render the fixed graphs from the processed data files in parallel.
+    Graphs whose input file did not change since the last run are skipped.
 
-def plot_graphs_from_processed_data():
+    Args:
+        workers (int, optional): Number of processes. Defaults to constants.PLOT_WORKERS.
+        force (bool): Render every graph even if its data did not change.
 
-    weather_data = pd.read_csv(get_weather_processed_file())
-    highest_temp_data = pd.read_csv(get_highest_temperature_cities_file())
-    lowest_humidity_data = pd.read_csv(get_lowest_humidity_cities_file())
+    Returns:
+        list: Output files that were rendered.
+    """
+    input_files = sorted({get_input_file() for _, get_input_file, _ in GRAPH_JOBS})
+    file_hashes = {input_file: hash_file(input_file) for input_file in input_files}
+
+    jobs = [
+        (
+            plot_function.__name__,
+            get_input_file(),
+            {"output_file": output_file},
+            output_file,
+            f"{plot_function.__name__}:{file_hashes[get_input_file()]}",
+        )
+        for plot_function, get_input_file, output_file in GRAPH_JOBS
+    ]
 
-    plot_temperature_vs_city(weather_data)
-    plot_wind_speed_vs_city(weather_data)
-    plot_temperature_vs_wind_speed(weather_data)
-    plot_highest_temperature_over_time(highest_temp_data)
-    plot_lowest_humidity_over_time(lowest_humidity_data)
-    plot_city_temperature_vs_time(weather_data)
+    return render_graph_jobs(jobs, input_files, workers=workers, force=force)
 
-    # Show all plots at once
-    plt.show()  # Comment this line to avoid showing graphs directly
+
+@STAGE_SECONDS.timed(stage="plot_city_charts")
+def plot_city_temperature_charts(cities=None, workers=None, force=False):
+    """
+    Render one temperature vs time chart per city as a parallel batch job.
+    Only cities whose rows changed since the last run are re-rendered.
+
+    Args:
+        cities (list, optional): Cities to render. Defaults to every city in the data.
+        workers (int, optional): Number of processes. Defaults to constants.PLOT_WORKERS.
+        force (bool): Render every chart even if its data did not change.
+
+    Returns:
+        list: Output files that were rendered.
+    """
+    input_file = get_weather_processed_file()
+    data = read_plot_data(
+        input_file, columns=["City", "Time", "Temperature (°F)"], cities=cities
+    )
+
+    # Row hashes summed per city give a cheap fingerprint of every city's data
+    row_hashes = pd.util.hash_pandas_object(
+        data[["City", "Time", "Temperature (°F)"]], index=False
+    )
+    city_hashes = row_hashes.groupby(data["City"], sort=False, observed=True).sum()
+
+    jobs = [
+        (
+            "plot_city_temperature_vs_time",
+            input_file,
+            {
+                "selected_city": city,
+                "output_file": f"Graphs/city_temperature_vs_time_{city}.png",
+            },
+            f"Graphs/city_temperature_vs_time_{city}.png",
+            f"plot_city_temperature_vs_time:{city_hash}",
+        )
+        for city, city_hash in city_hashes.items()
+    ]
+    return render_graph_jobs(jobs, [input_file], workers=workers, force=force)
@@ -0,0 +1,371 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import (
+    get_event_log_file,
+    get_highest_temperature_cities_file,
+    get_lowest_humidity_cities_file,
+)
+from utils.logger import setup_logger
+from utils.weather_series import HOURLY_COLUMNS, HOURLY_DTYPES, WeatherSeries
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Event types, a client filtering by type uses these names
+OBSERVATION_EVENT = "observation"
+RANKING_EVENT = "ranking"
+EVENT_TYPES = [OBSERVATION_EVENT, RANKING_EVENT]
+
+# Sent to a subscriber in place of the events it was too slow to receive
+DROPPED_EVENT = "dropped"
+# Sent when a reconnecting client asks for events that are no longer buffered
+RESET_EVENT = "reset"
+
+# Ranking files published after processing, named like the /data types
+RANKING_FILES = {
+    "highest_temp": get_highest_temperature_cities_file,
+    "lowest_humidity": get_lowest_humidity_cities_file,
+}
+
+# Pipeline threads and processes append to the same file, one write per batch
+_append_lock = threading.Lock()
+
+
+def append_events(events, path=None):
+    """
+    Append events to the event log as JSON lines, in one write so lines of
+    concurrent writers never interleave. The log is rotated to <path>.1 once it
+    grows past constants.EVENT_LOG_MAX_BYTES.
+
+    Args:
+        events (list): Event dicts.
+        path (str, optional): Event log. Defaults to cache/events.jsonl.
+    """
+    if not events or not constants.EVENTS_ENABLED:
+        return
+    path = path or get_event_log_file()
+    data = "".join(
+        json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for event in events
+    ).encode("utf-8")
+    try:
+        with _append_lock:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            if constants.EVENT_LOG_MAX_BYTES and size > constants.EVENT_LOG_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+    except OSError as e:
+        # Live updates are best effort, the pipeline outputs are already written
+        logger.warning(f"Failed to publish {len(events)} events: {e}")
+
+
+def _json_value(variable, value):
+    if value.dtype.kind == "f" and np.isnan(value):
+        return None
+    if np.issubdtype(HOURLY_DTYPES[variable], np.integer):
+        return int(value)
+    # The shortest decimal text of a float32, 12.3 rather than 12.300000190734863
+    return float(str(value))
+
+
+def observation_event(series, city_name):
+    """
+    Build the event announcing a newly stored series of a city, holding the
+    values of the current hour (or of the first hour, for a forecast that
+    starts later) and the range of hours written.
+
+    Args:
+        series (WeatherSeries | dict): The decoded series or API payload.
+        city_name (str): Name of the city.
+
+    Returns:
+        dict: The event.
+    """
+    series = WeatherSeries.coerce(series, city_name)
+    times = series.local_times()
+    current = max(int(np.searchsorted(series.time, time.time(), side="right")) - 1, 0)
+    return {
+        "type": OBSERVATION_EVENT,
+        "city": city_name,
+        "time": str(times[current]),
+        "first": str(times[0]),
+        "last": str(times[-1]),
+        "hours": len(series),
+        "values": {
+            HOURLY_COLUMNS[variable]: _json_value(variable, array[current])
+            for variable, array in series.values.items()
+        },
+        "published": time.time(),
+    }
+
+
+def publish_observation(series, city_name):
+    """
+    Publish the observation event of a stored series, a fetch writer.
+    """
+    if len(series):
+        append_events([observation_event(series, city_name)])
+
+
+def ranking_events(now=None):
+    """
+    Build one event per ranking file with the ranked cities of the current hour
+    (or of the last hour, when the data ends before now).
+
+    Args:
+        now (float, optional): Epoch seconds to pick the hour for. Defaults to now.
+
+    Returns:
+        list: The events of every ranking file that exists.
+    """
+    import pandas as pd
+
+    # Hours are written in GMT, see constants.WEATHER_API_PARAMS
+    hour = time.strftime("%Y-%m-%dT%H:00", time.gmtime(now or time.time()))
+    events = []
+    for ranking, get_file in RANKING_FILES.items():
+        if not os.path.exists(get_file()):
+            continue
+        ranked = pd.read_csv(get_file(), float_precision="round_trip")
+        if ranked.empty:
+            continue
+        hours = ranked["Hour"].astype(str)
+        past = hours[hours <= hour]
+        current = past.max() if len(past) else hours.min()
+        rows = ranked[hours == current].drop(columns="Hour")
+        events.append(
+            {
+                "type": RANKING_EVENT,
+                "ranking": ranking,
+                "hour": current,
+                "cities": rows["City"].astype(str).tolist(),
+                "rows": json.loads(rows.to_json(orient="records", force_ascii=False)),
+                "published": time.time(),
+            }
+        )
+    return events
+
+
+def publish_rankings():
+    """
+    Publish the current hour of every ranking file, called once processing finished.
+    """
+    if constants.EVENTS_ENABLED:
+        append_events(ranking_events())
+
+
+class Subscription:
+    """
+    Events of one client, filtered by city and event type.
+
+    Events are buffered in a bounded queue so a slow client never holds up the
+    broker or the other clients. When the queue is full the oldest events are
+    dropped, and the client receives a "dropped" event with their count before
+    the next buffered one, telling it to fetch the current state from /data.
+    """
+
+    def __init__(self, cities=None, types=None, max_events=1000):
+        self.cities = set(cities) if cities else None
+        self.types = set(types) if types else None
+        self.dropped = 0
+        self._events = deque()
+        self._max_events = max_events
+        self._ready = asyncio.Event()
+
+    def set_filter(self, cities=None, types=None):
+        """
+        Replace the city and type filters, None or an empty list receives everything.
+        """
+        self.cities = set(cities) if cities else None
+        self.types = set(types) if types else None
+
+    def matches(self, event):
+        """
+        Return whether the event passes the filters. Events about several cities
+        pass if any of them is followed, events about none always pass.
+        """
+        if self.types is not None and event["type"] not in self.types:
+            return False
+        if self.cities is None:
+            return True
+        if "city" in event:
+            return event["city"] in self.cities
+        if "cities" in event:
+            return not self.cities.isdisjoint(event["cities"])
+        return True
+
+    def put(self, event):
+        """
+        Queue an event without waiting, dropping the oldest one when full.
+        """
+        if len(self._events) >= self._max_events:
+            self._events.popleft()
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def get(self):
+        """
+        Wait for the next event.
+
+        Returns:
+            dict: The event, or a "dropped" event if events were lost since the
+                last call.
+        """
+        while not self._events:
+            self._ready.clear()
+            await self._ready.wait()
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {"type": DROPPED_EVENT, "count": dropped}
+        return self._events.popleft()
+
+
+class EventBroker:
+    """
+    Fans the events appended to the event log by pipeline processes out to the
+    subscribers of this server process.
+
+    The log is tailed every `poll_interval` seconds, starting at its end when
+    the broker starts. Every event gets an id "<broker start>-<sequence>", and
+    the last `replay_events` events are kept so a reconnecting client can
+    resume after the last id it received.
+    """
+
+    def __init__(
+        self, path=None, poll_interval=0.5, max_events=1000, replay_events=1000
+    ):
+        self.path = path or get_event_log_file()
+        self.poll_interval = poll_interval
+        self.max_events = max_events
+        self.subscribers = set()
+        self.published = 0
+        self._epoch = str(int(time.time() * 1000))
+        self._recent = deque(maxlen=replay_events)
+        self._file = None
+        self._partial = b""
+        self._task = None
+
+    def start(self):
+        """
+        Start tailing the event log, from its current end, on the running loop.
+        """
+        self._open(at_end=True)
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self, at_end=False):
+        try:
+            self._file = open(self.path, "rb")
+        except FileNotFoundError:
+            self._file = None
+            return
+        if at_end:
+            self._file.seek(0, os.SEEK_END)
+        self._partial = b""
+
+    def _read_lines(self):
+        if self._file is None:
+            self._open()
+            if self._file is None:
+                return []
+        data = self._file.read()
+        try:
+            rotated = os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = False
+        if rotated:
+            # The rest of the old file was read above, continue with the new one
+            self._file.close()
+            self._open()
+            if self._file is not None:
+                data += self._file.read()
+
+        lines = (self._partial + data).split(b"\n")
+        # A line without its newline yet is completed by a later read
+        self._partial = lines.pop()
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping malformed event: {line[:200]!r}")
+        return events
+
+    async def _tail(self):
+        while True:
+            try:
+                for event in await asyncio.to_thread(self._read_lines):
+                    self.publish(event)
+            except Exception:
+                logger.exception("Failed to read the event log")
+            await asyncio.sleep(self.poll_interval)
+
+    def publish(self, event):
+        """
+        Give an event an id and queue it for every matching subscriber.
+        """
+        self.published += 1
+        event["id"] = f"{self._epoch}-{self.published}"
+        self._recent.append(event)
+        for subscription in self.subscribers:
+            if subscription.matches(event):
+                subscription.put(event)
+
+    def subscribe(self, cities=None, types=None, last_event_id=None):
+        """
+        Register a subscriber.
+
+        Args:
+            cities (list, optional): Cities to receive events about, None for all.
+            types (list, optional): Event types to receive, None for all.
+            last_event_id (str, optional): Id of the last event the client
+                received, buffered events after it are replayed first.
+
+        Returns:
+            Subscription: The subscriber's queue, pass it to unsubscribe when done.
+        """
+        subscription = Subscription(cities, types, self.max_events)
+        if last_event_id:
+            self._replay(subscription, last_event_id)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def _replay(self, subscription, last_event_id):
+        epoch, _, sequence = last_event_id.partition("-")
+        oldest = self.published - len(self._recent) + 1
+        if epoch != self._epoch or not sequence.isdigit() or int(sequence) < oldest - 1:
+            # Events were missed, the client has to reload the current state
+            subscription.put({"type": RESET_EVENT})
+            return
+        for event in list(self._recent)[int(sequence) - oldest + 1 :]:
+            if subscription.matches(event):
+                subscription.put(event)
+
+    def unsubscribe(self, subscription):
+        self.subscribers.discard(subscription)
@@ -7,6 +7,30 @@ def get_csv_file_name_for_given_date():
     return csv_file
 
 
+def get_parquet_partition_dir_for_given_date():
+    today = date.today().strftime("%Y-%m-%d")
+    partition_dir = f"weather_data/parquet/date={today}"
+    return partition_dir
+
+
+def get_history_store_dir():
+    history_store_dir = f"weather_data/history"
+    return history_store_dir
+
+
+def get_sqlite_database_file():
+    sqlite_database_file = f"weather_data/weather.db"
+    return sqlite_database_file
+
+
+def get_raw_weather_data_path(storage_format):
+    if storage_format == "parquet":
+        return get_parquet_partition_dir_for_given_date()
+    if storage_format == "sqlite":
+        return get_sqlite_database_file()
+    return get_csv_file_name_for_given_date()
+
+
 def get_weather_processed_file():
     weather_processed_csv_file = f"Data/weather_data.csv"
     return weather_processed_csv_file
@@ -20,3 +44,64 @@ def get_highest_temperature_cities_file():
 def get_lowest_humidity_cities_file():
     lowest_humidity_cities_csv_file = f"Data/lowest_humidity_cities.csv"
     return lowest_humidity_cities_csv_file
+
+
+def get_geocode_cache_file():
+    geocode_cache_file = f"cache/geocode_cache.json"
+    return geocode_cache_file
+
+
+def get_response_cache_dir():
+    response_cache_dir = f"cache/responses"
+    return response_cache_dir
+
+
+def get_processing_state_file():
+    processing_state_file = f"cache/processing_state.json"
+    return processing_state_file
+
+
+def get_graph_manifest_file():
+    graph_manifest_file = f"cache/graph_manifest.json"
+    return graph_manifest_file
+
+
+def get_scheduler_metrics_file():
+    scheduler_metrics_file = f"cache/scheduler_metrics.json"
+    return scheduler_metrics_file
+
+
+def get_metrics_dir():
+    metrics_dir = f"cache/metrics"
+    return metrics_dir
+
+
+def get_profile_file(name):
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    profile_file = f"cache/profiles/{name}-{timestamp}"
+    return profile_file
+
+
+def get_daily_rollup_file():
+    daily_rollup_csv_file = f"Data/daily_rollups.csv"
+    return daily_rollup_csv_file
+
+
+def get_weekly_rollup_file():
+    weekly_rollup_csv_file = f"Data/weekly_rollups.csv"
+    return weekly_rollup_csv_file
+
+
+def get_rollup_state_file():
+    rollup_state_file = f"cache/rollup_state.json"
+    return rollup_state_file
+
+
+def get_event_log_file():
+    event_log_file = f"cache/events.jsonl"
+    return event_log_file
+
+
+def get_publication_dir():
+    publication_dir = f"published"
+    return publication_dir
@@ -0,0 +1,162 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_geocode_cache_file
+
+
+def normalize_city_name(city_name):
+    """
+    Normalize a city name so that "new  york" and "New York" share a cache entry.
+
+    Args:
+        city_name (str): City name as provided by the user.
+
+    Returns:
+        str: Case folded name with collapsed whitespace.
+    """
+    return " ".join(city_name.split()).casefold()
+
+
+class GeocodeCache:
+    """
+    On-disk cache of city coordinates keyed by normalized city name.
+
+    Entries are held in memory in an OrderedDict, so lookups are O(1) and the
+    least recently used entries are evicted first. The file is replaced
+    atomically on save, so concurrent readers never see a half-written cache.
+    Cities from constants.CITIES are seeded on load and never expire.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None, seed=None):
+        self.path = Path(path or get_geocode_cache_file())
+        self.ttl = constants.GEOCODE_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or constants.GEOCODE_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+        self._seed(constants.CITIES if seed is None else seed)
+
+    def _read_file(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _load(self):
+        for key, entry in self._read_file().items():
+            self._entries[key] = entry
+
+    def _seed(self, cities):
+        for city in cities:
+            key = normalize_city_name(city["City"])
+            if key not in self._entries:
+                self._entries[key] = {
+                    "City": city["City"],
+                    "Latitude": city["Latitude"],
+                    "Longitude": city["Longitude"],
+                    "fetched_at": None,
+                }
+
+    def _is_expired(self, entry):
+        return (
+            self.ttl is not None
+            and entry["fetched_at"] is not None
+            and time.time() - entry["fetched_at"] > self.ttl
+        )
+
+    def get(self, city_name):
+        """
+        Look up the coordinates of a city.
+
+        Args:
+            city_name (str): City name as provided by the user.
+
+        Returns:
+            dict | None: City dict with City, Latitude and Longitude keys
+                (City is the requested name), or None on a miss.
+        """
+        key = normalize_city_name(city_name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry):
+                del self._entries[key]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(key)
+        return {
+            "City": city_name,
+            "Latitude": entry["Latitude"],
+            "Longitude": entry["Longitude"],
+        }
+
+    def put(self, city_info):
+        """
+        Store the coordinates of a city, evicting the least recently used entries
+        once the cache is full.
+
+        Args:
+            city_info (dict): City dict with City, Latitude and Longitude keys.
+        """
+        key = normalize_city_name(city_info["City"])
+        with self._lock:
+            self._entries[key] = {
+                "City": city_info["City"],
+                "Latitude": city_info["Latitude"],
+                "Longitude": city_info["Longitude"],
+                "fetched_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def save(self):
+        """
+        Write the cache to disk if it changed. Entries written by other
+        processes since load are kept unless this process has a newer value.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            merged = self._read_file()
+            for key in set(merged) - set(self._entries):
+                if self._is_expired(merged[key]):
+                    del merged[key]
+            for key, entry in self._entries.items():
+                theirs = merged.get(key)
+                # Seeded entries have no fetch time, so a fetched value always wins
+                if theirs is None or (entry["fetched_at"] or 0) >= (
+                    theirs.get("fetched_at") or 0
+                ):
+                    merged[key] = entry
+            while len(merged) > self.max_entries:
+                merged.pop(next(iter(merged)))
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(merged, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._dirty = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, city_name):
+        return self.get(city_name) is not None
@@ -0,0 +1,491 @@
+import fcntl
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_history_store_dir
+from utils.logger import setup_logger
+from utils.weather_series import (
+    HOURLY_COLUMNS,
+    HOURLY_DTYPES,
+    CityMetadata,
+    WeatherSeries,
+)
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+SECONDS_PER_DAY = 86400
+
+# Every metric is stored as float32 so missing hours can be kept as NaN
+VALUE_DTYPE = np.dtype("<f4")
+TIME_DTYPE = np.dtype("<i8")
+
+# Accepted metric names, raw file column names and Open Meteo variable names
+METRICS = {column: variable for variable, column in HOURLY_COLUMNS.items()}
+METRICS.update({variable: variable for variable in HOURLY_DTYPES})
+
+# Writers of one process never touch a partition at the same time
+_write_lock = threading.Lock()
+
+# The CLI and the scheduler may write from separate processes, they take an
+# flock on this file in the store folder
+LOCK_FILE = ".lock"
+
+
+@contextmanager
+def _locked(root):
+    """
+    Hold the write lock of a store, against the threads of this process and
+    against other processes.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    with _write_lock, open(root / LOCK_FILE, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _day_name(day):
+    return f"day={np.datetime_as_string(np.datetime64(day, 'D'))}"
+
+
+def _column_file(partition_dir, variable):
+    return partition_dir / f"{variable}.f32"
+
+
+def _time_file(partition_dir):
+    return partition_dir / "time.i64"
+
+
+def _index_file(partition_dir):
+    return partition_dir / "index.json"
+
+
+def _empty_index():
+    return {"rows": 0, "cities": {}}
+
+
+def _read_index(partition_dir):
+    try:
+        with open(_index_file(partition_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return _empty_index()
+
+
+def _write_index(partition_dir, index):
+    fd, tmp_path = tempfile.mkstemp(dir=partition_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp_path, _index_file(partition_dir))
+
+
+def to_epoch_seconds(value):
+    """
+    Convert an ISO formatted time ("2024-12-02T00:00", UTC) or epoch seconds to
+    epoch seconds. None is returned unchanged.
+    """
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    return int(np.datetime64(value, "s").astype(np.int64))
+
+
+def _append_to_partition(partition_dir, slices):
+    """
+    Append (series, start, end) slices to a partition, column files first and
+    the index last.
+    """
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    index = _read_index(partition_dir)
+    rows = index["rows"]
+
+    columns = {"time": [series.time[s:e] for series, s, e in slices]}
+    for variable in HOURLY_DTYPES:
+        columns[variable] = [series.values[variable][s:e] for series, s, e in slices]
+
+    for variable, arrays in columns.items():
+        if variable == "time":
+            path, dtype = _time_file(partition_dir), TIME_DTYPE
+        else:
+            path, dtype = _column_file(partition_dir, variable), VALUE_DTYPE
+        with open(path, "ab") as f:
+            # Drop rows of an interrupted write that never made it into the index
+            f.truncate(rows * dtype.itemsize)
+            f.write(np.concatenate(arrays).astype(dtype).tobytes())
+
+    offset = rows
+    for series, start, end in slices:
+        index["cities"].setdefault(series.city.name, []).append(
+            [
+                offset,
+                int(end - start),
+                int(series.time[start]),
+                int(series.time[end - 1]),
+            ]
+        )
+        offset += int(end - start)
+    index["rows"] = offset
+    _write_index(partition_dir, index)
+
+
+class HistoryWriter:
+    """
+    Appends decoded hourly series to the historical store.
+
+    The store has one partition folder per UTC day holding one flat binary file
+    per column (time.i64 and one .f32 file per metric) plus a sidecar index.json
+    with the row offset, row count and min/max time of every appended segment of
+    every city. Series are buffered and each partition is written once per flush,
+    column files first and the index last, so rows past the indexed row count
+    are an interrupted write and are dropped by the next flush.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or get_history_store_dir())
+        self._series = []
+
+    def append(self, weather_data, city_name):
+        """
+        Buffer the hourly series of one city.
+
+        Args:
+            weather_data (WeatherSeries | dict): The decoded series, or the weather
+                data retrieved from the Meteo API.
+            city_name (str): Name of city.
+        """
+        self._series.append(WeatherSeries.coerce(weather_data, city_name))
+
+    def flush(self):
+        """
+        Write the buffered series into their day partitions.
+        """
+        if not self._series:
+            return
+
+        # Split every series at day boundaries, series times are sorted
+        by_day = {}
+        for series in self._series:
+            days = series.time // SECONDS_PER_DAY
+            bounds = np.flatnonzero(np.diff(days)) + 1
+            for start, end in zip(
+                np.concatenate(([0], bounds)), np.concatenate((bounds, [len(days)]))
+            ):
+                by_day.setdefault(int(days[start]), []).append((series, start, end))
+
+        with _locked(self.root):
+            for day, slices in sorted(by_day.items()):
+                _append_to_partition(self.root / _day_name(day), slices)
+        logger.info(
+            f"Appended {len(self._series)} series to {len(by_day)} history partitions"
+        )
+        self._series = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Partition:
+    """
+    Index and memory mapped columns of one day partition, valid for one index version.
+    """
+
+    __slots__ = ("version", "index", "columns")
+
+    def __init__(self, version, index):
+        self.version = version
+        self.index = index
+        self.columns = {}
+
+
+class HistoryStore:
+    """
+    Reads time range queries from the historical store written by HistoryWriter.
+
+    Only the partitions of the requested days are opened, their indexes are
+    cached until index.json changes and the column files are memory mapped, so
+    a query touches just the pages of the rows of the requested city.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or get_history_store_dir())
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    def days(self):
+        """
+        Return the days held in the store as ISO dates, oldest first.
+        """
+        if not self.root.exists():
+            return []
+        return sorted(
+            path.name.removeprefix("day=")
+            for path in self.root.glob("day=*")
+            if _index_file(path).exists()
+        )
+
+    def _partition(self, partition_dir):
+        try:
+            stat = os.stat(_index_file(partition_dir))
+        except FileNotFoundError:
+            return None
+        # A compacted partition is a new file, the inode tells it apart
+        version = (stat.st_mtime_ns, stat.st_ino)
+        partition = self._partitions.get(partition_dir.name)
+        if partition is None or partition.version != version:
+            with self._lock:
+                partition = _Partition(version, _read_index(partition_dir))
+                self._partitions[partition_dir.name] = partition
+        return partition
+
+    def _column(self, partition_dir, partition, variable):
+        column = partition.columns.get(variable)
+        if column is None:
+            if variable == "time":
+                path, dtype = _time_file(partition_dir), TIME_DTYPE
+            else:
+                path, dtype = _column_file(partition_dir, variable), VALUE_DTYPE
+            # Map only the indexed rows, later appends are picked up with the next index
+            column = np.memmap(
+                path, dtype=dtype, mode="r", shape=(partition.index["rows"],)
+            )
+            partition.columns[variable] = column
+        return column
+
+    def query(self, city, metric, start=None, end=None):
+        """
+        Return the hourly values of one metric for one city between two times.
+        When the same hour was stored by several fetches the latest value wins.
+
+        Args:
+            city (str): Name of city.
+            metric (str): Raw column name ("Temperature (°C)") or Open Meteo variable.
+            start (str | int, optional): First hour, ISO formatted UTC time or epoch seconds.
+            end (str | int, optional): Last hour, ISO formatted UTC time or epoch seconds.
+
+        Returns:
+            tuple: (times, values) NumPy arrays, times as int64 epoch seconds.
+
+        Raises:
+            KeyError: If the metric is not stored.
+        """
+        variable = METRICS[metric]
+        start = to_epoch_seconds(start)
+        end = to_epoch_seconds(end)
+        first_day = None if start is None else _day_name(start // SECONDS_PER_DAY)
+        last_day = None if end is None else _day_name(end // SECONDS_PER_DAY)
+
+        times, values = [], []
+        for day in self.days():
+            name = f"day={day}"
+            if (first_day and name < first_day) or (last_day and name > last_day):
+                continue
+            partition_dir = self.root / name
+            partition = self._partition(partition_dir)
+            segments = partition.index["cities"].get(city) if partition else None
+            if not segments:
+                continue
+
+            time_column = self._column(partition_dir, partition, "time")
+            value_column = self._column(partition_dir, partition, variable)
+            for offset, count, min_time, max_time in segments:
+                if (start is not None and max_time < start) or (
+                    end is not None and min_time > end
+                ):
+                    continue
+                segment_times = time_column[offset : offset + count]
+                lo = 0 if start is None else np.searchsorted(segment_times, start)
+                hi = (
+                    count
+                    if end is None
+                    else np.searchsorted(segment_times, end, side="right")
+                )
+                times.append(np.asarray(segment_times[lo:hi]))
+                values.append(np.asarray(value_column[offset + lo : offset + hi]))
+
+        if not times:
+            return np.empty(0, dtype=TIME_DTYPE), np.empty(0, dtype=VALUE_DTYPE)
+        return _latest_per_hour(np.concatenate(times), np.concatenate(values))
+
+    def day_version(self, day):
+        """
+        Return the number of rows stored for a day, which changes with every
+        append to or compaction of its partition.
+
+        Args:
+            day (str): ISO date of the partition.
+
+        Returns:
+            int | None: Row count, None if the day is not stored.
+        """
+        partition = self._partition(self.root / f"day={day}")
+        return partition.index["rows"] if partition else None
+
+    def read_day(self, day, metrics):
+        """
+        Return the hours of every city stored for one day, keeping the latest
+        value when the same hour was stored by several fetches.
+
+        Args:
+            day (str): ISO date of the partition.
+            metrics (list): Raw column names or Open Meteo variables to read.
+
+        Returns:
+            pd.DataFrame: City (categorical), Time (int64 epoch seconds) and one
+                float32 column per metric, named as requested.
+        """
+        import pandas as pd
+
+        partition_dir = self.root / f"day={day}"
+        partition = self._partition(partition_dir)
+        if partition is None or not partition.index["rows"]:
+            return pd.DataFrame(columns=["City", "Time"] + list(metrics))
+
+        cities = list(partition.index["cities"])
+        codes, counts, offsets = [], [], []
+        for code, city in enumerate(cities):
+            for offset, count, _, _ in partition.index["cities"][city]:
+                codes.append(code)
+                counts.append(count)
+                offsets.append(offset)
+        # Segments in append order, so the last duplicate of an hour is the latest
+        order = np.argsort(offsets, kind="stable")
+        rows = np.concatenate(
+            [np.arange(offsets[i], offsets[i] + counts[i]) for i in order]
+        )
+        columns = {
+            "City": pd.Categorical.from_codes(
+                np.repeat(np.asarray(codes)[order], np.asarray(counts)[order]), cities
+            ),
+            "Time": np.asarray(self._column(partition_dir, partition, "time"))[rows],
+        }
+        for metric in metrics:
+            column = self._column(partition_dir, partition, METRICS[metric])
+            columns[metric] = np.asarray(column)[rows]
+        df = pd.DataFrame(columns)
+        return df.drop_duplicates(["City", "Time"], keep="last").reset_index(drop=True)
+
+    def compact(self, day):
+        """
+        Rewrite a day partition with a single segment per city, keeping only the
+        latest value of every hour. Meant for past days that are no longer fetched.
+
+        Args:
+            day (str): ISO date of the partition.
+        """
+        partition_dir = self.root / f"day={day}"
+        first = to_epoch_seconds(day)
+        last = first + SECONDS_PER_DAY - 1
+
+        with _locked(self.root):
+            slices = []
+            for city in _read_index(partition_dir)["cities"]:
+                values = {}
+                for variable in HOURLY_DTYPES:
+                    times, values[variable] = self.query(city, variable, first, last)
+                series = WeatherSeries(
+                    CityMetadata(city, None, None, None), times, values
+                )
+                slices.append((series, 0, len(series)))
+
+            tmp_dir = Path(tempfile.mkdtemp(dir=self.root, prefix=".compact-"))
+            _append_to_partition(tmp_dir, slices)
+            old_dir = partition_dir.with_name(f".old-{partition_dir.name}")
+            os.replace(partition_dir, old_dir)
+            os.replace(tmp_dir, partition_dir)
+            shutil.rmtree(old_dir)
+        logger.info(f"Compacted history partition {partition_dir.name}")
+
+
+def compact_settled_days(root=None, today=None):
+    """
+    Compact the day partitions fetches no longer write to. Every fetch stores
+    the `past_days` before today again, so older days are settled, and those
+    still holding several segments of a city are rewritten with one.
+
+    Args:
+        root (str, optional): Store folder. Defaults to weather_data/history.
+        today (date, optional): Current UTC date. Defaults to today.
+
+    Returns:
+        list: ISO dates of the compacted days.
+    """
+    store = HistoryStore(root)
+    today = today or datetime.now(timezone.utc).date()
+    past_days = constants.WEATHER_API_PARAMS.get("past_days", 0)
+    settled_before = (today - timedelta(days=past_days)).isoformat()
+
+    compacted = []
+    for day in store.days():
+        if day >= settled_before:
+            break
+        cities = _read_index(store.root / f"day={day}")["cities"]
+        if any(len(segments) > 1 for segments in cities.values()):
+            store.compact(day)
+            compacted.append(day)
+    return compacted
+
+
+def _latest_per_hour(times, values):
+    # A stable sort keeps equal hours in append order, the last one is the latest
+    order = np.argsort(times, kind="stable")
+    times = times[order]
+    values = values[order]
+    keep = np.append(times[1:] != times[:-1], True)
+    return times[keep], values[keep]
+
+
+def backfill_from_csv(csv_files, root=None):
+    """
+    Load daily raw CSV files into the historical store, oldest file first.
+    Times are read as UTC, the timezone requested from the API.
+
+    Args:
+        csv_files (list): Paths of weather_data/weather_<date>.csv files.
+        root (str, optional): Store folder. Defaults to weather_data/history.
+    """
+    import pandas as pd
+
+    with HistoryWriter(root) as writer:
+        for csv_file in sorted(csv_files):
+            df = pd.read_csv(csv_file)
+            df["Time"] = (
+                pd.to_datetime(df["Time"]).to_numpy("datetime64[s]").astype(np.int64)
+            )
+            for city_name, rows in df.groupby("City", sort=False):
+                # Every fetch appended a sorted run of hours, a new run starts earlier
+                times = rows["Time"].to_numpy()
+                runs = np.split(
+                    np.arange(len(rows)), np.flatnonzero(np.diff(times) <= 0) + 1
+                )
+                for run in runs:
+                    first = rows.iloc[run[0]]
+                    city = CityMetadata(
+                        city_name,
+                        first["Latitude"],
+                        first["Longitude"],
+                        first["Timezone"],
+                    )
+                    values = {
+                        variable: rows[column].to_numpy(VALUE_DTYPE)[run]
+                        for variable, column in HOURLY_COLUMNS.items()
+                    }
+                    writer.append(WeatherSeries(city, times[run], values), city_name)
+            logger.info(f"Backfilled {csv_file} into the history store")
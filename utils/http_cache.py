@@ -0,0 +1,203 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are only served when the package is installed
+    brotli = None
+
+
+class FileValidators:
+    """
+    Strong ETag and Last-Modified value of one file version.
+    """
+
+    __slots__ = ("etag", "last_modified", "mtime")
+
+    def __init__(self, etag, last_modified, mtime):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.mtime = mtime
+
+
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+def get_file_validators(path):
+    """
+    Return the validators of a file, hashing its content only once per file version.
+    A version is identified by the modification time and size of the file.
+
+    Args:
+        path (Path): File to describe.
+
+    Returns:
+        FileValidators: The ETag and Last-Modified values.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _validators.get(path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    validators = FileValidators(
+        etag=f'"{digest.hexdigest()[:32]}"',
+        last_modified=formatdate(stat.st_mtime, usegmt=True),
+        mtime=int(stat.st_mtime),
+    )
+    with _validators_lock:
+        _validators[path] = (version, validators)
+    return validators
+
+
+def is_not_modified(headers, etag, mtime):
+    """
+    Check the conditional request headers against the current file version.
+    If-None-Match takes precedence over If-Modified-Since.
+
+    Args:
+        headers (Mapping): Request headers.
+        etag (str): Current ETag of the representation.
+        mtime (int): Modification time of the file in seconds.
+
+    Returns:
+        bool: True if a 304 Not Modified response can be sent.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _write_compressed(path, target, compress):
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            compress(path, out)
+        # Give the variant the same mtime so it is recognised as current
+        stat = os.stat(path)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _gzip_file(path, out):
+    with open(path, "rb") as src, gzip.GzipFile(
+        fileobj=out, mode="wb", compresslevel=9, mtime=0
+    ) as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def _brotli_file(path, out):
+    with open(path, "rb") as src:
+        out.write(brotli.compress(src.read()))
+
+
+# Content encodings in order of preference as (encoding, file suffix, compressor)
+ENCODINGS = [("gzip", ".gz", _gzip_file)]
+if brotli is not None:
+    ENCODINGS.insert(0, ("br", ".br", _brotli_file))
+
+
+def _is_current(variant, path):
+    # Variants get the mtime of the file they were compressed from
+    try:
+        return os.stat(variant).st_mtime_ns == os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def precompress_file(path):
+    """
+    Write compressed variants (file.csv.gz, and file.csv.br when brotli is
+    installed) next to a file, unless they are already current.
+
+    Args:
+        path (Path): File to compress.
+    """
+    path = Path(path)
+    for _, suffix, compress in ENCODINGS:
+        target = path.with_name(path.name + suffix)
+        if not _is_current(target, path):
+            _write_compressed(path, target, compress)
+
+
+def parse_accept_encoding(accept_encoding):
+    """
+    Parse an Accept-Encoding header into the q value of every content coding.
+
+    Args:
+        accept_encoding (str): Accept-Encoding request header, e.g. "gzip;q=0.8, br".
+
+    Returns:
+        dict: Lower case coding to q value, "*" stands for every coding not listed.
+            Codings with an invalid q value get 0, so they are never used.
+    """
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.lower()] = q
+    return weights
+
+
+def select_precompressed_variant(path, accept_encoding, create=True):
+    """
+    Pick the best precompressed variant of a file the client accepts. The highest
+    q value wins, equal ones go to the order of ENCODINGS.
+
+    Args:
+        path (Path): The original file.
+        accept_encoding (str): Accept-Encoding request header.
+        create (bool): Write missing or stale variants first. False only serves
+            variants that are already current, for files that must never be
+            modified such as those of a published generation.
+
+    Returns:
+        tuple: (path to serve, content encoding or None)
+    """
+    weights = parse_accept_encoding(accept_encoding)
+    candidates = [
+        (weights.get(encoding, weights.get("*", 0.0)), encoding, suffix)
+        for encoding, suffix, _ in ENCODINGS
+    ]
+    for q, encoding, suffix in sorted(candidates, key=lambda c: -c[0]):
+        if not q > 0:
+            break
+        variant = path.with_name(path.name + suffix)
+        if create:
+            precompress_file(path)
+            return variant, encoding
+        if _is_current(variant, path):
+            return variant, encoding
+    return path, None
@@ -0,0 +1,287 @@
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.generate_file_name import (
+    get_processing_state_file,
+    get_weather_processed_file,
+)
+from utils.logger import setup_logger
+from utils.process_weather_data import (
+    PROCESSED_COLUMNS,
+    RANKINGS,
+    RAW_COLUMNS,
+    add_converted_units,
+    rank_cities_per_hour,
+)
+from utils.sqlite_store import is_database
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+KEY_COLUMNS = ["City", "Time"]
+
+# Raw metrics compared to decide whether an already processed hour changed
+VALUE_COLUMNS = ["Relative Humidity (%)", "Temperature (°C)", "Wind Speed (m/s)"]
+
+# Integer metrics, read as floats only while they have gaps
+INTEGER_COLUMNS = ["Relative Humidity (%)"]
+
+
+def load_processing_state(state_file):
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_processing_state(state, state_file):
+    state_file = Path(state_file)
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=state_file.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_file)
+
+
+def read_new_csv_rows(file_name, offset):
+    """
+    Read the rows appended to a raw CSV file since the given byte offset.
+    A trailing line that is still being written is left for the next run.
+
+    Args:
+        file_name (str): Path of the raw weather CSV.
+        offset (int): Byte offset up to which the file was already processed.
+
+    Returns:
+        tuple: (new rows as a DataFrame, new byte offset)
+    """
+    with open(file_name, "rb") as f:
+        header = f.readline()
+        if offset > os.fstat(f.fileno()).st_size:
+            # The file was replaced by a shorter one, start over
+            offset = 0
+        offset = max(offset, f.tell())
+        f.seek(offset)
+        data = f.read()
+
+    end = data.rfind(b"\n") + 1
+    if not end:
+        return pd.DataFrame(columns=RAW_COLUMNS), offset
+    df = pd.read_csv(io.BytesIO(header + data[:end]), usecols=RAW_COLUMNS)
+    return df, offset + end
+
+
+def read_new_parquet_parts(partition_dir, processed_parts):
+    """
+    Read the part files added to a Parquet date partition since the last run.
+
+    Args:
+        partition_dir (str): Partition folder.
+        processed_parts (list): Names of the part files already processed.
+
+    Returns:
+        tuple: (new rows as a DataFrame, names of all processed part files)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    seen = set(processed_parts)
+    new_parts = sorted(
+        path
+        for path in Path(partition_dir).glob("*.parquet")
+        if not path.name.startswith(".") and path.name not in seen
+    )
+    if not new_parts:
+        return pd.DataFrame(columns=RAW_COLUMNS), processed_parts
+
+    tables = [pq.read_table(path, columns=RAW_COLUMNS) for path in new_parts]
+    df = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+    # Plain strings compare and merge cleanly against the processed CSV
+    df[KEY_COLUMNS] = df[KEY_COLUMNS].astype(str)
+    return df, processed_parts + [path.name for path in new_parts]
+
+
+def restore_integer_columns(df):
+    """
+    Cast integer metrics that no longer have gaps back to integers. Database
+    upserts can fill the gap of an earlier row, and a full run then reads the
+    column as integers.
+    """
+    for column in INTEGER_COLUMNS:
+        if column in df.columns and df[column].dtype.kind == "f":
+            if df[column].notna().all():
+                df[column] = df[column].astype(np.int64)
+    return df
+
+
+def read_new_database_rows(database, batch):
+    """
+    Read the rows written to a SQLite database by batches after the given one.
+
+    Args:
+        database (str): Database file.
+        batch (int): Last batch already processed, None reads today's rows.
+
+    Returns:
+        tuple: (new rows as a DataFrame, id of the last batch)
+    """
+    from utils.sqlite_store import read_new_weather_data
+
+    return read_new_weather_data(database, columns=RAW_COLUMNS, after_batch=batch)
+
+
+def drop_unchanged_rows(rows, processed):
+    """
+    Drop rows whose hour was already processed with the same values.
+
+    Args:
+        rows (pd.DataFrame): Rows at or before their city's watermark.
+        processed (pd.DataFrame): The current processed weather data.
+
+    Returns:
+        pd.DataFrame: Rows that are new or carry updated values.
+    """
+    merged = rows.merge(
+        processed[KEY_COLUMNS + VALUE_COLUMNS],
+        on=KEY_COLUMNS,
+        how="left",
+        suffixes=("", "_old"),
+        indicator=True,
+    )
+    # A missing value that is still missing is unchanged, an hour that was
+    # never processed is new whatever its values
+    unchanged = (merged["_merge"] == "both").to_numpy(copy=True)
+    for column in VALUE_COLUMNS:
+        unchanged &= np.isclose(
+            merged[column].to_numpy(dtype=float),
+            merged[f"{column}_old"].to_numpy(dtype=float),
+            atol=1e-4,
+            equal_nan=True,
+        )
+    return rows[~unchanged]
+
+
+def process_weather_data_incremental(file_name, top_k=1, state_file=None):
+    """
+    Process only the raw rows added since the last run and update the
+    processed and ranking CSV files in place of a full rebuild.
+
+    Each fetch repeats the last `past_days` of data, so new rows are split using
+    a per city watermark (the latest hour processed for the city). Rows after the
+    watermark are new, rows at or before it are kept only if their values changed.
+    Rankings are recomputed only for the hours that were added or changed.
+    Switching to another raw file (a new day) starts from scratch, so the outputs
+    always match a full run of process_weather_data on the same file with every
+    repeated city and hour reduced to its latest values.
+
+    Args:
+        file_name (str): Path of the raw weather CSV, Parquet date partition or
+            SQLite database.
+        top_k (int): Number of cities kept per hour in the ranking files.
+        state_file (str, optional): Where the watermarks are kept.
+            Defaults to cache/processing_state.json.
+    """
+    state_file = state_file or get_processing_state_file()
+    output_files = [get_weather_processed_file()] + [
+        get_output_file() for get_output_file, _, _ in RANKINGS
+    ]
+
+    # A database holds every day, a new day starts over like a new daily file does
+    day = date.today().isoformat() if is_database(file_name) else None
+
+    state = load_processing_state(state_file)
+    if (
+        state.get("source") != file_name
+        or state.get("top_k") != top_k
+        or state.get("day") != day
+        or not all(os.path.exists(path) for path in output_files)
+    ):
+        logger.info(f"No usable processing state for {file_name}, starting over")
+        state = {"source": file_name, "top_k": top_k, "day": day, "watermarks": {}}
+    first_run = not state["watermarks"]
+
+    if is_database(file_name):
+        new_rows, state["batch"] = read_new_database_rows(file_name, state.get("batch"))
+    elif os.path.isdir(file_name):
+        new_rows, state["parts"] = read_new_parquet_parts(
+            file_name, state.get("parts", [])
+        )
+    else:
+        new_rows, state["offset"] = read_new_csv_rows(file_name, state.get("offset", 0))
+
+    if new_rows.empty and not first_run:
+        logger.info(f"No new rows in {file_name}, processed data is up to date")
+        save_processing_state(state, state_file)
+        return
+
+    # A city fetched twice in one batch of rows keeps its latest values
+    new_rows = new_rows.drop_duplicates(KEY_COLUMNS, keep="last")
+
+    if first_run:
+        processed = pd.DataFrame(columns=PROCESSED_COLUMNS)
+        changed = new_rows
+    else:
+        processed = pd.read_csv(
+            get_weather_processed_file(), float_precision="round_trip"
+        )
+        watermark = new_rows["City"].map(state["watermarks"])
+        after_watermark = watermark.isna() | (new_rows["Time"] > watermark)
+        changed = pd.concat(
+            [
+                new_rows[after_watermark],
+                drop_unchanged_rows(new_rows[~after_watermark], processed),
+            ]
+        )
+
+    logger.info(
+        f"Incremental processing: {len(new_rows)} new rows, {len(changed)} added or changed"
+    )
+    if changed.empty and not first_run:
+        save_processing_state(state, state_file)
+        return
+
+    changed = add_converted_units(changed.copy())[PROCESSED_COLUMNS]
+    changed_keys = pd.MultiIndex.from_frame(changed[KEY_COLUMNS])
+    kept = processed[
+        ~pd.MultiIndex.from_frame(processed[KEY_COLUMNS]).isin(changed_keys)
+    ]
+    processed = pd.concat([kept, changed], ignore_index=True)
+
+    # Same order as a full run, cities in order of appearance and hours ascending
+    processed["_city_order"] = pd.factorize(processed["City"])[0]
+    processed = processed.sort_values(["_city_order", "Time"], kind="stable").drop(
+        columns="_city_order"
+    )
+    if is_database(file_name):
+        processed = restore_integer_columns(processed)
+    processed.to_csv(get_weather_processed_file(), index=False)
+
+    affected_hours = changed["Time"].unique()
+    affected_df = processed[processed["Time"].isin(affected_hours)]
+    for get_output_file, metric, ascending in RANKINGS:
+        ranked_df = rank_cities_per_hour(
+            affected_df, metric, ascending=ascending, top_k=top_k
+        )
+        if not first_run:
+            previous_df = pd.read_csv(get_output_file(), float_precision="round_trip")
+            previous_df = previous_df[~previous_df["Hour"].isin(affected_hours)]
+            ranked_df = pd.concat([previous_df, ranked_df], ignore_index=True)
+        ranked_df = ranked_df.sort_values("Hour", kind="stable")
+        if is_database(file_name):
+            ranked_df = restore_integer_columns(ranked_df)
+        ranked_df.to_csv(get_output_file(), index=False)
+
+    latest_hours = changed.groupby("City", sort=False)["Time"].max()
+    for city, hour in latest_hours.items():
+        if hour > state["watermarks"].get(city, ""):
+            state["watermarks"][city] = hour
+    save_processing_state(state, state_file)
@@ -1,4 +1,16 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
 
 
 class ConsoleFilter(logging.Filter):
@@ -11,10 +23,225 @@ class ConsoleFilter(logging.Filter):
         # Example condition: Only log WARNING and ERROR to console
         return record.levelno >= logging.WARNING
 
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats every record as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that resolves the message and traceback on the logging thread
+    but leaves the formatting to the listener, so JSON output stays structured.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_formatter():
+    if constants.LOG_FORMAT == "json":
+        return JsonLinesFormatter()
+    return logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+
+class _OwnerRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that only rotates in the process that opened the file,
+    a forked worker inheriting it appends without renaming the file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._owner_pid = os.getpid()
+
+    def shouldRollover(self, record):
+        return os.getpid() == self._owner_pid and super().shouldRollover(record)
+
+
+class _OwnerTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    TimedRotatingFileHandler that only rotates in the process that opened the file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._owner_pid = os.getpid()
+
+    def shouldRollover(self, record):
+        return os.getpid() == self._owner_pid and super().shouldRollover(record)
+
+
+def _in_child_process():
+    multiprocessing = sys.modules.get("multiprocessing")
+    return multiprocessing is not None and multiprocessing.parent_process() is not None
+
+
+def _process_role():
+    # "scheduler" for scheduler.py, "uvicorn" for uvicorn, "pytest" for python -m pytest
+    main = Path(sys.argv[0]) if sys.argv and sys.argv[0] else Path("python")
+    role = main.parent.name if main.stem == "__main__" else main.stem
+    return role if role and role != "-c" else "python"
+
+
+def process_log_file(log_file):
+    """
+    Return the file the current program logs to.
+
+    Rotation renames the file, so two programs rotating the same file lose or
+    overwrite each other's records. With constants.LOG_FILE_PER_PROCESS the
+    name gets the program as a suffix, logs/weather_scrapper.log becomes
+    logs/weather_scrapper.scheduler.log for scheduler.py. Spawned worker
+    processes get the program of their parent, as sys.argv is passed on.
+
+    Args:
+        log_file (str): The path to the shared log file.
+
+    Returns:
+        str: The path to the log file of this program.
+    """
+    if not constants.LOG_FILE_PER_PROCESS:
+        return log_file
+    path = Path(log_file)
+    return str(path.with_name(f"{path.stem}.{_process_role()}{path.suffix}"))
+
+
+def _build_file_handler(log_file):
+    log_file = process_log_file(log_file)
+    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+    if _in_child_process() and (constants.LOG_ROTATE_WHEN or constants.LOG_MAX_BYTES):
+        # Workers append to the file of their program, which the parent rotates
+        return logging.handlers.WatchedFileHandler(log_file, encoding="utf-8")
+    if constants.LOG_ROTATE_WHEN:
+        return _OwnerTimedRotatingFileHandler(
+            log_file,
+            when=constants.LOG_ROTATE_WHEN,
+            backupCount=constants.LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+    if constants.LOG_MAX_BYTES:
+        return _OwnerRotatingFileHandler(
+            log_file,
+            maxBytes=constants.LOG_MAX_BYTES,
+            backupCount=constants.LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+    return logging.FileHandler(log_file, encoding="utf-8")
+
+
+def _build_handlers(log_file, console_output):
+    formatter = _build_formatter()
+    file_handler = _build_file_handler(log_file)
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+
+    # Optionally add a console handler with selective logging
+    if console_output:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        )
+        # Add the custom filter for selective logging
+        console_handler.addFilter(ConsoleFilter())
+        handlers.append(console_handler)
+    return handlers
+
+
+# One queue and background writer per (log file, console output) in queue mode
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def _get_log_queue(log_file, console_output):
+    key = (os.path.abspath(process_log_file(log_file)), console_output)
+    with _listeners_lock:
+        if key not in _listeners:
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(
+                log_queue,
+                *_build_handlers(log_file, console_output),
+                respect_handler_level=True,
+            )
+            listener.start()
+            _listeners[key] = (log_queue, listener)
+            _stop_at_process_exit()
+        return _listeners[key][0]
+
+
+def stop_log_listeners():
+    """
+    Write out every queued record and stop the background writer threads.
+    Registered to run at exit.
+    """
+    with _listeners_lock:
+        for _, listener in _listeners.values():
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+        _listeners.clear()
+
+
+def _stop_at_process_exit():
+    # multiprocessing children leave through os._exit, which skips atexit
+    if _in_child_process():
+        from multiprocessing.util import Finalize
+
+        Finalize(None, stop_log_listeners, exitpriority=0)
+
+
+def _restart_listeners_in_child():
+    # A forked child has the queues but not the writer threads, start new ones
+    global _listeners_lock
+    _listeners_lock = threading.Lock()
+    if _listeners:
+        _stop_at_process_exit()
+    for key, (log_queue, listener) in list(_listeners.items()):
+        # Records still queued in the parent are written by the parent
+        while True:
+            try:
+                log_queue.get_nowait()
+            except queue.Empty:
+                break
+        restarted = logging.handlers.QueueListener(
+            log_queue, *listener.handlers, respect_handler_level=True
+        )
+        restarted.start()
+        _listeners[key] = (log_queue, restarted)
+
+
+atexit.register(stop_log_listeners)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners_in_child)
+
+
 def setup_logger(name, log_file, level=logging.INFO, console_output=True):
     """
     Set up a logger with the given name, log file, and log level.
 
+    With constants.LOG_MODE = "queue" the logger only puts records on a queue and
+    a background thread formats and writes them, so logging never waits on disk.
+
     Args:
         name (str): The name of the logger.
         log_file (str): The path to the log file.
@@ -23,26 +250,32 @@ def setup_logger(name, log_file, level=logging.INFO, console_output=True):
     Returns:
         logging.Logger: The configured logger.
     """
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setFormatter(formatter)
-
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
     if not logger.hasHandlers():
-        logger.addHandler(file_handler)
-
-        # Optionally add a console handler with selective logging
-        if console_output:
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            
-            # Add the custom filter for selective logging
-            console_handler.addFilter(ConsoleFilter())
-            
-            logger.addHandler(console_handler)
+        if constants.LOG_MODE == "queue":
+            logger.addHandler(
+                _PreparedQueueHandler(_get_log_queue(log_file, console_output))
+            )
+        else:
+            for handler in _build_handlers(log_file, console_output):
+                logger.addHandler(handler)
 
     return logger
+
+
+def log_payload(logger, label, payload):
+    """
+    Log a decoded API payload at DEBUG level, for a sample of the calls only.
+    Nothing is serialised unless DEBUG is enabled and the call is sampled.
+
+    Args:
+        logger (logging.Logger): Logger to write to.
+        label (str): What the payload belongs to, e.g. a city name.
+        payload (dict | list): The decoded payload.
+    """
+    if logger.isEnabledFor(logging.DEBUG) and (
+        random.random() < constants.LOG_PAYLOAD_SAMPLE_RATE
+    ):
+        logger.debug("Payload for %s: %s", label, json.dumps(payload))
@@ -0,0 +1,327 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.generate_file_name import get_metrics_dir
+
+# Upper bounds in seconds of the histogram buckets, from a single request up to a full run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    """
+    Monotonically increasing value, one per combination of label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, registry=None):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return [[dict(key), value] for key, value in self._values.items()]
+
+    def restore(self, state):
+        with self._lock:
+            for labels, value in state:
+                self._values[_label_key(labels)] = value
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down, such as the size of a cache.
+    """
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    """
+    Distribution of observed values, usually durations in seconds, counted in
+    cumulative buckets along with their sum and count.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            # Values above the last bucket only show up in the +Inf bucket
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the with block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """
+        Decorator observing the duration of every call of a function.
+        """
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def state(self):
+        with self._lock:
+            return [
+                [dict(key), {"counts": list(counts), "sum": total, "count": count}]
+                for key, (counts, total, count) in self._values.items()
+            ]
+
+    def restore(self, state):
+        with self._lock:
+            for labels, value in state:
+                self._values[_label_key(labels)] = (
+                    list(value["counts"]),
+                    value["sum"],
+                    value["count"],
+                )
+
+
+class Registry:
+    """
+    Holds the metrics of one process and turns them into snapshots, which can be
+    saved by the pipeline processes and exported together by the API.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+
+    def snapshot(self):
+        """
+        Return the current values of every metric as a JSON serialisable dict.
+        """
+        snapshot = {}
+        for name, metric in self._metrics.items():
+            snapshot[name] = {
+                "kind": metric.kind,
+                "help": metric.help,
+                "values": metric.state(),
+            }
+            if metric.kind == "histogram":
+                snapshot[name]["buckets"] = list(metric.buckets)
+        return snapshot
+
+    def restore(self, snapshot):
+        """
+        Continue counting from a saved snapshot, so counters stay monotonic across runs.
+        """
+        for name, data in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is not None and metric.kind == data["kind"]:
+                metric.restore(data["values"])
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                self.restore(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+
+REGISTRY = Registry()
+
+
+def load_snapshots(directory):
+    """
+    Load the snapshots saved by pipeline processes, keyed by their source name.
+
+    Args:
+        directory (str): Folder holding <source>.json snapshot files.
+
+    Returns:
+        dict: Mapping of source name to snapshot.
+    """
+    snapshots = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            with open(path) as f:
+                snapshots[path.stem] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(snapshots):
+    """
+    Render snapshots in the Prometheus text exposition format. Samples of every
+    snapshot get a source label, metrics with the same name share one family.
+
+    Args:
+        snapshots (dict): Mapping of source name to snapshot.
+
+    Returns:
+        str: The exposition text.
+    """
+    families = {}
+    for source, snapshot in snapshots.items():
+        for name, data in snapshot.items():
+            families.setdefault(name, []).append((source, data))
+
+    lines = []
+    for name, members in sorted(families.items()):
+        lines.append(f"# HELP {name} {members[0][1]['help']}")
+        lines.append(f"# TYPE {name} {members[0][1]['kind']}")
+        for source, data in members:
+            for labels, value in data["values"]:
+                labels = {"source": source, **labels}
+                if data["kind"] != "histogram":
+                    lines.append(
+                        f"{name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+                    continue
+
+                cumulative = 0
+                for bound, count in zip(data["buckets"], value["counts"]):
+                    cumulative += count
+                    bucket_labels = _format_labels({**labels, "le": bound})
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                count = value["count"]
+                inf_labels = _format_labels({**labels, "le": "+Inf"})
+                lines.append(f"{name}_bucket{inf_labels} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']!r}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def get_snapshot_file(source):
+    return Path(get_metrics_dir()) / f"{source}.json"
+
+
+def load_process_metrics(source):
+    """
+    Continue the metrics of a pipeline process from its last saved snapshot.
+
+    Args:
+        source (str): Name of the process, e.g. cli or scheduler.
+    """
+    REGISTRY.load(get_snapshot_file(source))
+
+
+def save_process_metrics(source):
+    """
+    Save the metrics of a pipeline process where the API exports them from.
+
+    Args:
+        source (str): Name of the process, e.g. cli or scheduler.
+    """
+    REGISTRY.save(get_snapshot_file(source))
+
+
+# Pipeline metrics
+FETCH_REQUEST_SECONDS = Histogram(
+    "weather_fetch_request_seconds", "Duration of forecast API requests"
+)
+FETCH_REQUESTS = Counter(
+    "weather_fetch_requests_total", "Forecast API responses by HTTP status"
+)
+FETCH_BYTES = Counter(
+    "weather_fetch_bytes_total", "Bytes received in forecast API response bodies"
+)
+FETCH_RETRIES = Counter(
+    "weather_fetch_retries_total", "Forecast API requests that were retried"
+)
+FETCH_CACHE_RESULTS = Counter(
+    "weather_fetch_cache_results_total",
+    "Response cache lookups by result (hits, misses, revalidated)",
+)
+CITY_FETCH_SECONDS = Histogram(
+    "weather_city_fetch_seconds",
+    "Duration of fetching one city, without waiting for the rate limit",
+)
+CITIES_FETCHED = Counter("weather_cities_fetched_total", "Fetched cities by outcome")
+EXTRACT_SECONDS = Histogram(
+    "weather_extract_seconds", "Duration of storing the series of one city"
+)
+STAGE_SECONDS = Histogram("weather_stage_seconds", "Duration of pipeline stages")
+GRAPH_RENDER_SECONDS = Histogram(
+    "weather_graph_render_seconds", "Duration of rendering one graph"
+)
+
+# API metrics
+HTTP_REQUEST_SECONDS = Histogram(
+    "weather_http_request_seconds", "Duration of API requests by route"
+)
+RENDER_CACHE_EVENTS = Counter(
+    "weather_render_cache_events_total",
+    "Rendered image cache hits, misses and coalesced requests",
+)
@@ -1,74 +1,201 @@
 import os
 import sys
+from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import sys
-from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
-from utils.generate_file_name import get_csv_file_name_for_given_date
-from utils.data_plotter import plot_graphs_from_processed_data
+import constants
+from utils.generate_file_name import (
+    get_raw_weather_data_path,
+    get_weather_processed_file,
+    get_highest_temperature_cities_file,
+    get_lowest_humidity_cities_file,
+)
+from utils.event_stream import publish_rankings
 from utils.logger import setup_logger
-import matplotlib.pyplot as plt
-
+from utils.metrics import STAGE_SECONDS
+from utils.sqlite_store import is_database
 
 logger = setup_logger(__name__, "logs/weather_scrapper.log")
 
 
-def process_weather_data(file_name):
-    csv_path = os.path.join(file_name)
-    df = pd.read_csv(csv_path)
+# Raw columns process_weather_data needs, everything else is left on disk
+RAW_COLUMNS = [
+    "City",
+    "Time",
+    "Relative Humidity (%)",
+    "Temperature (°C)",
+    "Wind Speed (m/s)",
+]
+
+
+# Columns saved in Data/weather_data.csv
+PROCESSED_COLUMNS = [
+    "City",
+    "Temperature (°C)",
+    "Temperature (°F)",
+    "Relative Humidity (%)",
+    "Wind Speed (m/s)",
+    "Wind Speed (mph)",
+    "Time",
+]
+
+# Per hour rankings as (output file, metric, ascending)
+RANKINGS = [
+    (get_highest_temperature_cities_file, "Temperature (°F)", False),
+    (get_lowest_humidity_cities_file, "Relative Humidity (%)", True),
+]
+
+
+def load_raw_weather_data(file_name, columns=None):
+    """
+    Load raw weather data from a daily CSV file, a Parquet date partition, today's
+    rows of a SQLite database or already decoded WeatherSeries objects.
+
+    Args:
+        file_name (str | list): Path of the CSV file, of the partition folder or
+            of the database, or a list of WeatherSeries.
+        columns (list, optional): Columns to load. Defaults to all columns.
+
+    Returns:
+        pd.DataFrame: The raw weather data.
+    """
+    if isinstance(file_name, list):
+        from utils.weather_series import series_to_frame
+
+        df = series_to_frame(file_name)
+        return df if columns is None else df[columns]
+    if os.path.isdir(file_name):
+        from utils.columnar_store import read_weather_data
+
+        return read_weather_data(file_name, columns=columns)
+    if is_database(file_name):
+        from utils.sqlite_store import read_weather_data
+
+        return read_weather_data(file_name, columns=columns)
+    return pd.read_csv(file_name, usecols=columns)
+
+
+def rank_cities_per_hour(df, metric, ascending=False, top_k=1, time_column="Time"):
+    """
+    Rank cities by a metric for every hour in a single grouped pass.
+
+    Args:
+        df (pd.DataFrame): Hourly weather data with City, time and metric columns.
+        metric (str): Column to rank by, e.g. "Temperature (°F)".
+        ascending (bool): False ranks the highest values first, True the lowest.
+        top_k (int): Number of cities to keep per hour.
+        time_column (str): Column holding the hour of each row.
+
+    Returns:
+        pd.DataFrame: Hour, City and metric columns, plus a Rank column when
+            top_k is greater than 1. Hours keep their order of first appearance.
+    """
+    if top_k == 1:
+        # idxmax/idxmin return the first row holding the extreme value of each hour.
+        # Missing values rank last like in a sort, so an hour where every city is
+        # missing the metric goes to its first row instead of raising.
+        values = df[metric].fillna(np.inf if ascending else -np.inf)
+        grouped = values.groupby(df[time_column], sort=False, observed=True)
+        index = grouped.idxmin() if ascending else grouped.idxmax()
+        ranked = df.loc[index.to_numpy(), [time_column, "City", metric]]
+    else:
+        hour_order, _ = pd.factorize(df[time_column])
+        ranked = df[[time_column, "City", metric]].assign(_hour_order=hour_order)
+        ranked = (
+            ranked.sort_values(
+                ["_hour_order", metric], ascending=[True, ascending], kind="stable"
+            )
+            .groupby("_hour_order", sort=False, observed=True)
+            .head(top_k)
+        )
+        ranked["Rank"] = ranked.groupby("_hour_order", sort=False).cumcount() + 1
+        ranked = ranked.drop(columns="_hour_order")
+
+    return ranked.rename(columns={time_column: "Hour"}).reset_index(drop=True)
+
+
+def add_converted_units(df):
+    """
+    Add Fahrenheit temperature and mph wind speed columns to the data.
+
+    Args:
+        df (pd.DataFrame): Raw weather data.
 
+    Returns:
+        pd.DataFrame: The same frame with the converted columns added.
+    """
     df["Temperature (°F)"] = (df["Temperature (°C)"] * 9 / 5) + 32
     df["Wind Speed (mph)"] = df["Wind Speed (m/s)"] * 2.23694
+    return df
 
-    # Rank cities by highest temperature for each hour
-    highest_temp_data = []
-    for hour in df["Time"].unique():
-        hour_df = df[df["Time"] == hour].sort_values(
-            "Temperature (°F)", ascending=False
-        )[["City", "Temperature (°F)"]]
-        highest_temp_data.append(
-            {
-                "Hour": hour,
-                "City": hour_df["City"].iloc[0],
-                "Temperature (°F)": hour_df["Temperature (°F)"].iloc[0],
-            }
-        )
-    highest_temp_df = pd.DataFrame(highest_temp_data)
-    highest_temp_df.to_csv("Data/highest_temp_cities.csv", index=False)
-
-    # Rank cities by lowest humidity for each hour
-    lowest_humidity_data = []
-    for hour in df["Time"].unique():
-        hour_df = df[df["Time"] == hour].sort_values(
-            "Relative Humidity (%)", ascending=True
-        )[["City", "Relative Humidity (%)"]]
-        lowest_humidity_data.append(
-            {
-                "Hour": hour,
-                "City": hour_df["City"].iloc[0],
-                "Relative Humidity (%)": hour_df["Relative Humidity (%)"].iloc[0],
-            }
-        )
-    lowest_humidity_df = pd.DataFrame(lowest_humidity_data)
-    lowest_humidity_df.to_csv("Data/lowest_humidity_cities.csv", index=False)
-
-    # Filter and save only the required columns
-    required_columns = [
-        "City",
-        "Temperature (°C)",
-        "Temperature (°F)",
-        "Relative Humidity (%)",
-        "Wind Speed (m/s)",
-        "Wind Speed (mph)",
-        "Time",
-    ]
-    df[required_columns].to_csv("Data/weather_data.csv", index=False)
+
+@STAGE_SECONDS.timed(stage="process")
+def process_weather_data(
+    file_name, top_k=1, incremental=None, workers=None, streaming=None
+):
+    """
+    Convert units, rank cities per hour and save the processed CSV files in Data folder.
+
+    Args:
+        file_name (str | list): Path of the raw weather CSV, Parquet date partition
+            or SQLite database, or a list of WeatherSeries decoded by the fetcher.
+        top_k (int): Number of cities kept per hour in the ranking files.
+        incremental (bool, optional): Only process rows added since the last run.
+            Defaults to constants.INCREMENTAL_PROCESSING. Only applies to files.
+        workers (int, optional): Processes sharing the work by city hash.
+            Defaults to constants.PROCESS_WORKERS, 1 processes in this process.
+            Only applies to full runs over files.
+        streaming (bool, optional): Read the input in chunks, in constant memory.
+            Defaults to constants.STREAMING_PROCESSING. Only applies to full runs
+            over files.
+    """
+    if incremental is None:
+        incremental = constants.INCREMENTAL_PROCESSING
+    if workers is None:
+        workers = constants.PROCESS_WORKERS
+    if streaming is None:
+        streaming = constants.STREAMING_PROCESSING
+    if incremental and not isinstance(file_name, list):
+        from utils.incremental_processing import process_weather_data_incremental
+
+        process_weather_data_incremental(file_name, top_k=top_k)
+    elif streaming and not isinstance(file_name, list):
+        from utils.streaming_processing import process_weather_data_streaming
+
+        process_weather_data_streaming(file_name, top_k=top_k)
+    elif workers != 1 and not isinstance(file_name, list):
+        from utils.sharded_processing import process_weather_data_sharded
+
+        process_weather_data_sharded(file_name, top_k=top_k, workers=workers)
+    else:
+        df = add_converted_units(load_raw_weather_data(file_name, columns=RAW_COLUMNS))
+
+        # Rank cities by highest temperature and by lowest humidity for each hour
+        for get_output_file, metric, ascending in RANKINGS:
+            ranked_df = rank_cities_per_hour(
+                df, metric, ascending=ascending, top_k=top_k
+            )
+            ranked_df.to_csv(get_output_file(), index=False)
+
+        # Filter and save only the required columns
+        df[PROCESSED_COLUMNS].to_csv(get_weather_processed_file(), index=False)
+
+    if constants.STORAGE_FORMAT == "sqlite":
+        from utils.sqlite_store import save_processed_tables
+
+        save_processed_tables()
+
+    # Subscribers of the API get the new rankings without polling /data
+    publish_rankings()
 
 
 def main():
-    process_weather_data(get_csv_file_name_for_given_date())
+    from utils.data_plotter import plot_graphs_from_processed_data
+
+    process_weather_data(get_raw_weather_data_path(constants.STORAGE_FORMAT))
     plot_graphs_from_processed_data()
 
 
@@ -0,0 +1,59 @@
+import cProfile
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import pyinstrument
+except ImportError:  # cProfile is used when pyinstrument is not installed
+    pyinstrument = None
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_profile_file
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+
+@contextmanager
+def profile_run(name, enabled=None):
+    """
+    Profile the with block and dump the result to cache/profiles.
+
+    pyinstrument writes an HTML report when it is installed, otherwise cProfile
+    writes a .prof file for pstats or snakeviz.
+
+    Args:
+        name (str): Name of the run, used in the file name.
+        enabled (bool, optional): Defaults to constants.PROFILE_RUNS.
+    """
+    if not (constants.PROFILE_RUNS if enabled is None else enabled):
+        yield
+        return
+
+    start = time.perf_counter()
+    if pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            output = Path(f"{get_profile_file(name)}.html")
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(profiler.output_html())
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            output = Path(f"{get_profile_file(name)}.prof")
+            output.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(output)
+    logger.info(
+        f"Profile of {name} ({time.perf_counter() - start:.2f}s) saved to {output}"
+    )
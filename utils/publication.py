@@ -0,0 +1,333 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_publication_dir
+from utils.http_cache import ENCODINGS, FileValidators, precompress_file
+from utils.logger import setup_logger
+from utils.metrics import STAGE_SECONDS
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Output folders the pipeline writes in place, published together as one generation
+OUTPUT_DIRS = ["Data", "Graphs"]
+
+# Every generation describes its files in this file, written before it is published
+GENERATION_MANIFEST = "generation.json"
+
+# Symlink to the generation being served, replaced in a single rename
+CURRENT_LINK = "current"
+
+# Compressed variants are made for the published files, leftovers of interrupted
+# writes and variants in the output folders are skipped
+VARIANT_SUFFIXES = tuple(suffix for _, suffix, _ in ENCODINGS)
+SKIPPED_SUFFIXES = (".tmp",) + VARIANT_SUFFIXES
+
+# Manifests kept in memory, more than the kept generations plus a few rollbacks
+MAX_CACHED_GENERATIONS = 32
+
+
+class Generation:
+    """
+    One published, never modified set of output files.
+
+    Every file carries the id of the generation its content was first
+    published in, which serves as its ETag, so a file that did not change
+    keeps its validators across generations and nothing is hashed.
+    """
+
+    __slots__ = ("id", "path", "files", "created")
+
+    def __init__(self, generation_id, path, files, created):
+        self.id = generation_id
+        self.path = Path(path)
+        self.files = files
+        self.created = created
+
+    def file(self, relative_path):
+        """
+        Return the path of a file of this generation, e.g. Data/weather_data.csv.
+        """
+        return self.path / relative_path
+
+    def validators(self, relative_path):
+        """
+        Return the validators of a file of this generation.
+
+        Args:
+            relative_path (str | Path): File path relative to the generation.
+
+        Returns:
+            FileValidators: The ETag and Last-Modified values, None if the
+                generation has no such file.
+        """
+        entry = self.files.get(Path(relative_path).as_posix())
+        if entry is None:
+            return None
+        mtime = entry["mtime_ns"] / 1e9
+        return FileValidators(
+            etag=f'"{entry["version"]}"',
+            last_modified=formatdate(mtime, usegmt=True),
+            mtime=int(mtime),
+        )
+
+
+def new_generation_id():
+    """
+    Return a new generation id, ids sort in the order they were created.
+    """
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    # The suffix tells apart generations published in the same microsecond
+    return f"{timestamp}-{os.urandom(2).hex()}"
+
+
+def list_generations(root=None):
+    """
+    Return the ids of every published generation, oldest first.
+    """
+    root = Path(root or get_publication_dir())
+    if not root.is_dir():
+        return []
+    return sorted(
+        path.name
+        for path in root.iterdir()
+        if path.is_dir()
+        and not path.is_symlink()
+        and not path.name.startswith(".")
+        and (path / GENERATION_MANIFEST).exists()
+    )
+
+
+def current_generation_id(root=None):
+    """
+    Return the id of the generation being served, None before the first publication.
+    """
+    try:
+        return os.readlink(Path(root or get_publication_dir()) / CURRENT_LINK)
+    except FileNotFoundError:
+        return None
+
+
+# Generations never change once published, so their manifests are read once
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def load_generation(generation_id, root=None):
+    """
+    Load a published generation.
+
+    Args:
+        generation_id (str): Id of the generation.
+        root (str, optional): Publication folder. Defaults to published.
+
+    Returns:
+        Generation: The generation.
+
+    Raises:
+        FileNotFoundError: If there is no such generation.
+    """
+    path = Path(root or get_publication_dir()) / generation_id
+    key = str(path.resolve())
+    generation = _generations.get(key)
+    if generation is None:
+        with open(path / GENERATION_MANIFEST) as f:
+            manifest = json.load(f)
+        generation = Generation(
+            generation_id, path, manifest["files"], manifest["created"]
+        )
+        with _generations_lock:
+            if len(_generations) >= MAX_CACHED_GENERATIONS:
+                _generations.clear()
+            _generations[key] = generation
+    return generation
+
+
+def current_generation(root=None):
+    """
+    Return the generation being served. The link is read once, so every file a
+    caller takes from the returned generation belongs to the same snapshot,
+    even if a newer one is published meanwhile.
+
+    Args:
+        root (str, optional): Publication folder. Defaults to published.
+
+    Returns:
+        Generation: The current generation, None before the first publication.
+    """
+    generation_id = current_generation_id(root)
+    if generation_id is None:
+        return None
+    try:
+        return load_generation(generation_id, root)
+    except FileNotFoundError:
+        return None
+
+
+def _output_files(source_dir):
+    for output_dir in OUTPUT_DIRS:
+        folder = Path(source_dir) / output_dir
+        if not folder.is_dir():
+            continue
+        for path in sorted(folder.rglob("*")):
+            if path.is_file() and not path.name.endswith(SKIPPED_SUFFIXES):
+                yield path.relative_to(source_dir).as_posix(), path
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        # Hard links need the same file system, copies keep the mtime
+        shutil.copy2(source, target)
+
+
+def _swap_current(root, generation_id):
+    # A symlink can not be overwritten in place, the new one is renamed over it
+    tmp_link = root / f".{CURRENT_LINK}-{os.urandom(4).hex()}.tmp"
+    os.symlink(generation_id, tmp_link)
+    try:
+        os.replace(tmp_link, root / CURRENT_LINK)
+    except BaseException:
+        os.unlink(tmp_link)
+        raise
+
+
+@STAGE_SECONDS.timed(stage="publish")
+def publish_outputs(source_dir=".", root=None, keep=None):
+    """
+    Publish the Data and Graphs files as a new generation and make it current.
+
+    The generation is assembled in a hidden folder, with every file that did
+    not change since the current generation hard linked from it and only the
+    changed files copied. Processed CSV files get their compressed variants,
+    and the manifest is written last. The folder is then renamed into place and
+    the current link swapped to it in a single rename, so readers see either
+    the previous or the new generation in full, never a file being written.
+
+    Args:
+        source_dir (str): Folder holding the Data and Graphs folders.
+        root (str, optional): Publication folder. Defaults to published.
+        keep (int, optional): Generations to keep.
+            Defaults to constants.PUBLISH_KEEP_GENERATIONS.
+
+    Returns:
+        str: Id of the published generation.
+    """
+    root = Path(root or get_publication_dir())
+    root.mkdir(parents=True, exist_ok=True)
+    previous = current_generation(root)
+    generation_id = new_generation_id()
+    staging = root / f".{generation_id}.tmp"
+
+    files = {}
+    linked = 0
+    try:
+        for relative_path, path in _output_files(source_dir):
+            stat = os.stat(path)
+            target = staging / relative_path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            entry = previous.files.get(relative_path) if previous else None
+            if (
+                entry is not None
+                and entry["size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+            ):
+                # Unchanged since the current generation, share its file
+                for suffix in ("",) + VARIANT_SUFFIXES:
+                    source = previous.file(relative_path + suffix)
+                    if suffix == "" or source.exists():
+                        _link_or_copy(source, staging / (relative_path + suffix))
+                files[relative_path] = entry
+                linked += 1
+                continue
+
+            shutil.copy2(path, target)
+            files[relative_path] = {
+                "version": generation_id,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            if relative_path.startswith("Data/") and relative_path.endswith(".csv"):
+                precompress_file(target)
+
+        with open(staging / GENERATION_MANIFEST, "w") as f:
+            json.dump({"id": generation_id, "created": time.time(), "files": files}, f)
+        os.rename(staging, root / generation_id)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _swap_current(root, generation_id)
+    logger.info(
+        f"Published generation {generation_id}: {len(files) - linked} changed files, "
+        f"{linked} unchanged"
+    )
+    prune_generations(root, keep)
+    return generation_id
+
+
+def rollback(generation_id=None, root=None):
+    """
+    Serve an earlier generation again.
+
+    Args:
+        generation_id (str, optional): Generation to serve. Defaults to the one
+            published before the current generation.
+        root (str, optional): Publication folder. Defaults to published.
+
+    Returns:
+        str: Id of the generation now being served.
+
+    Raises:
+        ValueError: If the generation does not exist, or there is no earlier one.
+    """
+    root = Path(root or get_publication_dir())
+    generations = list_generations(root)
+    if generation_id is None:
+        current = current_generation_id(root)
+        earlier = [g for g in generations if current is None or g < current]
+        if not earlier:
+            raise ValueError("There is no earlier generation to roll back to.")
+        generation_id = earlier[-1]
+    elif generation_id not in generations:
+        raise ValueError(f"Unknown generation: {generation_id}.")
+
+    _swap_current(root, generation_id)
+    logger.info(f"Rolled back to generation {generation_id}")
+    return generation_id
+
+
+def prune_generations(root=None, keep=None):
+    """
+    Delete all but the `keep` newest generations, never the current one.
+    Requests still reading a deleted file keep their open file handle.
+
+    Args:
+        root (str, optional): Publication folder. Defaults to published.
+        keep (int, optional): Generations to keep.
+            Defaults to constants.PUBLISH_KEEP_GENERATIONS.
+
+    Returns:
+        list: Ids of the deleted generations.
+    """
+    root = Path(root or get_publication_dir())
+    keep = keep or constants.PUBLISH_KEEP_GENERATIONS
+    current = current_generation_id(root)
+    generations = list_generations(root)
+    deleted = [
+        g for g in generations[: max(len(generations) - keep, 0)] if g != current
+    ]
+    for generation_id in deleted:
+        shutil.rmtree(root / generation_id, ignore_errors=True)
+    if deleted:
+        logger.info(f"Deleted {len(deleted)} old generations")
+    return deleted
@@ -0,0 +1,83 @@
+import asyncio
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.metrics import RENDER_CACHE_EVENTS
+
+
+def render_in_worker(plot_name, data, figsize, image_format, kwargs):
+    """
+    Worker process entry point for on-demand graph rendering.
+    matplotlib is only imported inside the worker processes.
+    """
+    from utils.data_plotter import render_graph_bytes
+
+    return render_graph_bytes(plot_name, data, figsize, image_format, **kwargs)
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered images.
+
+    Keys should include the data version, so a changed data file never serves a
+    stale image. Identical requests arriving while an image is being rendered
+    wait for that render instead of starting their own.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _store(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        self._entries[key] = image
+        self._size += len(image)
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def get_or_render(self, key, render):
+        """
+        Return the cached image for key, rendering it if needed.
+
+        Args:
+            key (tuple): Hashable description of the image and its data version.
+            render (callable): Coroutine function producing the image bytes.
+
+        Returns:
+            bytes: The image.
+        """
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            RENDER_CACHE_EVENTS.inc(event="hits")
+            return image
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            RENDER_CACHE_EVENTS.inc(event="coalesced")
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        RENDER_CACHE_EVENTS.inc(event="misses")
+        task = asyncio.ensure_future(render())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        # shield keeps one cancelled client from cancelling the shared render
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, task.result())
@@ -0,0 +1,226 @@
+import gzip
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_response_cache_dir
+from utils.logger import setup_logger
+from utils.metrics import FETCH_CACHE_RESULTS
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header into a dict of lower case directives.
+    Directives without a value map to True.
+    """
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else True
+    return directives
+
+
+class CachedResponse:
+    """
+    A stored API response along with its validators and freshness lifetime.
+    """
+
+    __slots__ = ("payload", "etag", "last_modified", "stored_at", "fresh_until")
+
+    def __init__(self, payload, etag, last_modified, stored_at, fresh_until):
+        self.payload = payload
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.fresh_until = fresh_until
+
+    def is_fresh(self, now):
+        return now < self.fresh_until
+
+
+class ResponseCache:
+    """
+    Disk cache of forecast API responses, keyed by the request URL and parameters,
+    i.e. the coordinates and the WEATHER_API_PARAMS set.
+
+    Entries are gzip compressed JSON files. A response is fresh until the next
+    model update boundary (every `model_update_interval` seconds), or earlier if
+    the upstream Cache-Control max-age says so; fresh entries are answered without
+    touching the network. Stale entries with an ETag or Last-Modified value are
+    revalidated with a conditional request, a 304 answer reuses the stored body.
+    """
+
+    def __init__(
+        self, directory=None, model_update_interval=None, max_age=None, clock=time.time
+    ):
+        self.directory = Path(directory or get_response_cache_dir())
+        self.model_update_interval = (
+            model_update_interval or constants.RESPONSE_CACHE_MODEL_UPDATE_INTERVAL
+        )
+        self.max_age = max_age or constants.RESPONSE_CACHE_MAX_AGE
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    @staticmethod
+    def key(url, params):
+        """
+        Return the cache key of a request.
+        """
+        canonical = json.dumps([url, sorted(params.items())], default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.json.gz"
+
+    def _fresh_until(self, stored_at, cache_control):
+        # Data only changes when the weather models run, so it stays fresh until the next run
+        interval = self.model_update_interval
+        fresh_until = math.floor(stored_at / interval + 1) * interval
+        if "no-cache" in cache_control:
+            return stored_at
+        if "max-age" in cache_control:
+            try:
+                fresh_until = min(
+                    fresh_until, stored_at + int(cache_control["max-age"])
+                )
+            except ValueError:
+                pass
+        return fresh_until
+
+    def get(self, url, params):
+        """
+        Return the stored response of a request, fresh or not.
+
+        Args:
+            url (str): Endpoint URL.
+            params (dict): Query parameters.
+
+        Returns:
+            CachedResponse | None: The stored response, None if there is none.
+        """
+        # Entries are read from disk every time, the payloads of thousands of
+        # cities would otherwise stay in memory for the life of the scheduler
+        try:
+            with gzip.open(
+                self._path(self.key(url, params)), "rt", encoding="utf-8"
+            ) as f:
+                return CachedResponse(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def get_fresh(self, url, params):
+        """
+        Return the stored payload of a request if it is still fresh, counting a hit.
+
+        Returns:
+            dict | list | None: The payload, None if it has to be fetched.
+        """
+        entry = self.get(url, params)
+        if entry is None or not entry.is_fresh(self.clock()):
+            return None
+        self._count("hits")
+        return entry.payload
+
+    def conditional_headers(self, url, params):
+        """
+        Return the headers revalidating the stored response of a request.
+        """
+        entry = self.get(url, params)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def handle_response(self, url, params, response):
+        """
+        Store a 200 response, or renew the stored response on a 304.
+
+        Args:
+            url (str): Endpoint URL.
+            params (dict): Query parameters.
+            response (requests.Response): The response to a request built with
+                conditional_headers.
+
+        Returns:
+            dict | list | None: The payload, None for any other status code.
+        """
+        cache_control = parse_cache_control(response.headers.get("Cache-Control"))
+        now = self.clock()
+
+        if response.status_code == 304:
+            entry = self.get(url, params)
+            if entry is None:
+                return None
+            entry.stored_at = now
+            entry.fresh_until = self._fresh_until(now, cache_control)
+            self._write(self.key(url, params), entry)
+            self._count("revalidated")
+            return entry.payload
+
+        if response.status_code != 200:
+            return None
+
+        payload = response.json()
+        self._count("misses")
+        if "no-store" not in cache_control:
+            entry = CachedResponse(
+                payload,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                now,
+                self._fresh_until(now, cache_control),
+            )
+            self._write(self.key(url, params), entry)
+        return payload
+
+    def _count(self, result):
+        with self._lock:
+            setattr(self, result, getattr(self, result) + 1)
+        FETCH_CACHE_RESULTS.inc(result=result)
+
+    def _write(self, key, entry):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data = {name: getattr(entry, name) for name in CachedResponse.__slots__}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress(json.dumps(data).encode(), compresslevel=6))
+        os.replace(tmp_path, self._path(key))
+
+    def prune(self):
+        """
+        Delete entries that were not stored or revalidated within `max_age` seconds.
+
+        Returns:
+            int: Number of deleted entries.
+        """
+        if not self.directory.exists():
+            return 0
+        cutoff = self.clock() - self.max_age
+        removed = 0
+        for path in self.directory.glob("*.json.gz"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            logger.info(f"Pruned {removed} expired responses from the response cache")
+        return removed
@@ -0,0 +1,223 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import (
+    get_daily_rollup_file,
+    get_rollup_state_file,
+    get_weekly_rollup_file,
+)
+from utils.history_store import SECONDS_PER_DAY, HistoryStore
+from utils.incremental_processing import load_processing_state, save_processing_state
+from utils.logger import setup_logger
+from utils.metrics import STAGE_SECONDS
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Metrics aggregated in the rollup tables
+ROLLUP_METRICS = ["Temperature (°C)", "Relative Humidity (%)", "Wind Speed (m/s)"]
+
+# The API reports at most two decimals
+ROLLUP_DECIMALS = 2
+
+# 1970-01-01 was a Thursday, three days after the Monday starting its week
+EPOCH_WEEKDAY = 3
+
+
+def _iso_dates(days):
+    return np.datetime_as_string(np.asarray(days).astype("datetime64[D]"))
+
+
+def _week_start(days):
+    return days - (days + EPOCH_WEEKDAY) % 7
+
+
+def add_periods(hourly):
+    """
+    Add the UTC Date and the Week (date of its Monday) of every hour.
+
+    Args:
+        hourly (pd.DataFrame): Rows with a Time column in epoch seconds.
+
+    Returns:
+        pd.DataFrame: The same frame with Date and Week columns added.
+    """
+    days = hourly["Time"].to_numpy() // SECONDS_PER_DAY
+    hourly["Date"] = _iso_dates(days)
+    hourly["Week"] = _iso_dates(_week_start(days))
+    return hourly
+
+
+def aggregate_metrics(hourly, period_column):
+    """
+    Aggregate hourly rows per city and period in one grouped pass per statistic.
+
+    Args:
+        hourly (pd.DataFrame): City, period and ROLLUP_METRICS columns.
+        period_column (str): Date or Week.
+
+    Returns:
+        pd.DataFrame: City, period and Hours columns, then Min, Max, Mean and
+            percentile columns for every metric ("Temperature (°C) Max").
+    """
+    # float32 values are widened first, rounding the results drops the float32 noise
+    hourly = hourly.astype({metric: np.float64 for metric in ROLLUP_METRICS})
+    grouped = hourly.groupby(["City", period_column], sort=True, observed=True)[
+        ROLLUP_METRICS
+    ]
+    stats = {"Min": grouped.min(), "Max": grouped.max(), "Mean": grouped.mean()}
+    for percentile in constants.ROLLUP_PERCENTILES:
+        stats[f"P{percentile}"] = grouped.quantile(percentile / 100)
+
+    columns = {"Hours": grouped.size()}
+    for metric in ROLLUP_METRICS:
+        for stat, frame in stats.items():
+            columns[f"{metric} {stat}"] = frame[metric].round(ROLLUP_DECIMALS)
+    rollup = pd.DataFrame(columns).reset_index()
+    rollup["City"] = rollup["City"].astype(str)
+    return rollup
+
+
+def add_rolling_means(table, period_column, window, label, since=None):
+    """
+    Fill the rolling mean columns ("Temperature (°C) 7 Day Mean") of a rollup
+    table, the mean of the period means within the window ending at each period.
+
+    Args:
+        table (pd.DataFrame): Rollup table sorted by City and period.
+        period_column (str): Date or Week.
+        window (str): Window length as a pandas offset, e.g. "7D".
+        label (str): Column name part, e.g. "7 Day".
+        since (str, optional): Only recompute periods from this date on, earlier
+            rows keep their values.
+
+    Returns:
+        pd.DataFrame: The table with the rolling mean columns.
+    """
+    mean_columns = [f"{metric} Mean" for metric in ROLLUP_METRICS]
+    rolling_columns = [f"{metric} {label} Mean" for metric in ROLLUP_METRICS]
+    for column in rolling_columns:
+        if column not in table.columns:
+            table[column] = np.nan
+
+    rows = table
+    if since is not None:
+        # Periods from `since` on only look back one window
+        first = (pd.Timestamp(since) - pd.Timedelta(window)).strftime("%Y-%m-%d")
+        rows = table[table[period_column] > first]
+    if rows.empty:
+        return table
+
+    dates = pd.to_datetime(rows[period_column])
+    rolled = (
+        rows[["City"] + mean_columns]
+        .assign(_date=dates)
+        .groupby("City", sort=False)
+        .rolling(window, on="_date")[mean_columns]
+        .mean()
+        .round(ROLLUP_DECIMALS)
+    )
+    # The table is sorted by City, so the groups come back in the order of its rows
+    rolled.index = rows.index
+    if since is not None:
+        rolled = rolled[rows.loc[rolled.index, period_column] >= since]
+    table.loc[rolled.index, rolling_columns] = rolled[mean_columns].to_numpy()
+    return table
+
+
+def _merge(previous, updated, period_column):
+    if previous is None:
+        table = updated
+    else:
+        kept = previous[~previous[period_column].isin(updated[period_column].unique())]
+        table = pd.concat([kept, updated], ignore_index=True)
+    return table.sort_values(["City", period_column], kind="stable").reset_index(
+        drop=True
+    )
+
+
+def _read_table(path):
+    if not os.path.exists(path):
+        return None
+    return pd.read_csv(path, float_precision="round_trip")
+
+
+@STAGE_SECONDS.timed(stage="rollup")
+def update_rollups(store=None, state_file=None, full=False):
+    """
+    Materialise the daily and weekly rollup tables from the historical store.
+
+    Only days whose history partition changed since the last run are read again.
+    Their daily rows and the weekly rows of the weeks holding them are recomputed
+    and replace the previous rows, then the rolling means are refreshed from the
+    first changed period on. Periods are UTC days and weeks starting on Monday.
+
+    Args:
+        store (HistoryStore, optional): Store to read. Defaults to weather_data/history.
+        state_file (str, optional): Where the partition versions are kept.
+            Defaults to cache/rollup_state.json.
+        full (bool): Rebuild both tables from every stored day.
+    """
+    store = store or HistoryStore()
+    state_file = state_file or get_rollup_state_file()
+    daily_file = get_daily_rollup_file()
+    weekly_file = get_weekly_rollup_file()
+
+    state = load_processing_state(state_file)
+    if full or not (os.path.exists(daily_file) and os.path.exists(weekly_file)):
+        state = {}
+    seen = state.get("days", {})
+
+    days = store.days()
+    versions = {day: store.day_version(day) for day in days}
+    changed_days = [day for day in days if seen.get(day) != versions[day]]
+    if not changed_days:
+        logger.info("Rollups are up to date")
+        return
+
+    # Weekly rows need every stored day of their week, changed or not
+    day_numbers = np.array(days, dtype="datetime64[D]").astype(np.int64)
+    weeks = dict(zip(days, _iso_dates(_week_start(day_numbers)).tolist()))
+    changed_weeks = {weeks[day] for day in changed_days}
+    frames = {
+        day: add_periods(store.read_day(day, ROLLUP_METRICS))
+        for day in days
+        if weeks[day] in changed_weeks
+    }
+    daily_hourly = pd.concat([frames[day] for day in changed_days])
+    weekly_hourly = pd.concat(frames.values())
+
+    previous = None if not state else _read_table(daily_file)
+    daily = _merge(previous, aggregate_metrics(daily_hourly, "Date"), "Date")
+    daily = add_rolling_means(
+        daily,
+        "Date",
+        f"{constants.ROLLUP_DAILY_WINDOW}D",
+        f"{constants.ROLLUP_DAILY_WINDOW} Day",
+        since=min(changed_days) if previous is not None else None,
+    )
+
+    previous = None if not state else _read_table(weekly_file)
+    weekly = _merge(previous, aggregate_metrics(weekly_hourly, "Week"), "Week")
+    weekly = add_rolling_means(
+        weekly,
+        "Week",
+        f"{constants.ROLLUP_WEEKLY_WINDOW * 7}D",
+        f"{constants.ROLLUP_WEEKLY_WINDOW} Week",
+        since=min(changed_weeks) if previous is not None else None,
+    )
+
+    Path(daily_file).parent.mkdir(parents=True, exist_ok=True)
+    daily.to_csv(daily_file, index=False)
+    weekly.to_csv(weekly_file, index=False)
+
+    state = {"days": {day: versions[day] for day in days}}
+    save_processing_state(state, state_file)
+    logger.info(
+        f"Updated rollups for {len(changed_days)} days and {len(changed_weeks)} weeks"
+    )
@@ -0,0 +1,343 @@
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_weather_processed_file
+from utils.logger import setup_logger
+from utils.process_weather_data import (
+    PROCESSED_COLUMNS,
+    RANKINGS,
+    RAW_COLUMNS,
+    add_converted_units,
+    rank_cities_per_hour,
+)
+from utils.sqlite_store import is_database
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Position of every row in the input, carried through the shards so the merged
+# outputs keep the row order and tie breaking of a single process run
+ROW_COLUMN = "_row"
+
+# Input row of the first appearance of an hour, the order hours are ranked in
+HOUR_FIRST_COLUMN = "_hour_first"
+
+
+def _as_loaded_by_pandas(table):
+    # pandas reads an integer column with gaps as float64 for the whole file,
+    # cast it here so every shard formats its values the same way
+    return table.cast(
+        pa.schema(
+            [
+                (
+                    field.with_type(pa.float64())
+                    if pa.types.is_integer(field.type) and table[field.name].null_count
+                    else field
+                )
+                for field in table.schema
+            ]
+        )
+    )
+
+
+def read_raw_table(file_name):
+    """
+    Read the RAW_COLUMNS of a raw CSV file, Parquet date partition or SQLite
+    database into an Arrow table, parsing CSV files on every core.
+
+    Args:
+        file_name (str): Path of the raw weather CSV, Parquet date partition or
+            SQLite database.
+
+    Returns:
+        pa.Table: The raw rows.
+    """
+    if is_database(file_name):
+        from utils.sqlite_store import read_weather_data
+
+        table = pa.Table.from_pandas(
+            read_weather_data(file_name, columns=RAW_COLUMNS), preserve_index=False
+        )
+    elif os.path.isdir(file_name):
+        import pyarrow.parquet as pq
+
+        part_files = sorted(
+            path
+            for path in Path(file_name).glob("*.parquet")
+            if not path.name.startswith(".")
+        )
+        tables = [pq.read_table(path, columns=RAW_COLUMNS) for path in part_files]
+        table = pa.concat_tables(tables, promote_options="permissive")
+        # Dictionary encoded columns are decoded, shards only hold their own cities
+        table = table.cast(
+            pa.schema(
+                [
+                    (
+                        field.with_type(field.type.value_type)
+                        if pa.types.is_dictionary(field.type)
+                        else field
+                    )
+                    for field in table.schema
+                ]
+            )
+        )
+    else:
+        import pyarrow.csv as pa_csv
+
+        table = pa_csv.read_csv(
+            file_name,
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=RAW_COLUMNS,
+                # Time stays text, like pd.read_csv leaves it
+                column_types={"City": pa.string(), "Time": pa.string()},
+            ),
+        )
+    return _as_loaded_by_pandas(table)
+
+
+def shard_of_cities(cities, shards):
+    """
+    Return the shard of every city name, a hash that is the same in every process.
+    """
+    return np.array(
+        [zlib.crc32(city.encode("utf-8")) % shards for city in cities], dtype=np.int64
+    )
+
+
+def split_by_city(table, shards):
+    """
+    Partition a raw table by city hash, keeping the input order within each shard.
+
+    Args:
+        table (pa.Table): Raw rows.
+        shards (int): Number of shards.
+
+    Returns:
+        list: One Arrow table per shard, with a ROW_COLUMN of input positions.
+    """
+    table = table.append_column(ROW_COLUMN, pa.array(np.arange(table.num_rows)))
+    # Only the distinct city names are hashed
+    encoded = table["City"].combine_chunks().dictionary_encode()
+    row_shards = shard_of_cities(encoded.dictionary.to_pylist(), shards)[
+        encoded.indices.to_numpy(zero_copy_only=False)
+    ]
+    return [table.filter(pa.array(row_shards == shard)) for shard in range(shards)]
+
+
+def to_shared_memory(table):
+    """
+    Write a table as an Arrow IPC stream into a new shared memory block.
+
+    Returns:
+        tuple: (block name, stream size in bytes), all another process needs to read it.
+    """
+    sink = pa.MockOutputStream()
+    _write_stream(sink, table)
+    size = sink.size()
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    # The writer holds the block's buffer until it is released on return
+    _write_stream(pa.FixedSizeBufferWriter(pa.py_buffer(block.buf)), table)
+    block.close()
+    return block.name, size
+
+
+def _write_stream(sink, table):
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def from_shared_memory(ref, unlink=False):
+    """
+    Read a table written by to_shared_memory.
+
+    Args:
+        ref (tuple): (block name, stream size) as returned by to_shared_memory.
+        unlink (bool): Free the block once it is read.
+
+    Returns:
+        pa.Table: The table.
+    """
+    name, size = ref
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        # One copy out of the block, Arrow columns (pandas strings among them)
+        # would otherwise keep pointing into it after it is closed
+        data = bytes(block.buf[:size])
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+    return pa.ipc.open_stream(data).read_all()
+
+
+def format_processed_rows(df):
+    """
+    Format processed rows as CSV text, in one piece per run of consecutive input
+    rows. Shards hold whole cities and the raw data is written city by city, so
+    the pieces of all shards put in input order give the file of a full run.
+
+    Args:
+        df (pd.DataFrame): Processed rows of one shard, in input order.
+
+    Returns:
+        pa.Table: start_row and text of every piece.
+    """
+    rows = df[ROW_COLUMN].to_numpy()
+    text = df[PROCESSED_COLUMNS].to_csv(index=False, header=False).encode("utf-8")
+    line_ends = np.flatnonzero(np.frombuffer(text, dtype=np.uint8) == ord("\n")) + 1
+
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(rows)]))
+    byte_starts = np.concatenate(([0], line_ends))[starts]
+    byte_ends = line_ends[ends - 1]
+    return pa.table(
+        {
+            "start_row": rows[starts],
+            "text": pa.array(
+                [text[a:b] for a, b in zip(byte_starts, byte_ends)], pa.large_binary()
+            ),
+        }
+    )
+
+
+def process_shard(input_ref, top_k):
+    """
+    Convert the units of one shard, format its processed rows and keep its
+    ranking candidates, the top_k cities of every hour for every ranking, which
+    always include the global top_k.
+
+    Args:
+        input_ref (tuple): Shared memory reference of the shard's raw rows.
+        top_k (int): Number of cities kept per hour in the ranking files.
+
+    Returns:
+        list: Shared memory references of the formatted processed rows, then of
+            the candidates of every ranking in RANKINGS order.
+    """
+    df = add_converted_units(from_shared_memory(input_ref).to_pandas())
+    # Formatting the CSV text is most of the work, so it is done in the workers
+    refs = [to_shared_memory(format_processed_rows(df))] if len(df) else [None]
+
+    df[HOUR_FIRST_COLUMN] = df.groupby("Time", sort=False)[ROW_COLUMN].transform("min")
+    for _, metric, ascending in RANKINGS:
+        candidates = ranking_candidates(df, metric, ascending, top_k)
+        refs.append(
+            to_shared_memory(pa.Table.from_pandas(candidates, preserve_index=False))
+        )
+    return refs
+
+
+def ranking_candidates(df, metric, ascending, top_k):
+    """
+    Return the top_k rows of every hour of a part of the input, the only rows of
+    that part that can make it into the global per hour ranking.
+
+    Args:
+        df (pd.DataFrame): Rows in input order, with ROW_COLUMN and HOUR_FIRST_COLUMN.
+        metric (str): Column to rank by.
+        ascending (bool): False ranks the highest values first, True the lowest.
+        top_k (int): Number of cities to keep per hour.
+
+    Returns:
+        pd.DataFrame: Time, City, metric, ROW_COLUMN and HOUR_FIRST_COLUMN columns.
+    """
+    # A stable sort keeps input order between equal values, as a full run does
+    candidates = (
+        df.sort_values(metric, ascending=ascending, kind="stable")
+        .groupby("Time", sort=False, observed=True)
+        .head(top_k)
+    )
+    return candidates[["Time", "City", metric, ROW_COLUMN, HOUR_FIRST_COLUMN]]
+
+
+def merge_rankings(candidates, metric, ascending, top_k):
+    """
+    Rank the candidates of every shard into the global per hour ranking.
+
+    Args:
+        candidates (pd.DataFrame): Candidate rows of every shard.
+        metric (str): Column to rank by.
+        ascending (bool): False ranks the highest values first, True the lowest.
+        top_k (int): Number of cities to keep per hour.
+
+    Returns:
+        pd.DataFrame: The ranking, equal to ranking every row in one process.
+    """
+    candidates[HOUR_FIRST_COLUMN] = candidates.groupby("Time", sort=False)[
+        HOUR_FIRST_COLUMN
+    ].transform("min")
+    candidates = candidates.sort_values(
+        [HOUR_FIRST_COLUMN, ROW_COLUMN], kind="stable"
+    ).reset_index(drop=True)
+    return rank_cities_per_hour(candidates, metric, ascending=ascending, top_k=top_k)
+
+
+def process_weather_data_sharded(file_name, top_k=1, workers=None, shards=None):
+    """
+    Process the raw data in a pool of worker processes, one city hash shard at a time.
+
+    The input is parsed once into Arrow, split by city hash and every shard is
+    handed to a worker through shared memory as an Arrow IPC stream. Workers
+    convert units and keep the per hour ranking candidates of their cities, and
+    return their outputs the same way. The parent merges the candidates into
+    the global rankings and writes the same files as process_weather_data.
+
+    Args:
+        file_name (str): Path of the raw weather CSV, Parquet date partition or
+            SQLite database.
+        top_k (int): Number of cities kept per hour in the ranking files.
+        workers (int, optional): Number of processes. Defaults to
+            constants.PROCESS_WORKERS, None uses every core.
+        shards (int, optional): Number of city shards. Defaults to the number of
+            workers, more shards make smaller blocks and balance uneven shards.
+    """
+    workers = workers or constants.PROCESS_WORKERS or os.cpu_count()
+    shards = shards or workers
+    table = read_raw_table(file_name)
+    logger.info(
+        f"Sharded processing of {table.num_rows} rows in {shards} shards, {workers} workers"
+    )
+
+    input_refs = [to_shared_memory(shard) for shard in split_by_city(table, shards)]
+    del table
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, shards)) as executor:
+            futures = [executor.submit(process_shard, ref, top_k) for ref in input_refs]
+            results = [future.result() for future in futures]
+    finally:
+        for name, _ in input_refs:
+            block = shared_memory.SharedMemory(name=name)
+            block.close()
+            block.unlink()
+
+    # Every shard returns its formatted rows first, then one block per ranking
+    for i, (get_output_file, metric, ascending) in enumerate(RANKINGS, start=1):
+        candidates = pd.concat(
+            [from_shared_memory(refs[i], unlink=True).to_pandas() for refs in results],
+            ignore_index=True,
+        )
+        ranked_df = merge_rankings(candidates, metric, ascending, top_k)
+        ranked_df.to_csv(get_output_file(), index=False)
+
+    output_file = get_weather_processed_file()
+    pd.DataFrame(columns=PROCESSED_COLUMNS).to_csv(output_file, index=False)
+    blocks = [from_shared_memory(refs[0], unlink=True) for refs in results if refs[0]]
+    # A header only input leaves every shard without rows, the header is all
+    if not blocks:
+        return
+    pieces = pa.concat_tables(blocks)
+    pieces = pieces.take(pc.sort_indices(pieces["start_row"]))
+    with open(output_file, "ab") as f:
+        f.writelines(pieces["text"].to_pylist())
@@ -0,0 +1,96 @@
+import math
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _unit_vector(latitude, longitude):
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    )
+
+
+def chord_length(distance_km):
+    """
+    Return the straight line distance on the unit sphere between two points
+    `distance_km` apart on the surface of the earth.
+    """
+    return 2 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class GridIndex:
+    """
+    Spatial hash of points on the unit sphere, bucketed in cubic cells as wide as
+    the search radius. A radius search only looks at the 27 cells around a point,
+    so lookups stay constant time however many points are indexed, and there are
+    no special cases at the poles or the antimeridian.
+    """
+
+    def __init__(self, distance_km):
+        self.radius = chord_length(distance_km)
+        self._cells = defaultdict(list)
+
+    def _cell(self, point):
+        return tuple(math.floor(axis / self.radius) for axis in point)
+
+    def add(self, latitude, longitude, item):
+        point = _unit_vector(latitude, longitude)
+        self._cells[self._cell(point)].append((point, item))
+
+    def nearest(self, latitude, longitude):
+        """
+        Return the item closest to a location within the search radius.
+
+        Returns:
+            object | None: The item, None if no indexed point is close enough.
+        """
+        point = _unit_vector(latitude, longitude)
+        cx, cy, cz = self._cell(point)
+        best, best_distance = None, self.radius
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    for other, item in self._cells.get((cx + dx, cy + dy, cz + dz), ()):
+                        distance = math.dist(point, other)
+                        if distance <= best_distance:
+                            best, best_distance = item, distance
+        return best
+
+
+def group_nearby_cities(city_list, distance_km):
+    """
+    Collapse cities within `distance_km` of each other into groups sharing one
+    upstream request. The first city of a group is its representative, the others
+    join the group of the nearest representative in range.
+
+    Args:
+        city_list (list): City dicts with City, Latitude and Longitude keys.
+        distance_km (float): Cities closer than this share a request, 0 only
+            merges repeated city names.
+
+    Returns:
+        list: (representative city dict, list of member city names) tuples, in the
+            order of the representatives in city_list.
+    """
+    index = GridIndex(distance_km) if distance_km > 0 else None
+    groups = []
+    by_name = {}
+    for city in city_list:
+        name = city["City"]
+        if name in by_name:
+            continue
+        group = None
+        if index is not None:
+            group = index.nearest(city["Latitude"], city["Longitude"])
+        if group is None:
+            group = (city, [])
+            groups.append(group)
+            if index is not None:
+                index.add(city["Latitude"], city["Longitude"], group)
+        group[1].append(name)
+        by_name[name] = group
+    return groups
@@ -0,0 +1,524 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import (
+    get_highest_temperature_cities_file,
+    get_lowest_humidity_cities_file,
+    get_sqlite_database_file,
+    get_weather_processed_file,
+)
+from utils.logger import setup_logger
+from utils.weather_series import HOURLY_DTYPES, WeatherSeries
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Raw observations keyed by (city, UTC epoch hour), every write transaction is
+# a numbered batch. Hours a later fetch repeats (past_days) are upserted, so a
+# city keeps one row per hour holding its latest values and batch.
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fetched REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS batches_fetched ON batches (fetched);
+CREATE TABLE IF NOT EXISTS cities (
+    city TEXT PRIMARY KEY,
+    latitude REAL,
+    longitude REAL,
+    timezone TEXT,
+    utc_offset INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS observations (
+    city TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    weather_code INTEGER,
+    relative_humidity_2m INTEGER,
+    temperature_2m REAL,
+    wind_speed_10m REAL,
+    batch INTEGER NOT NULL,
+    PRIMARY KEY (city, time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_time ON observations (time);
+CREATE INDEX IF NOT EXISTS observations_batch ON observations (batch);
+"""
+
+UPSERT_CITY = """
+INSERT INTO cities (city, latitude, longitude, timezone, utc_offset)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (city) DO UPDATE SET
+    latitude = excluded.latitude,
+    longitude = excluded.longitude,
+    timezone = excluded.timezone,
+    utc_offset = excluded.utc_offset
+"""
+
+VARIABLES = list(HOURLY_DTYPES)
+
+UPSERT_OBSERVATION = f"""
+INSERT INTO observations (city, time, {", ".join(VARIABLES)}, batch)
+VALUES (?, ?, {", ".join("?" for _ in VARIABLES)}, ?)
+ON CONFLICT (city, time) DO UPDATE SET
+    {", ".join(f"{variable} = excluded.{variable}" for variable in VARIABLES)},
+    batch = excluded.batch
+"""
+
+# SQL expression of every raw file column, in the order of the raw CSV files
+RAW_COLUMN_EXPRESSIONS = {
+    "City": "o.city",
+    "Latitude": "c.latitude",
+    "Longitude": "c.longitude",
+    "Weather Code": "o.weather_code",
+    "Timezone": "c.timezone",
+    "Time": "strftime('%Y-%m-%dT%H:%M', o.time + c.utc_offset, 'unixepoch')",
+    "Relative Humidity (%)": "o.relative_humidity_2m",
+    "Temperature (°C)": "o.temperature_2m",
+    "Wind Speed (m/s)": "o.wind_speed_10m",
+}
+
+# Processed outputs copied into tables named like the /data types, with the
+# column holding the hour of each row
+PROCESSED_TABLES = {
+    "weather": (get_weather_processed_file, "Time"),
+    "highest_temp": (get_highest_temperature_cities_file, "Hour"),
+    "lowest_humidity": (get_lowest_humidity_cities_file, "Hour"),
+}
+
+# Stores of one process create the schema once per database file
+_initialised = set()
+_init_lock = threading.Lock()
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def is_database(path):
+    """
+    Return whether a raw data path names a SQLite database rather than a CSV file.
+    """
+    return isinstance(path, (str, Path)) and str(path).endswith(".db")
+
+
+def _column_values(variable, array):
+    missing = np.isnan(array) if array.dtype.kind == "f" else None
+    if np.issubdtype(HOURLY_DTYPES[variable], np.integer):
+        values = np.where(missing, 0, array) if missing is not None else array
+        values = values.astype(np.int64).astype(object)
+    else:
+        # The shortest decimal text of the float32, the value reading the raw
+        # CSV file back gives
+        values = array.astype(str).astype(np.float64).astype(object)
+    if missing is not None:
+        values[missing] = None
+    return values.tolist()
+
+
+class SQLiteStore:
+    """
+    Embedded SQLite database holding the raw observations and a copy of the
+    processed outputs.
+
+    The database runs in WAL mode: every write is one transaction, readers keep
+    reading the last committed state while it runs and never see a partly
+    written batch. Writers of several processes queue on the database lock for
+    up to `timeout` seconds.
+    """
+
+    def __init__(self, path=None, timeout=30.0):
+        self.path = str(path or get_sqlite_database_file())
+        self.timeout = timeout
+
+    def connect(self, readonly=False):
+        """
+        Open a connection in autocommit mode, transactions are explicit.
+
+        Args:
+            readonly (bool): Open the existing database read only.
+
+        Returns:
+            sqlite3.Connection: The connection.
+
+        Raises:
+            FileNotFoundError: If readonly and the database does not exist.
+        """
+        if readonly:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"No database at {self.path}")
+            return sqlite3.connect(
+                f"{Path(self.path).resolve().as_uri()}?mode=ro",
+                uri=True,
+                timeout=self.timeout,
+                isolation_level=None,
+            )
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        # Safe in WAL mode, a crash can only lose the last commits, never corrupt
+        conn.execute("PRAGMA synchronous = NORMAL")
+        key = os.path.abspath(self.path)
+        with _init_lock:
+            if key not in _initialised:
+                conn.executescript(SCHEMA)
+                _initialised.add(key)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the statements of the with block in one write transaction.
+
+        Yields:
+            sqlite3.Connection: Connection holding the write lock.
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def reader(self):
+        """
+        Open a read only connection for the with block.
+
+        Yields:
+            sqlite3.Connection: The connection.
+        """
+        conn = self.connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+class SQLiteWeatherWriter:
+    """
+    Buffers decoded hourly series and upserts them into the database, one
+    transaction per batch of `batch_rows` rows.
+    Use it as a context manager, or call close() to write the last batch.
+    """
+
+    def __init__(self, store=None, batch_rows=None):
+        self.store = store or SQLiteStore()
+        self.batch_rows = batch_rows or constants.SQLITE_BATCH_ROWS
+        self._series = []
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def append(self, weather_data, city_name):
+        """
+        Buffer the hourly series of one city.
+
+        Args:
+            weather_data (WeatherSeries | dict): The decoded series, or the weather
+                data retrieved from the Meteo API.
+            city_name (str): Name of city.
+        """
+        series = WeatherSeries.coerce(weather_data, city_name)
+        with self._lock:
+            self._series.append(series)
+            self._rows += len(series)
+            full = self._rows >= self.batch_rows
+        if full:
+            self.flush()
+
+    def _observation_rows(self, series_list, batch):
+        for series in series_list:
+            name = series.city.name
+            columns = [
+                _column_values(variable, series.values[variable])
+                for variable in VARIABLES
+            ]
+            for hour, *values in zip(series.time.tolist(), *columns):
+                yield (name, hour, *values, batch)
+
+    def flush(self):
+        """
+        Upsert the buffered series in a single transaction.
+        """
+        with self._lock:
+            series_list, rows = self._series, self._rows
+            self._series, self._rows = [], 0
+        if not rows:
+            return
+
+        with self.store.transaction() as conn:
+            batch = conn.execute(
+                "INSERT INTO batches (fetched) VALUES (?)", (time.time(),)
+            ).lastrowid
+            conn.executemany(
+                UPSERT_CITY,
+                [
+                    (
+                        series.city.name,
+                        series.city.latitude,
+                        series.city.longitude,
+                        series.city.timezone,
+                        series.city.utc_offset,
+                    )
+                    for series in series_list
+                ],
+            )
+            conn.executemany(
+                UPSERT_OBSERVATION, self._observation_rows(series_list, batch)
+            )
+        logger.info(f"Upserted {rows} rows into {self.store.path} as batch {batch}")
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _start_of_today():
+    # Matches the daily CSV files, named after the local date
+    return datetime.combine(date.today(), datetime.min.time()).timestamp()
+
+
+def _raw_query(conn, columns, after_batch, since):
+    columns = columns or list(RAW_COLUMN_EXPRESSIONS)
+    select = ", ".join(
+        f"{RAW_COLUMN_EXPRESSIONS[column]} AS {_quote(column)}" for column in columns
+    )
+    if after_batch is None:
+        first = conn.execute(
+            "SELECT min(id) FROM batches WHERE fetched >= ?",
+            (_start_of_today() if since is None else since,),
+        ).fetchone()[0]
+        # No batch since then, the query returns no rows
+        after_batch = float("inf") if first is None else first - 1
+    sql = (
+        f"SELECT {select} FROM observations o JOIN cities c USING (city) "
+        # The cities rowid is the order cities were first stored in
+        f"WHERE o.batch > ? ORDER BY c.rowid, o.time"
+    )
+    return sql, (after_batch,)
+
+
+def read_weather_data(database=None, columns=None, after_batch=None, since=None):
+    """
+    Load raw observations with the columns of the raw CSV files, one row per
+    city and hour, cities in order of first appearance and hours ascending.
+
+    Args:
+        database (str, optional): Database file. Defaults to weather_data/weather.db.
+        columns (list, optional): Raw columns to load. Defaults to all columns.
+        after_batch (int, optional): Only rows written by later batches.
+        since (float, optional): Only rows written since these epoch seconds.
+            Defaults to the start of today, like the daily CSV file, unless
+            after_batch is given.
+
+    Returns:
+        pd.DataFrame: The raw weather data.
+
+    Raises:
+        FileNotFoundError: If the database does not exist.
+    """
+    with SQLiteStore(database).reader() as conn:
+        sql, params = _raw_query(conn, columns, after_batch, since)
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def read_new_weather_data(database=None, columns=None, after_batch=None):
+    """
+    Load the rows written after a batch along with the id of the last batch,
+    both from the same snapshot of the database.
+
+    Args:
+        database (str, optional): Database file. Defaults to weather_data/weather.db.
+        columns (list, optional): Raw columns to load. Defaults to all columns.
+        after_batch (int, optional): Last batch already read, None reads today's rows.
+
+    Returns:
+        tuple: (new rows as a DataFrame, id of the last batch)
+    """
+    with SQLiteStore(database).reader() as conn:
+        conn.execute("BEGIN")
+        latest = conn.execute("SELECT coalesce(max(id), 0) FROM batches").fetchone()[0]
+        sql, params = _raw_query(conn, columns, after_batch, None)
+        df = pd.read_sql_query(sql, conn, params=params)
+        conn.execute("COMMIT")
+    return df, latest
+
+
+def iter_weather_data(database=None, columns=None, chunk_rows=100000):
+    """
+    Read today's raw observations in chunks of at most `chunk_rows` rows.
+
+    Yields:
+        pd.DataFrame: The next rows, in the order of read_weather_data.
+    """
+    with SQLiteStore(database).reader() as conn:
+        sql, params = _raw_query(conn, columns, None, None)
+        yield from pd.read_sql_query(sql, conn, params=params, chunksize=chunk_rows)
+
+
+def _sql_type(dtype):
+    if dtype.kind in "iub":
+        return "INTEGER"
+    if dtype.kind == "f":
+        return "REAL"
+    return "TEXT"
+
+
+def save_processed_tables(store=None):
+    """
+    Replace the processed tables with the current processed output files, all
+    in one transaction, so readers switch from the old to the new outputs at once.
+
+    Args:
+        store (SQLiteStore, optional): Database. Defaults to weather_data/weather.db.
+    """
+    store = store or SQLiteStore()
+    frames = {
+        table: pd.read_csv(get_file(), float_precision="round_trip")
+        for table, (get_file, _) in PROCESSED_TABLES.items()
+        if os.path.exists(get_file())
+    }
+    with store.transaction() as conn:
+        for table, df in frames.items():
+            time_column = PROCESSED_TABLES[table][1]
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            conn.execute(
+                f"CREATE TABLE {_quote(table)} ("
+                + ", ".join(
+                    f"{_quote(column)} {_sql_type(df[column].dtype)}"
+                    for column in df.columns
+                )
+                + ")"
+            )
+            conn.executemany(
+                f"INSERT INTO {_quote(table)} VALUES "
+                f"({', '.join('?' for _ in df.columns)})",
+                df.astype(object).where(df.notna(), None).itertuples(index=False),
+            )
+            # Indexes are built after the bulk insert, in one sorted pass each
+            conn.execute(
+                f"CREATE INDEX {_quote(f'{table}_city_time')} ON {_quote(table)} "
+                f"({_quote('City')}, {_quote(time_column)})"
+            )
+            conn.execute(
+                f"CREATE INDEX {_quote(f'{table}_time')} ON {_quote(table)} "
+                f"({_quote(time_column)})"
+            )
+    logger.info(f"Saved processed tables {', '.join(frames)} to {store.path}")
+
+
+def _table_columns(conn, table):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+    if not columns:
+        raise FileNotFoundError(f"No {table} table")
+    return columns
+
+
+def query_processed(
+    data_type,
+    cities=None,
+    start=None,
+    end=None,
+    metrics=None,
+    limit=None,
+    offset=0,
+    store=None,
+):
+    """
+    Filter a processed table by city, time range and columns with indexed
+    queries, the database counterpart of data_cache.query_frame.
+
+    Args:
+        data_type (str): Table to query (weather, highest_temp, lowest_humidity).
+        cities (list, optional): Cities to keep.
+        start (str, optional): First hour to keep, ISO formatted ("2024-12-02T00:00").
+        end (str, optional): Last hour to keep, ISO formatted.
+        metrics (list, optional): Metric columns to keep. City and time are always kept.
+        limit (int, optional): Maximum number of rows to return.
+        offset (int): Number of matching rows to skip.
+        store (SQLiteStore, optional): Database. Defaults to weather_data/weather.db.
+
+    Returns:
+        tuple: (number of matching rows, pd.DataFrame of the requested page),
+            rows in the order of the processed file.
+
+    Raises:
+        FileNotFoundError: If the database or the table does not exist.
+        KeyError: If a requested metric is not a column of the table.
+    """
+    store = store or SQLiteStore()
+    time_column = PROCESSED_TABLES[data_type][1]
+    with store.reader() as conn:
+        columns = _table_columns(conn, data_type)
+        if metrics:
+            unknown = [metric for metric in metrics if metric not in columns]
+            if unknown:
+                raise KeyError(", ".join(unknown))
+            columns = [
+                column for column in columns if column in ("City", time_column)
+            ] + [metric for metric in metrics if metric not in ("City", time_column)]
+
+        conditions, params = [], []
+        if cities:
+            conditions.append(f"\"City\" IN ({', '.join('?' for _ in cities)})")
+            params.extend(cities)
+        # ISO timestamps compare correctly as plain strings
+        if start:
+            conditions.append(f"{_quote(time_column)} >= ?")
+            params.append(start)
+        if end:
+            conditions.append(f"{_quote(time_column)} <= ?")
+            params.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        total = conn.execute(
+            f"SELECT count(*) FROM {_quote(data_type)}{where}", params
+        ).fetchone()[0]
+        page = pd.read_sql_query(
+            f"SELECT {', '.join(_quote(column) for column in columns)} "
+            f"FROM {_quote(data_type)}{where} ORDER BY rowid LIMIT ? OFFSET ?",
+            conn,
+            params=(*params, -1 if limit is None else limit, offset),
+        )
+    return total, page
+
+
+def read_processed(data_type, columns=None, cities=None, dtype=None, store=None):
+    """
+    Load a processed table, or the rows of some cities from it.
+
+    Args:
+        data_type (str): Table to read (weather, highest_temp, lowest_humidity).
+        columns (list, optional): Columns to load. Defaults to all columns.
+        cities (list, optional): Cities to load. Defaults to every city.
+        dtype (dict, optional): Column dtypes of the returned frame.
+        store (SQLiteStore, optional): Database. Defaults to weather_data/weather.db.
+
+    Returns:
+        pd.DataFrame: The rows in the order of the processed file.
+    """
+    _, df = query_processed(data_type, cities=cities, metrics=columns, store=store)
+    if columns:
+        df = df[columns]
+    if dtype:
+        df = df.astype({k: v for k, v in dtype.items() if k in df.columns})
+    return df
@@ -0,0 +1,190 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import constants
+from utils.generate_file_name import get_weather_processed_file
+from utils.logger import setup_logger
+from utils.process_weather_data import (
+    PROCESSED_COLUMNS,
+    RANKINGS,
+    RAW_COLUMNS,
+    add_converted_units,
+)
+from utils.sharded_processing import (
+    HOUR_FIRST_COLUMN,
+    ROW_COLUMN,
+    merge_rankings,
+    ranking_candidates,
+)
+from utils.sqlite_store import is_database
+
+logger = setup_logger(__name__, "logs/weather_scrapper.log")
+
+# Explicit dtypes of the streamed raw columns, metrics fit a float32 and every
+# chunk only holds a few distinct cities
+RAW_DTYPES = {
+    "City": "category",
+    "Relative Humidity (%)": np.float32,
+    "Temperature (°C)": np.float32,
+    "Wind Speed (m/s)": np.float32,
+}
+
+# Format of the Time column in the raw and processed files
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Significant digits of a float32, whole values are written without a decimal
+# part like pandas writes integer columns
+FLOAT_FORMAT = "%.7g"
+
+
+def iter_raw_chunks(file_name, chunk_rows):
+    """
+    Read the raw data in chunks of at most `chunk_rows` rows, with explicit
+    dtypes and Time parsed into datetimes.
+
+    Args:
+        file_name (str): Path of the raw weather CSV, Parquet date partition or
+            SQLite database.
+        chunk_rows (int): Rows per chunk.
+
+    Yields:
+        pd.DataFrame: The RAW_COLUMNS of the next rows.
+    """
+    if is_database(file_name):
+        from utils.sqlite_store import iter_weather_data
+
+        chunks = iter_weather_data(file_name, RAW_COLUMNS, chunk_rows)
+    elif os.path.isdir(file_name):
+        import pyarrow.parquet as pq
+
+        part_files = sorted(
+            path
+            for path in Path(file_name).glob("*.parquet")
+            if not path.name.startswith(".")
+        )
+        chunks = (
+            batch.to_pandas()
+            for path in part_files
+            for batch in pq.ParquetFile(path).iter_batches(
+                batch_size=chunk_rows, columns=RAW_COLUMNS
+            )
+        )
+    else:
+        chunks = pd.read_csv(
+            file_name, usecols=RAW_COLUMNS, dtype=RAW_DTYPES, chunksize=chunk_rows
+        )
+
+    for chunk in chunks:
+        chunk = chunk.astype(RAW_DTYPES)
+        chunk["Time"] = pd.to_datetime(chunk["Time"], format=TIME_FORMAT)
+        yield chunk
+
+
+class RankingAccumulator:
+    """
+    Running per hour ranking over a stream of chunks.
+
+    Only the current top_k rows of every hour are kept, so memory grows with the
+    number of hours, never with the number of cities. Rows carry their position
+    in the stream, ties resolve to the earlier row like a single pass would.
+    """
+
+    def __init__(self, metric, ascending, top_k):
+        self.metric = metric
+        self.ascending = ascending
+        self.top_k = top_k
+        self.candidates = None
+
+    def update(self, chunk):
+        """
+        Merge the rows of the next chunk.
+
+        Args:
+            chunk (pd.DataFrame): Rows with ROW_COLUMN and HOUR_FIRST_COLUMN.
+        """
+        candidates = ranking_candidates(chunk, self.metric, self.ascending, self.top_k)
+        candidates = candidates.astype({"City": str})
+        if self.candidates is not None:
+            # Kept rows all come before the chunk, so the input order holds
+            candidates = pd.concat([self.candidates, candidates], ignore_index=True)
+            candidates[HOUR_FIRST_COLUMN] = candidates.groupby("Time", sort=False)[
+                HOUR_FIRST_COLUMN
+            ].transform("min")
+            candidates = ranking_candidates(
+                candidates, self.metric, self.ascending, self.top_k
+            ).sort_values(ROW_COLUMN, kind="stable")
+        self.candidates = candidates
+
+    def result(self):
+        """
+        Return the ranking of every row seen so far.
+
+        Returns:
+            pd.DataFrame: Hour, City and metric columns, plus Rank when top_k > 1.
+        """
+        if self.candidates is None:
+            columns = ["Hour", "City", self.metric]
+            return pd.DataFrame(columns=columns + (["Rank"] if self.top_k > 1 else []))
+        return merge_rankings(
+            self.candidates.copy(), self.metric, self.ascending, self.top_k
+        )
+
+
+def process_weather_data_streaming(file_name, top_k=1, chunk_rows=None):
+    """
+    Process the raw data in fixed size chunks, so memory stays the same however
+    many cities or days the input holds.
+
+    Every chunk is converted and appended to the processed file right away,
+    while per hour rankings are kept in running top_k accumulators and written
+    once the input is exhausted. Metrics are held as float32, so values are
+    written with the 7 significant digits of a float32.
+
+    Args:
+        file_name (str): Path of the raw weather CSV, Parquet date partition or
+            SQLite database.
+        top_k (int): Number of cities kept per hour in the ranking files.
+        chunk_rows (int, optional): Rows per chunk.
+            Defaults to constants.PROCESS_CHUNK_ROWS.
+    """
+    chunk_rows = chunk_rows or constants.PROCESS_CHUNK_ROWS
+    accumulators = [
+        RankingAccumulator(metric, ascending, top_k)
+        for _, metric, ascending in RANKINGS
+    ]
+
+    output_file = get_weather_processed_file()
+    rows = 0
+    with open(output_file, "w", newline="") as f:
+        pd.DataFrame(columns=PROCESSED_COLUMNS).to_csv(f, index=False)
+        for chunk in iter_raw_chunks(file_name, chunk_rows):
+            chunk = add_converted_units(chunk)
+            chunk[PROCESSED_COLUMNS].to_csv(
+                f,
+                index=False,
+                header=False,
+                date_format=TIME_FORMAT,
+                float_format=FLOAT_FORMAT,
+            )
+
+            chunk[ROW_COLUMN] = np.arange(rows, rows + len(chunk))
+            chunk[HOUR_FIRST_COLUMN] = chunk.groupby("Time", sort=False)[
+                ROW_COLUMN
+            ].transform("min")
+            for accumulator in accumulators:
+                accumulator.update(chunk)
+            rows += len(chunk)
+
+    for (get_output_file, _, _), accumulator in zip(RANKINGS, accumulators):
+        accumulator.result().to_csv(
+            get_output_file(),
+            index=False,
+            date_format=TIME_FORMAT,
+            float_format=FLOAT_FORMAT,
+        )
+    logger.info(f"Streamed {rows} rows in chunks of {chunk_rows}")
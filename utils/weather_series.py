@@ -0,0 +1,212 @@
+import numpy as np
+
+# Hourly Open Meteo variables and the dtypes they are held in.
+# float32 keeps every value the API reports (at most two decimals) and prints back
+# identically, the two integer variables fit in an int16.
+HOURLY_DTYPES = {
+    "temperature_2m": np.float32,
+    "relative_humidity_2m": np.int16,
+    "weather_code": np.int16,
+    "wind_speed_10m": np.float32,
+}
+
+# Raw file column of every hourly variable
+HOURLY_COLUMNS = {
+    "weather_code": "Weather Code",
+    "relative_humidity_2m": "Relative Humidity (%)",
+    "temperature_2m": "Temperature (°C)",
+    "wind_speed_10m": "Wind Speed (m/s)",
+}
+
+# Column order of the raw weather files
+RAW_FILE_COLUMNS = [
+    "City",
+    "Latitude",
+    "Longitude",
+    "Weather Code",
+    "Timezone",
+    "Time",
+    "Relative Humidity (%)",
+    "Temperature (°C)",
+    "Wind Speed (m/s)",
+]
+
+
+class CityMetadata:
+    """
+    Per city values that are the same for every hour of a series.
+    """
+
+    __slots__ = ("name", "latitude", "longitude", "timezone", "utc_offset")
+
+    def __init__(self, name, latitude, longitude, timezone, utc_offset=0):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.utc_offset = utc_offset
+
+
+def _decode_values(values, dtype):
+    # Integer variables fall back to float32 when the API reports missing hours as null
+    if np.issubdtype(dtype, np.integer) and None in values:
+        dtype = np.float32
+    return np.array(values, dtype=np.float64).astype(dtype)
+
+
+def _decode_times(times, utc_offset):
+    if times and isinstance(times[0], str):
+        # ISO local times, as sent without timeformat=unixtime
+        local = np.array(times, dtype="datetime64[m]").astype("datetime64[s]")
+        return local.astype(np.int64) - utc_offset
+    return np.array(times, dtype=np.int64)
+
+
+class WeatherSeries:
+    """
+    Hourly forecast of one city held as one NumPy array per variable.
+
+    Time is stored as int64 UTC epoch seconds. A payload is decoded once into a
+    series, and the CSV writer, the Parquet writer and the processor all read
+    the arrays directly instead of per hour Python lists.
+    """
+
+    __slots__ = ("city", "time", "values")
+
+    def __init__(self, city, time, values):
+        self.city = city
+        self.time = time
+        self.values = values
+
+    @classmethod
+    def from_payload(cls, weather_data, city_name):
+        """
+        Decode an Open Meteo forecast payload.
+
+        Args:
+            weather_data (dict): The weather data retrieved from the Meteo API.
+            city_name (str): Name of city.
+
+        Returns:
+            WeatherSeries: The decoded series.
+        """
+        utc_offset = weather_data.get("utc_offset_seconds", 0)
+        city = CityMetadata(
+            city_name,
+            weather_data["latitude"],
+            weather_data["longitude"],
+            weather_data["timezone"],
+            utc_offset,
+        )
+        hourly = weather_data["hourly"]
+        return cls(
+            city,
+            _decode_times(hourly["time"], utc_offset),
+            {
+                variable: _decode_values(hourly[variable], dtype)
+                for variable, dtype in HOURLY_DTYPES.items()
+            },
+        )
+
+    @classmethod
+    def coerce(cls, weather_data, city_name):
+        """
+        Return weather_data as a series, decoding it if it is still a payload dict.
+        """
+        if isinstance(weather_data, cls):
+            return weather_data
+        return cls.from_payload(weather_data, city_name)
+
+    def renamed(self, city_name):
+        """
+        Return the same series under another city name, sharing the arrays.
+        """
+        city = self.city
+        return WeatherSeries(
+            CityMetadata(
+                city_name, city.latitude, city.longitude, city.timezone, city.utc_offset
+            ),
+            self.time,
+            self.values,
+        )
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def nbytes(self):
+        return self.time.nbytes + sum(array.nbytes for array in self.values.values())
+
+    def local_times(self):
+        """
+        Return the hours as ISO formatted local times ("2024-12-02T00:00"),
+        the format stored in the Time column of the raw files.
+        """
+        local = (self.time + self.city.utc_offset).astype("datetime64[s]")
+        return np.datetime_as_string(local, unit="m")
+
+    def formatted_values(self, variable):
+        """
+        Return the values of an hourly variable as strings for text output.
+        Missing values become empty strings, like a None written by csv.writer.
+        """
+        array = self.values[variable]
+        missing = np.isnan(array) if array.dtype.kind == "f" else None
+        if missing is not None and np.issubdtype(HOURLY_DTYPES[variable], np.integer):
+            # Integer variables with gaps print without a trailing ".0"
+            formatted = np.where(missing, 0, array).astype(np.int64).astype(str)
+        else:
+            formatted = array.astype(str)
+        if missing is not None and missing.any():
+            formatted[missing] = ""
+        return formatted
+
+    def to_frame(self):
+        """
+        Build a DataFrame with the raw file columns.
+
+        Returns:
+            pd.DataFrame: One row per hour.
+        """
+        return series_to_frame([self])
+
+
+def _as_read_back(array):
+    # float32 values widened through their shortest decimal text, which is what
+    # reading the value back from a CSV file gives
+    if array.dtype == np.float32:
+        return array.astype(str).astype(np.float64)
+    return array.astype(np.int64)
+
+
+def series_to_frame(series_list):
+    """
+    Concatenate many series into a single DataFrame with the raw file columns.
+    Values match what reading the same data back from the raw CSV file gives.
+
+    Args:
+        series_list (list): WeatherSeries objects.
+
+    Returns:
+        pd.DataFrame: One row per city and hour.
+    """
+    import pandas as pd
+
+    counts = [len(series) for series in series_list]
+    cities = [series.city for series in series_list]
+    columns = {
+        "City": np.repeat([city.name for city in cities], counts).astype(object),
+        "Latitude": np.repeat([city.latitude for city in cities], counts),
+        "Longitude": np.repeat([city.longitude for city in cities], counts),
+        "Timezone": np.repeat([city.timezone for city in cities], counts).astype(
+            object
+        ),
+        "Time": np.concatenate([series.local_times() for series in series_list]).astype(
+            object
+        ),
+    }
+    for variable, column in HOURLY_COLUMNS.items():
+        columns[column] = _as_read_back(
+            np.concatenate([series.values[variable] for series in series_list])
+        )
+    return pd.DataFrame(columns)[RAW_FILE_COLUMNS]
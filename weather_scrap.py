@@ -1,28 +1,59 @@
+import argparse
 import csv
-import json
-import os
+import glob
 import sys
-import pandas as pd
-from datetime import date, datetime
+import threading
+from contextlib import ExitStack, contextmanager
 
 import requests
 
 import constants
-from utils.generate_file_name import get_csv_file_name_for_given_date
-from utils.logger import setup_logger
+from utils.generate_file_name import (
+    get_csv_file_name_for_given_date,
+    get_raw_weather_data_path,
+)
+from utils.logger import log_payload, setup_logger
+from utils.async_fetcher import build_weather_params, fetch_weather_data_concurrently
 from utils.city_geo_mapper import fetch_and_build_city_latitude_longitude_data
-from utils.process_weather_data import process_weather_data
-from utils.data_plotter import plot_graphs_from_processed_data
+from utils.event_stream import publish_observation
+from utils.history_store import (
+    HistoryWriter,
+    backfill_from_csv,
+    compact_settled_days,
+)
+from utils.metrics import (
+    CITIES_FETCHED,
+    CITY_FETCH_SECONDS,
+    EXTRACT_SECONDS,
+    FETCH_BYTES,
+    FETCH_REQUEST_SECONDS,
+    FETCH_REQUESTS,
+    STAGE_SECONDS,
+    load_process_metrics,
+    save_process_metrics,
+)
+from utils.profiler import profile_run
+from utils.response_cache import ResponseCache
+from utils.spatial_index import group_nearby_cities
+from utils.weather_series import RAW_FILE_COLUMNS, WeatherSeries
+
+# pandas, pyarrow and matplotlib are imported inside the stages that use them,
+# so a fetch-only run never pays for loading them
 
 logger = setup_logger(__name__, "logs/weather_scrapper.log")
 
+# Scheduler groups fetch on their own threads and append to the same daily files
+# and history partitions, so every write and every flush holds this lock
+STORE_LOCK = threading.Lock()
+
 
 def extract_and_save_data_in_csv(weather_data, city_name):
     """
     Extracts relevant weather data and saves it to a CSV file.
 
     Args:
-        weather_data (dict): The weather data retrieved from the Meteo API
+        weather_data (WeatherSeries | dict): The decoded series, or the weather data
+            retrieved from the Meteo API
         city_name (str): Name of city
 
     Returns:
@@ -30,53 +61,42 @@ def extract_and_save_data_in_csv(weather_data, city_name):
     """
     logger.info("Extracting weather data received from API and saving in CSV")
 
-    latitude = weather_data["latitude"]
-    longitude = weather_data["longitude"]
-    timezone = weather_data["timezone"]
-
+    series = WeatherSeries.coerce(weather_data, city_name)
+    city = series.city
     csv_file = get_csv_file_name_for_given_date()
 
-    if not os.path.exists(csv_file):
-        with open(csv_file, "a", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(
-                [
-                    "City",
-                    "Latitude",
-                    "Longitude",
-                    "Weather Code",
-                    "Timezone",
-                    "Time",
-                    "Relative Humidity (%)",
-                    "Temperature (°C)",
-                    "Wind Speed (m/s)",
-                ]
-            )
-
     with open(csv_file, "a", newline="") as csvfile:
         writer = csv.writer(csvfile)
 
-        for i, temp in enumerate(weather_data["hourly"]["temperature_2m"]):
-            time = weather_data["hourly"]["time"][i]
-            weather_code = weather_data["hourly"]["weather_code"][i]
-            wind_speed = weather_data["hourly"]["wind_speed_10m"][i]
-            humidity = weather_data["hourly"]["relative_humidity_2m"][i]
-            writer.writerow(
-                [
-                    city_name,
-                    latitude,
-                    longitude,
-                    weather_code,
-                    timezone,
-                    time,
-                    humidity,
-                    temp,
-                    wind_speed,
-                ]
+        # A new file starts empty, write the header before the first rows
+        if csvfile.tell() == 0:
+            writer.writerow(RAW_FILE_COLUMNS)
+
+        writer.writerows(
+            [
+                city_name,
+                city.latitude,
+                city.longitude,
+                weather_code,
+                city.timezone,
+                time,
+                humidity,
+                temp,
+                wind_speed,
+            ]
+            for time, weather_code, humidity, temp, wind_speed in zip(
+                series.local_times().tolist(),
+                series.formatted_values("weather_code").tolist(),
+                series.formatted_values("relative_humidity_2m").tolist(),
+                series.formatted_values("temperature_2m").tolist(),
+                series.formatted_values("wind_speed_10m").tolist(),
             )
+        )
 
 
-def fetch_city_weather_data(city_name, latitude, longitude):
+def fetch_city_weather_data(
+    city_name, latitude, longitude, on_result=None, session=None, cache=None
+):
     """
     Fetches weather data for a specific city using Open Meteo API
 
@@ -84,61 +104,406 @@ def fetch_city_weather_data(city_name, latitude, longitude):
         city_name (str): Name of the city.
         latitude (float): Latitude of the city.
         longitude (float): Longitude of the city.
+        on_result (callable, optional): Called as on_result(series, city_name) with the
+            decoded WeatherSeries. Defaults to extract_and_save_data_in_csv.
+        session (requests.Session, optional): Session to reuse for the request.
+        cache (ResponseCache, optional): Response cache, a fresh cached response
+            skips the request and a stale one is revalidated.
     """
+    on_result = on_result or extract_and_save_data_in_csv
     logger.info("Starting to fetch city weather data using meteo api")
 
     url = constants.WEATHER_API_URL
-    params = constants.WEATHER_API_PARAMS
+    params = build_weather_params(latitude, longitude)
 
-    params["latitude"] = latitude
-    params["longitude"] = longitude
+    with CITY_FETCH_SECONDS.time():
+        payload = cache.get_fresh(url, params) if cache is not None else None
+        if payload is None:
+            headers = (
+                cache.conditional_headers(url, params) if cache is not None else None
+            )
+            with FETCH_REQUEST_SECONDS.time():
+                response = (session or requests).get(
+                    url=url, params=params, headers=headers
+                )
+            FETCH_REQUESTS.inc(status=str(response.status_code))
+            FETCH_BYTES.inc(len(response.content))
+            if cache is not None:
+                payload = cache.handle_response(url, params, response)
+            elif response.status_code == 200:
+                payload = response.json()
 
-    response = requests.get(url=url, params=params)
-    if response.status_code == 200:
+    if payload is not None:
         logger.info(f"Weather data fetched successfully for {city_name}")
-        logger.info(response.json())
-        extract_and_save_data_in_csv(response.json(), city_name)
+        log_payload(logger, city_name, payload)
+        # Decode the body once, writers take the series directly
+        series = WeatherSeries.from_payload(payload, city_name)
+        on_result(series, city_name)
     else:
         logger.error(
-            f"API Error while fetching {city_name} weather data, status code: {
-                response.status_code}"
+            f"API Error while fetching {city_name} weather data, status code: {response.status_code}"
         )
 
 
-def fetch_weather_data_for_cities(cities=None):
+@contextmanager
+def _store_writers():
+    # Closing a writer flushes its buffered rows, so the writers close under the lock
+    stack = ExitStack()
+    try:
+        yield stack
+    finally:
+        with STORE_LOCK:
+            stack.close()
+
+
+@STAGE_SECONDS.timed(stage="fetch")
+def fetch_weather_data_for_cities(
+    cities=None,
+    concurrency=None,
+    batch_size=None,
+    session=None,
+    geocode_cache=None,
+    response_cache=None,
+):
     """
     Function to fetch weather data for a list of cities.
     If no cities are provided, it defaults to constants.CITIES.
 
     Args:
         cities (list): List of city names to fetch weather data for.
+        concurrency (int, optional): Maximum in-flight requests. Defaults to
+            constants.FETCH_CONCURRENCY, a value of 1 fetches cities one at a time.
+        batch_size (int, optional): Cities packed into one request.
+            Defaults to constants.FETCH_BATCH_SIZE.
+        session (requests.Session, optional): Session to reuse across runs.
+        geocode_cache (GeocodeCache, optional): Geocode cache to reuse across runs.
+        response_cache (ResponseCache, optional): Response cache to reuse across runs.
+            Defaults to a cache in cache/responses when
+            constants.RESPONSE_CACHE_ENABLED is set.
     """
     logger.info("Starting to fetch weather data for cities.")
+    if response_cache is None and constants.RESPONSE_CACHE_ENABLED:
+        response_cache = ResponseCache()
 
     if not cities:  # Check if cities is None or an empty list
         city_list = constants.CITIES
         logger.info("No cities provided, using predefined cities.")
     else:
-        city_list = fetch_and_build_city_latitude_longitude_data(cities)
+        city_list = fetch_and_build_city_latitude_longitude_data(
+            cities, cache=geocode_cache
+        )
         logger.info(f"Fetching data for provided cities: {', '.join(cities)}")
 
+    with _store_writers() as stack:
+        if constants.STORAGE_FORMAT == "parquet":
+            from utils.columnar_store import ColumnarWeatherWriter
+
+            writers = [stack.enter_context(ColumnarWeatherWriter()).append]
+        elif constants.STORAGE_FORMAT == "sqlite":
+            from utils.sqlite_store import SQLiteWeatherWriter
+
+            writers = [stack.enter_context(SQLiteWeatherWriter()).append]
+        else:
+            writers = [extract_and_save_data_in_csv]
+        if constants.HISTORY_STORE_ENABLED:
+            writers.append(stack.enter_context(HistoryWriter()).append)
+        if constants.EVENTS_ENABLED:
+            # Last, once the series was handed to every storage writer
+            writers.append(publish_observation)
+
+        # One request per group of nearby cities, its series fans out to every member
+        groups = group_nearby_cities(city_list, constants.SPATIAL_DEDUP_DISTANCE_KM)
+        members = {city["City"]: names for city, names in groups}
+        if len(groups) < len(city_list):
+            logger.info(
+                f"{len(city_list)} cities share {len(groups)} upstream requests"
+            )
+        fetched = 0
+
+        def on_result(series, city_name):
+            nonlocal fetched
+            with STORE_LOCK, EXTRACT_SECONDS.time():
+                for name in members.get(city_name, [city_name]):
+                    member_series = (
+                        series if name == city_name else series.renamed(name)
+                    )
+                    for write in writers:
+                        write(member_series, name)
+                    fetched += 1
+
+        _fetch_city_list(
+            [city for city, _ in groups],
+            on_result,
+            concurrency,
+            batch_size,
+            session,
+            response_cache,
+        )
+
+    CITIES_FETCHED.inc(fetched, status="ok")
+    city_count = sum(len(names) for names in members.values())
+    CITIES_FETCHED.inc(city_count - fetched, status="failed")
+    if response_cache is not None:
+        logger.info(
+            f"Response cache: {response_cache.hits} hits, {response_cache.misses} misses, "
+            f"{response_cache.revalidated} revalidated"
+        )
+        response_cache.prune()
+
+
+def _fetch_city_list(city_list, on_result, concurrency, batch_size, session, cache):
+    concurrency = concurrency or constants.FETCH_CONCURRENCY
+    batch_size = batch_size or constants.FETCH_BATCH_SIZE
+    if concurrency > 1 or batch_size > 1:
+        logger.info(
+            f"Fetching {len(city_list)} cities with concurrency {concurrency}, batch size {batch_size}"
+        )
+        fetch_weather_data_concurrently(
+            city_list,
+            on_result=on_result,
+            concurrency=concurrency,
+            batch_size=batch_size,
+            session=session,
+            cache=cache,
+        )
+        return
+
     for city in city_list:
         logger.info(f"Fetching data for city : {city}")
         city_name = city["City"]
         latitude = city["Latitude"]
         longitude = city["Longitude"]
-        fetch_city_weather_data(city_name, latitude, longitude)
+        fetch_city_weather_data(
+            city_name, latitude, longitude, on_result, session, cache
+        )
+
+
+def process_stage(
+    file_name=None, top_k=1, incremental=None, workers=None, streaming=None
+):
+    """
+    Process the raw weather data of the day into the Data folder CSV files.
+
+    Args:
+        file_name (str, optional): Raw CSV file or Parquet partition.
+            Defaults to today's file in the configured storage format.
+        top_k (int): Number of cities kept per hour in the ranking files.
+        incremental (bool, optional): Only process rows added since the last run.
+        workers (int, optional): Processes sharing a full run by city hash.
+        streaming (bool, optional): Read the input in chunks, in constant memory.
+    """
+    from utils.process_weather_data import process_weather_data
+
+    process_weather_data(
+        file_name or get_raw_weather_data_path(constants.STORAGE_FORMAT),
+        top_k=top_k,
+        incremental=incremental,
+        workers=workers,
+        streaming=streaming,
+    )
+
+
+def plot_stage(force=False, city_charts=False):
+    """
+    Render the graphs from the processed data.
+
+    Args:
+        force (bool): Render every graph even if its data did not change.
+        city_charts (bool): Also render one temperature chart per city.
+    """
+    from utils.data_plotter import (
+        plot_city_temperature_charts,
+        plot_graphs_from_processed_data,
+    )
+
+    plot_graphs_from_processed_data(force=force)
+    if city_charts:
+        plot_city_temperature_charts(force=force)
+
+
+def rollup_stage(full=False):
+    """
+    Compact the settled days of the historical store, then update the daily and
+    weekly rollup tables from it.
+
+    Args:
+        full (bool): Rebuild the tables from every stored day.
+    """
+    if not constants.HISTORY_STORE_ENABLED:
+        logger.info("Historical store is disabled, skipping rollups")
+        return
+    from utils.rollups import update_rollups
+
+    compact_settled_days()
+    update_rollups(full=full)
+
+
+def publish_stage():
+    """
+    Publish the Data and Graphs files as a new generation served by the API.
+    """
+    if not constants.VERSIONED_OUTPUTS:
+        return
+    from utils.publication import publish_outputs
+
+    publish_outputs()
+
+
+def rollback_stage(generation_id=None):
+    """
+    Serve an earlier published generation again.
+
+    Args:
+        generation_id (str, optional): Generation to serve. Defaults to the one
+            published before the current generation.
+    """
+    from utils.publication import list_generations, rollback
+
+    try:
+        rollback(generation_id)
+    except ValueError as e:
+        logger.error(f"{e} Published generations: {', '.join(list_generations())}")
+
+
+def serve_stage(host="0.0.0.0", port=8000):
+    """
+    Serve the FastAPI app with uvicorn.
+    """
+    import uvicorn
+
+    uvicorn.run("app:app", host=host, port=port)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Fetch, process and plot city weather data. "
+        "Without a command every stage runs, for the given cities."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Save a profile of the run to cache/profiles",
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    fetch = commands.add_parser("fetch", help="Only fetch weather data")
+    fetch.add_argument(
+        "cities", nargs="*", help="City names, defaults to constants.CITIES"
+    )
+    fetch.add_argument("--concurrency", type=int)
+    fetch.add_argument("--batch-size", type=int)
+
+    process = commands.add_parser("process", help="Only process fetched data")
+    process.add_argument("--file", help="Raw CSV file or Parquet partition to process")
+    process.add_argument("--top-k", type=int, default=1)
+    process.add_argument(
+        "--incremental", action=argparse.BooleanOptionalAction, default=None
+    )
+    process.add_argument(
+        "--workers", type=int, help="Processes sharing the run, split by city hash"
+    )
+    process.add_argument(
+        "--streaming",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Read the input in chunks, in constant memory",
+    )
+
+    plot = commands.add_parser("plot", help="Only render graphs")
+    plot.add_argument("--force", action="store_true")
+    plot.add_argument("--city-charts", action="store_true")
+
+    rollup = commands.add_parser(
+        "rollup", help="Only update the daily and weekly rollup tables"
+    )
+    rollup.add_argument(
+        "--full", action="store_true", help="Rebuild from every stored day"
+    )
+
+    backfill = commands.add_parser(
+        "backfill", help="Load daily raw CSV files into the historical store"
+    )
+    backfill.add_argument(
+        "files", nargs="*", help="Raw CSV files, defaults to every weather_data file"
+    )
+
+    rollback = commands.add_parser(
+        "rollback", help="Serve an earlier published generation again"
+    )
+    rollback.add_argument(
+        "generation", nargs="?", help="Generation id, defaults to the previous one"
+    )
+
+    serve = commands.add_parser("serve", help="Serve the API")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8000)
+
+    return parser
+
+
+COMMANDS = ("fetch", "process", "rollup", "plot", "backfill", "rollback", "serve")
+
+
+def run_command(argv):
+    # Without a command, arguments are city names and every stage runs as before
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        city_list = argv
+        if city_list:
+            logger.info(f"Cities provided: {', '.join(city_list)}")
+
+        fetch_weather_data_for_cities(city_list)
+        process_stage()
+        rollup_stage()
+        plot_stage()
+        publish_stage()
+        return
+
+    args = build_parser().parse_args(argv)
+    if args.command == "fetch":
+        fetch_weather_data_for_cities(
+            args.cities, concurrency=args.concurrency, batch_size=args.batch_size
+        )
+    elif args.command == "process":
+        process_stage(
+            args.file,
+            top_k=args.top_k,
+            incremental=args.incremental,
+            workers=args.workers,
+            streaming=args.streaming,
+        )
+        publish_stage()
+    elif args.command == "rollup":
+        rollup_stage(full=args.full)
+        publish_stage()
+    elif args.command == "plot":
+        plot_stage(force=args.force, city_charts=args.city_charts)
+        publish_stage()
+    elif args.command == "backfill":
+        backfill_from_csv(args.files or glob.glob("weather_data/weather_*.csv"))
+    elif args.command == "rollback":
+        rollback_stage(args.generation)
+    elif args.command == "serve":
+        serve_stage(args.host, args.port)
+
 
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
 
-def main():
-    city_list = []
-    if len(sys.argv) > 1:
-        city_list = sys.argv[1:]
-        logger.info(f"Cities provided: {', '.join(city_list)}")
+    # --profile may come anywhere, so it also works with the city name form
+    profile = "--profile" in argv
+    argv = [arg for arg in argv if arg != "--profile"]
+    if argv and argv[0] == "serve":
+        run_command(argv)
+        return
 
-    fetch_weather_data_for_cities(city_list)
-    process_weather_data(get_csv_file_name_for_given_date())
-    plot_graphs_from_processed_data()
+    # Metrics of every CLI run are added up in one snapshot, exported by /metrics
+    load_process_metrics("cli")
+    try:
+        name = argv[0] if argv and argv[0] in COMMANDS else "pipeline"
+        with profile_run(name, enabled=profile or None):
+            run_command(argv)
+    finally:
+        save_process_metrics("cli")
 
 
 if __name__ == "__main__":